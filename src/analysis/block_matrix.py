@@ -0,0 +1,291 @@
+"""
+This module provides the sparse block x feature matrix shared by the similarity and clustering
+stages. Each row is a block, each column a (Type, Assembly) pair, and each entry the probability
+of that assembly in the block. The matrix is stored in CSR form together with its row and column
+labels, so it is built once from a probability table and can be saved and reloaded without
+rebuilding dictionaries or dense pivot tables.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from columnar_io import read_table
+from token_vocabulary import TokenVocabulary, encode_token_table
+
+# Odd multipliers of the row hashes used to find identical blocks
+_HASH_MULTIPLIERS = (0x9E3779B97F4A7C15, 0xBF58476D1CE4E5B9, 0x94D049BB133111EB)
+
+
+def _mix(values):
+    """
+    Scramble 64-bit values with the splitmix64 finalizer.
+
+    Args:
+        values (numpy.ndarray): uint64 values.
+
+    Returns:
+        numpy.ndarray: The scrambled uint64 values.
+    """
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(_HASH_MULTIPLIERS[1])
+    values ^= values >> np.uint64(27)
+    values *= np.uint64(_HASH_MULTIPLIERS[2])
+    return values ^ (values >> np.uint64(31))
+
+
+class BlockDistributionMatrix:
+    """
+    Probability distributions of all blocks as a sparse block x (Type, Assembly) matrix.
+
+    Row i belongs to block_ids[i]; column j to the token (types[j], assemblies[j]).
+    Only the tokens listed for a block are stored, so the memory used is proportional
+    to the number of table rows rather than blocks x vocabulary.
+    """
+
+    def __init__(self, matrix, block_ids, types, assemblies):
+        """
+        Create a block matrix from its parts (see from_table and load).
+
+        Args:
+            matrix (scipy.sparse.csr_matrix): Probabilities, blocks x tokens.
+            block_ids (numpy.ndarray): Block ID (as text) of each row.
+            types (numpy.ndarray): Type of each column.
+            assemblies (numpy.ndarray): Assembly of each column.
+        """
+        self.matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+        self.block_ids = np.asarray(block_ids, dtype=str)
+        self.types = np.asarray(types, dtype=str)
+        self.assemblies = np.asarray(assemblies, dtype=str)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def nbytes(self):
+        """
+        int: Memory used by the sparse matrix arrays.
+        """
+        return (
+            self.matrix.data.nbytes
+            + self.matrix.indices.nbytes
+            + self.matrix.indptr.nbytes
+        )
+
+    @property
+    def type_codes(self):
+        """
+        numpy.ndarray: Code of the type of each column, numbered in order of first
+        appearance.
+        """
+        return pd.factorize(self.types)[0]
+
+    @classmethod
+    def from_table(cls, table, sort=False, vocabulary=None):
+        """
+        Build the block matrix of a probability table.
+
+        Args:
+            table (pandas.DataFrame): Table with Block_ID, Type, Assembly and
+                Probability columns, with one row per (Block_ID, Type, Assembly).
+            sort (bool): Sort the rows by Block_ID and the columns by (Type, Assembly),
+                as pandas.pivot_table does. Otherwise both are in order of first
+                appearance.
+            vocabulary (TokenVocabulary): Vocabulary whose IDs number the columns; a
+                new one is created when omitted.
+
+        Returns:
+            BlockDistributionMatrix: The block matrix.
+        """
+        if vocabulary is None:
+            tokens = ()
+            if sort:
+                tokens = (
+                    table[["Type", "Assembly"]]
+                    .astype(str)
+                    .drop_duplicates()
+                    .sort_values(["Type", "Assembly"])
+                    .itertuples(index=False, name=None)
+                )
+            vocabulary = TokenVocabulary(tokens)
+        block_codes, block_ids = pd.factorize(table["Block_ID"], sort=sort)
+        token_ids = encode_token_table(table, vocabulary)
+        matrix = sparse.csr_matrix(
+            (
+                table["Probability"].to_numpy(dtype=np.float64),
+                (block_codes, token_ids),
+            ),
+            shape=(len(block_ids), len(vocabulary)),
+        )
+        types, assemblies = vocabulary.decode(np.arange(len(vocabulary)))
+        return cls(matrix, np.asarray(block_ids).astype(str), types, assemblies)
+
+    def normalized(self):
+        """
+        Normalize the probabilities of every (block, type) group to sum to one.
+
+        Returns:
+            BlockDistributionMatrix: A new block matrix with the normalized values.
+        """
+        type_codes = self.type_codes
+        type_columns = sparse.csr_matrix(
+            (np.ones(len(type_codes)), (np.arange(len(type_codes)), type_codes)),
+            shape=(len(type_codes), int(type_codes.max(initial=-1)) + 1),
+        )
+        sums = (self.matrix @ type_columns).toarray()
+        matrix = self.matrix.copy()
+        rows = np.repeat(np.arange(len(self)), np.diff(matrix.indptr))
+        matrix.data = matrix.data / sums[rows, type_codes[matrix.indices]]
+        return BlockDistributionMatrix(
+            matrix, self.block_ids, self.types, self.assemblies
+        )
+
+    def deduplicated(self):
+        """
+        Collapse blocks with identical distributions to one representative each.
+
+        Returns:
+            tuple: A tuple containing:
+                - BlockDistributionMatrix: The first block of every group of identical
+                  blocks, in order of first appearance
+                - numpy.ndarray: Position of the representative of every block, so
+                  values computed for the representatives expand to all blocks as
+                  values[inverse]
+                - numpy.ndarray: Number of blocks each representative stands for
+
+        Every row is hashed from its (column, value) entries, independent of their
+        order, and each block is then compared entry by entry with the representative
+        of its hash; a block that differs from it (a hash collision) is kept as a
+        representative of its own.
+        """
+        matrix = self.matrix.copy()
+        matrix.eliminate_zeros()
+        lengths = np.diff(matrix.indptr)
+        filled = lengths > 0
+        entries = matrix.indices.astype(np.uint64) * np.uint64(_HASH_MULTIPLIERS[0])
+        entries ^= matrix.data.view(np.uint64)
+
+        keys = np.zeros((len(self), 3), dtype=np.uint64)
+        keys[:, 0] = lengths
+        if len(entries):
+            for column, multiplier in enumerate(_HASH_MULTIPLIERS[1:], 1):
+                keys[filled, column] = np.add.reduceat(
+                    _mix(entries * np.uint64(multiplier)), matrix.indptr[:-1][filled]
+                )
+        _, first, groups = np.unique(
+            keys, axis=0, return_index=True, return_inverse=True
+        )
+        representative_rows = first[groups.ravel()]
+
+        differences = matrix - matrix[representative_rows]
+        differences.eliminate_zeros()
+        collisions = np.diff(differences.indptr) > 0
+        representative_rows[collisions] = np.flatnonzero(collisions)
+
+        representatives, inverse, counts = np.unique(
+            representative_rows, return_inverse=True, return_counts=True
+        )
+        return (
+            BlockDistributionMatrix(
+                self.matrix[representatives],
+                self.block_ids[representatives],
+                self.types,
+                self.assemblies,
+            ),
+            inverse,
+            counts,
+        )
+
+    def to_frame(self):
+        """
+        Convert the block matrix to a dense DataFrame.
+
+        Returns:
+            pandas.DataFrame: The same layout pandas.pivot_table(index="Block_ID",
+            columns=["Type", "Assembly"], fill_value=0) gives. Only meant for small
+            matrices.
+        """
+        return pd.DataFrame(
+            self.matrix.toarray(),
+            index=pd.Index(self.block_ids, name="Block_ID"),
+            columns=pd.MultiIndex.from_arrays(
+                [self.types, self.assemblies], names=["Type", "Assembly"]
+            ),
+        )
+
+    def save(self, path):
+        """
+        Save the block matrix to an .npz file.
+
+        Args:
+            path (str): Output path.
+        """
+        with open(path, "wb") as file:
+            np.savez_compressed(
+                file,
+                data=self.matrix.data,
+                indices=self.matrix.indices,
+                indptr=self.matrix.indptr,
+                shape=np.asarray(self.matrix.shape),
+                block_ids=self.block_ids,
+                types=self.types,
+                assemblies=self.assemblies,
+            )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a block matrix saved with save.
+
+        Args:
+            path (str): Path of the .npz file.
+
+        Returns:
+            BlockDistributionMatrix: The block matrix.
+        """
+        with np.load(path, allow_pickle=False) as arrays:
+            matrix = sparse.csr_matrix(
+                (arrays["data"], arrays["indices"], arrays["indptr"]),
+                shape=tuple(arrays["shape"]),
+            )
+            return cls(
+                matrix, arrays["block_ids"], arrays["types"], arrays["assemblies"]
+            )
+
+
+def block_matrix_path(path):
+    """
+    Get the path of the block matrix that accompanies a probability table.
+
+    Args:
+        path (str): Path of the probability (or filtered entropy) table.
+
+    Returns:
+        str: The path with the extension replaced by "_block_matrix.npz".
+    """
+    return f"{os.path.splitext(path)[0]}_block_matrix.npz"
+
+
+def load_block_matrix(table_file):
+    """
+    Load the block matrix of a probability table, building and saving it on first use.
+
+    Args:
+        table_file (str): Path to the CSV, .parquet or .npz probability (or filtered
+            entropy) table.
+
+    Returns:
+        BlockDistributionMatrix: The block matrix, with rows sorted by Block_ID and
+        columns by (Type, Assembly). It is rebuilt when the table is newer than the
+        saved matrix.
+    """
+    matrix_file = block_matrix_path(table_file)
+    up_to_date = os.path.exists(matrix_file) and (
+        os.path.getmtime(matrix_file) >= os.path.getmtime(table_file)
+    )
+    if up_to_date:
+        return BlockDistributionMatrix.load(matrix_file)
+    block_matrix = BlockDistributionMatrix.from_table(read_table(table_file), sort=True)
+    block_matrix.save(matrix_file)
+    return block_matrix
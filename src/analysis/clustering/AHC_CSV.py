@@ -4,93 +4,47 @@ It performs clustering analysis using Jensen-Shannon Divergence as the distance
 and generates dendrograms to visualize the clustering results.
 """
 
+import os
+import sys
 import pandas as pd
 import numpy as np
-from scipy.spatial.distance import pdist, squareform
+from scipy.spatial.distance import squareform
 from scipy.cluster.hierarchy import linkage, dendrogram, fcluster
 import matplotlib.pyplot as plt
-import scipy.stats as stats
 
-# Load the CSV data
-data = pd.read_csv(r"entropy_preprocessed\csv_parser_filtered_entropy.csv")
+from jsd_distance import jensen_shannon_distances
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from block_matrix import load_block_matrix  # pylint: disable=wrong-import-position
 
-# Normalize probabilities within each block
-def normalize_probabilities(df):
-    """
-    Normalize probabilities within each block and assembly type combination.
-
-    Args:
-        df (pandas.DataFrame): Input DataFrame containing Block_ID, Type, Assembly,
-                             and Probability columns
-
-    Returns:
-        pandas.DataFrame: A new DataFrame with normalized probabilities where the sum
-                         of probabilities for each block and assembly type combination
-                         equals 1
-    """
-    normalized_df = df.copy()
-    for block_id in normalized_df["Block_ID"].unique():
-        for assembly_type in normalized_df["Type"].unique():
-            mask = (normalized_df["Block_ID"] == block_id) & (
-                normalized_df["Type"] == assembly_type
-            )
-            prob_sum = normalized_df.loc[mask, "Probability"].sum()
-            normalized_df.loc[mask, "Probability"] = (
-                normalized_df.loc[mask, "Probability"] / prob_sum
-            )
-    return normalized_df
+# Load the block matrix of the filtered entropy data (built and saved on first use)
+INPUT_FILE = r"entropy_preprocessed\csv_parser_filtered_entropy.csv"
+block_matrix = load_block_matrix(INPUT_FILE)
 
-
-normalized_data = normalize_probabilities(data)
-normalized_data = normalized_data.drop(columns=["Entropy"])
+# Cluster one representative of every group of identical blocks (modify as needed).
+# Average linkage then counts each distinct distribution once, so a few merges can
+# differ from clustering every block; off by default to keep the same clusters.
+DEDUPLICATE = False
 
 
 # Prepare data for clustering
-def prepare_data_for_clustering(df):
+def prepare_data_for_clustering(matrix):
     """
-    Prepare the data for clustering by creating a pivot table from the input DataFrame.
+    Prepare the data for clustering by normalizing the probabilities of every block.
 
     Args:
-        df (pandas.DataFrame): Input DataFrame containing Block_ID, Type, Assembly,
-            and Probability columns
+        matrix (BlockDistributionMatrix): Sparse block x (Type, Assembly) matrix of
+            probabilities.
 
     Returns:
-        pandas.DataFrame: A pivot table with Block_ID as index, compound columns of Type and
-                         and Probability values. Missing values are filled with 0.
-    """
-    pivot_df = df.pivot_table(
-        index="Block_ID",
-        columns=["Type", "Assembly"],
-        values="Probability",
-        fill_value=0,
-    )
-    return pivot_df
-
-
-clustering_data = prepare_data_for_clustering(normalized_data)
-
-
-# Function to calculate Jensen-Shannon Divergence
-def jensen_shannon_divergence(p, q):
+        BlockDistributionMatrix: The matrix with the probabilities of each block and
+            type combination normalized to sum to 1. Rows are sorted by Block_ID and
+            columns by (Type, Assembly), as in a pivot table.
     """
-    Calculate the Jensen-Shannon Divergence between two probability distributions.
+    return matrix.normalized()
 
-    Args:
-        p (array-like): First probability distribution
-        q (array-like): Second probability distribution
 
-    Returns:
-        float: The Jensen-Shannon Divergence between p and q, which is a value between 0 and 1
-              where 0 indicates identical distributions and 1 indicates maximally
-              different distributions
-    """
-    p = np.asarray(p)
-    q = np.asarray(q)
-    m = 0.5 * (p + q)
-    kl_p_m = stats.entropy(p, m)
-    kl_q_m = stats.entropy(q, m)
-    return 0.5 * (kl_p_m + kl_q_m)
+clustering_data = prepare_data_for_clustering(block_matrix)
 
 
 # Calculate distance matrix using JSD
@@ -99,24 +53,42 @@ def calculate_jsd_matrix(input_data):
     Calculate the Jensen-Shannon Divergence (JSD) matrix for the input data.
 
     Args:
-        input_data: DataFrame containing the probability distributions to compare
+        input_data (BlockDistributionMatrix): Normalized block matrix whose rows (its
+            .matrix) are the probability distributions to compare
 
     Returns:
         numpy.ndarray: A square matrix containing pairwise JSD distances between input
             distributions
     """
-    dist_matrix = squareform(pdist(input_data, metric=jensen_shannon_divergence))
+    dist_matrix = squareform(jensen_shannon_distances(input_data.matrix))
     return dist_matrix
 
 
-distance_matrix = calculate_jsd_matrix(clustering_data)
+# Collapse identical blocks; every block is given the cluster of its representative,
+# and each distinct distribution counts once in the average linkage
+representatives = clustering_data
+inverse = np.arange(len(clustering_data))
+counts = np.ones(len(clustering_data), dtype=np.int64)
+if DEDUPLICATE:
+    representatives, inverse, counts = clustering_data.deduplicated()
+
+# linkage compares the rows of the distance matrix, so the column of every
+# representative is weighted to keep the row distances of the full matrix
+distance_matrix = calculate_jsd_matrix(representatives) * np.sqrt(counts)
 
 # Perform Agglomerative Hierarchical Clustering
 linkage_matrix = linkage(distance_matrix, method="average")
 
-# Plot dendrogram
+# Plot dendrogram, with the number of identical blocks behind each leaf
 plt.figure(figsize=(10, 7))
-dendrogram(linkage_matrix, labels=clustering_data.index, leaf_rotation=90)
+dendrogram(
+    linkage_matrix,
+    labels=[
+        f"{block_id} (x{count})" if count > 1 else block_id
+        for block_id, count in zip(representatives.block_ids, counts)
+    ],
+    leaf_rotation=90,
+)
 plt.title("Agglomerative Hierarchical Clustering using JSD")
 plt.xlabel("Block ID")
 plt.ylabel("Distance (JSD)")
@@ -124,10 +96,12 @@ plt.show()
 
 # Cut the dendrogram into clusters
 DISTANCE_THRESHOLD = 0.5  # Set your desired distance threshold here
-clusters = fcluster(linkage_matrix, t=DISTANCE_THRESHOLD, criterion="distance")
+clusters = fcluster(linkage_matrix, t=DISTANCE_THRESHOLD, criterion="distance")[inverse]
 
 # Create DataFrame mapping Block_ID to Cluster
-cluster_mapping = pd.DataFrame({"Block_ID": clustering_data.index, "Cluster": clusters})
+cluster_mapping = pd.DataFrame(
+    {"Block_ID": clustering_data.block_ids, "Cluster": clusters}
+)
 
 # Write the DataFrame to a CSV file
 cluster_mapping.to_csv(r"clusters/csv_parser_clusters.csv", index=False)
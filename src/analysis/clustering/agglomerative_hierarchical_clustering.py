@@ -1,54 +1,32 @@
 """
 This module implements Agglomerative Hierarchical Clustering (AHC) for analyzing
 binary code blocks. It provides functionality to:
-- Read similarity matrices from CSV files
+- Read similarity matrices from CSV or condensed .npy files
 - Convert similarity scores to distances
 - Perform hierarchical clustering
 - Generate dendrograms
 - Output cluster assignments
 
 The module uses Ward's method for clustering and supports both static and
-interactive visualizations of the clustering results.
+interactive visualizations of the clustering results. Sparse nearest-neighbor
+graphs (.npz) are clustered with single linkage over their edges instead, which
+never builds the full matrix.
 """
 
+import os
+import sys
 import csv
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.cluster.hierarchy import linkage, dendrogram, fcluster
+from scipy.sparse import coo_matrix, csgraph
 import plotly.figure_factory as ff
 
-
-# Function to read similarity matrix from CSV file
-def read_similarity_matrix(INPUT_FILE, block_ids):
-    """
-    Read a similarity matrix from a CSV file.
-
-    Args:
-        INPUT_FILE (str): Path to the input CSV file containing similarity scores
-        block_ids (list): List of block identifiers
-
-    Returns:
-        numpy.ndarray: A square similarity matrix where each element [i,j] represents
-                      the similarity score between blocks i and j
-
-    The function expects the CSV file to:
-    - Have a header row (which is skipped)
-    - Contain three columns: block_id1, block_id2, and similarity score
-    - Store similarity scores for pairs of blocks
-    The resulting matrix is symmetric, with identical values for [i,j] and [j,i]
-    """
-    size = len(block_ids)
-    similarity_matrix = np.zeros((size, size))
-    with open(INPUT_FILE, newline="", encoding="UTF-8") as csvfile:
-        reader = csv.reader(csvfile)
-        next(reader)  # Skip header
-        for row in reader:
-            block_id1, block_id2, similarity = row
-            i = block_ids.index(block_id1)
-            j = block_ids.index(block_id2)
-            similarity_matrix[i, j] = float(similarity)
-            similarity_matrix[j, i] = float(similarity)  # symmetric matrix
-    return similarity_matrix
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from columnar_io import (  # pylint: disable=wrong-import-position
+    read_similarity_graph,
+    read_similarity_matrix,
+)
 
 
 # Convert similarity matrix to distance matrix
@@ -145,6 +123,32 @@ def get_cluster_assignments(Z, max_d):
     return clusters
 
 
+# Cluster a sparse nearest-neighbor graph
+def cluster_similarity_graph(graph, max_d):
+    """
+    Get single-linkage cluster assignments from a sparse nearest-neighbor graph.
+
+    Args:
+        graph (scipy.sparse.csr_matrix): Symmetric block x block matrix of the
+            divergences of the neighbor pairs, as returned by read_similarity_graph
+        max_d (float): The threshold distance for forming flat clusters
+
+    Returns:
+        numpy.ndarray: An array containing cluster labels (starting at 1) for each
+                      block. Blocks joined by a chain of graph edges no longer than
+                      max_d share a cluster, as in a single-linkage cut restricted to
+                      the graph.
+    """
+    graph = graph.tocoo()
+    close = graph.data <= max_d
+    adjacency = coo_matrix(
+        (np.ones(close.sum()), (graph.row[close], graph.col[close])),
+        shape=graph.shape,
+    )
+    _, labels = csgraph.connected_components(adjacency, directed=False)
+    return labels + 1
+
+
 # Write clusters to a CSV file
 def write_clusters_to_csv(block_ids, clusters, OUTPUT_FILE):
     """
@@ -172,7 +176,8 @@ def main():
     Main function that orchestrates the Agglomerative Hierarchical Clustering process.
 
     This function:
-    1. Reads a similarity matrix from a CSV file
+    1. Reads a similarity matrix from a CSV file (a sparse .npz nearest-neighbor
+       graph is clustered with cluster_similarity_graph instead)
     2. Converts it to a distance matrix
     3. Performs hierarchical clustering
     4. Generates and displays a dendrogram
@@ -181,10 +186,18 @@ def main():
     """
     INPUT_FILE = "similarity\csv_parser_block_similarity\csv_parser_block_similarity_normalized.csv"
     OUTPUT_FILE = "csv_parser_clusters.csv"
-    block_ids = [str(i) for i in range(1, 153)]  # Example with 100 blocks
 
-    # Read the similarity matrix
-    similarity_matrix = read_similarity_matrix(INPUT_FILE, block_ids)
+    if INPUT_FILE.endswith(".npz"):
+        # Sparse nearest-neighbor graph: cluster over its edges only
+        graph, block_ids = read_similarity_graph(INPUT_FILE)
+        max_d = 0.5 * graph.data.max(initial=0)  # Example threshold, adjust as needed
+        clusters = cluster_similarity_graph(graph, max_d)
+        write_clusters_to_csv(block_ids, clusters, OUTPUT_FILE)
+        print(f"Cluster assignments written to: {OUTPUT_FILE}")
+        return
+
+    # Read the similarity matrix and the block IDs it lists
+    similarity_matrix, block_ids = read_similarity_matrix(INPUT_FILE)
 
     # Convert to distance matrix
     distance_matrix = similarity_to_distance(similarity_matrix)
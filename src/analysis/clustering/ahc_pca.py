@@ -4,38 +4,18 @@ It provides functionality to process similarity matrices, perform clustering ana
 and visualize results using Principal Component Analysis (PCA).
 """
 
+import os
+import sys
 import csv
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.decomposition import PCA
 from scipy.cluster.hierarchy import linkage, fcluster
 
-
-# Function to read similarity matrix from CSV file
-def read_similarity_matrix(input_file, block_ids):
-    """
-    Reads a similarity matrix from a CSV file and constructs a symmetric matrix.
-
-    Args:
-        input_file (str): Path to the CSV file containing similarity scores
-        block_ids (list): List of block identifiers
-
-    Returns:
-        numpy.ndarray: A symmetric similarity matrix where each element [i,j]
-        represents the similarity score between blocks i and j
-    """
-    size = len(block_ids)
-    similarity_matrix = np.zeros((size, size))
-    with open(input_file, newline="", encoding="UTF-8") as csvfile:
-        reader = csv.reader(csvfile)
-        next(reader)  # Skip header
-        for row in reader:
-            block_id1, block_id2, similarity = row
-            i = block_ids.index(block_id1)
-            j = block_ids.index(block_id2)
-            similarity_matrix[i, j] = float(similarity)
-            similarity_matrix[j, i] = float(similarity)  # symmetric matrix
-    return similarity_matrix
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from columnar_io import (  # pylint: disable=wrong-import-position
+    read_similarity_matrix,
+)
 
 
 # Convert similarity matrix to distance matrix
@@ -126,7 +106,7 @@ def visualize_clusters_pca(distance_matrix, clusters, block_ids):
 def main():
     """
     Main function that performs the following operations:
-    1. Reads similarity matrix from CSV file
+    1. Reads similarity matrix from a CSV or condensed .npy file
     2. Converts similarity matrix to distance matrix
     3. Performs Agglomerative Hierarchical Clustering
     4. Assigns clusters based on a threshold
@@ -137,10 +117,9 @@ def main():
         None
     """
     input_file = "similarity\csv_parser_block_similarity\csv_parser_filtered_block_similarity_normalized.csv"
-    block_ids = [str(i) for i in range(1, 153)]  # Example with 100 blocks
 
-    # Read the similarity matrix
-    similarity_matrix = read_similarity_matrix(input_file, block_ids)
+    # Read the similarity matrix and the block IDs it lists
+    similarity_matrix, block_ids = read_similarity_matrix(input_file)
 
     # Convert to distance matrix
     distance_matrix = similarity_to_distance(similarity_matrix)
@@ -0,0 +1,320 @@
+"""
+This module provides a precomputed index over an entropy table for fast threshold sweeps.
+The entropies of every (Block_ID, Type) group are stored sorted, together with the group's
+mean and standard deviations. Any "mean + k * std" (or z-score >= k) filter then reduces to
+one binary search per group, so a whole range of k values can be evaluated in milliseconds
+without rescanning the entropy file.
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+from threshold import calculate_group_statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from columnar_io import read_table  # pylint: disable=wrong-import-position
+
+# Define input and index file paths (modify as needed)
+INPUT_FILE = "entropy/csv_parser_entropy.csv"
+INDEX_FILE = "entropy/csv_parser_entropy_index.npz"
+
+# Values of k evaluated by main (modify as needed)
+K_VALUES = np.arange(-1.0, 3.01, 0.25)
+
+
+class EntropyIndex:
+    """
+    Sorted per-group entropies of an entropy table, with their means and standard
+    deviations as computed by threshold.py and by pandas.
+
+    Groups are numbered in order of first appearance in the table. The entropies of
+    group g are sorted_entropies[offsets[g]:offsets[g + 1]], and row_positions holds
+    the row of the table each sorted entropy came from.
+    """
+
+    def __init__(
+        self,
+        block_ids,
+        variable_types,
+        offsets,
+        sorted_entropies,
+        row_positions,
+        means,
+        standard_deviations,
+        pandas_means,
+        pandas_standard_deviations,
+    ):
+        """
+        Create an index from its arrays (see from_table and load).
+
+        Args:
+            block_ids (numpy.ndarray): Block ID of each group.
+            variable_types (numpy.ndarray): Type of each group.
+            offsets (numpy.ndarray): Start of each group in sorted_entropies, followed
+                by the total number of rows.
+            sorted_entropies (numpy.ndarray): Entropies sorted within each group.
+            row_positions (numpy.ndarray): Table row of each sorted entropy.
+            means (numpy.ndarray): Mean entropy of each group.
+            standard_deviations (numpy.ndarray): Population standard deviation of the
+                entropies of each group.
+            pandas_means (numpy.ndarray): Mean entropy of each group, as pandas'
+                groupby mean computes it.
+            pandas_standard_deviations (numpy.ndarray): Sample standard deviation of
+                the entropies of each group, as pandas' groupby std computes it (NaN
+                for single entropies).
+        """
+        self.block_ids = block_ids
+        self.variable_types = variable_types
+        self.offsets = offsets
+        self.sorted_entropies = sorted_entropies
+        self.row_positions = row_positions
+        self.means = means
+        self.standard_deviations = standard_deviations
+        self.pandas_means = pandas_means
+        self.pandas_standard_deviations = pandas_standard_deviations
+        self.groups = {
+            (block_id, variable_type): group
+            for group, (block_id, variable_type) in enumerate(
+                zip(block_ids.tolist(), variable_types.tolist())
+            )
+        }
+
+    def __len__(self):
+        return len(self.means)
+
+    @classmethod
+    def from_table(cls, table):
+        """
+        Build the index of an entropy table.
+
+        Args:
+            table (pandas.DataFrame): Entropy table with Block_ID, Type and Entropy
+                columns.
+
+        Returns:
+            EntropyIndex: The index. Means and population standard deviations are bit
+            for bit equal to those used by threshold.py, and the pandas statistics to
+            those of groupby(["Block_ID", "Type"])["Entropy"].mean() and .std().
+        """
+        block_codes, block_ids = pd.factorize(table["Block_ID"].astype(str))
+        type_codes, variable_types = pd.factorize(table["Type"].astype(str))
+        group_codes, groups = pd.factorize(
+            block_codes.astype(np.int64) * len(variable_types) + type_codes
+        )
+        entropies = table["Entropy"].to_numpy(dtype=np.float64)
+        means, standard_deviations = calculate_group_statistics(group_codes, entropies)
+        pandas_statistics = (
+            pd.Series(entropies).groupby(group_codes).agg(["mean", "std"])
+        )
+
+        row_positions = np.lexsort((entropies, group_codes))
+        sizes = np.bincount(group_codes, minlength=len(groups))
+        return cls(
+            np.asarray(block_ids[groups // len(variable_types)], dtype=str),
+            np.asarray(variable_types[groups % len(variable_types)], dtype=str),
+            np.concatenate([[0], np.cumsum(sizes)]),
+            entropies[row_positions],
+            row_positions,
+            means,
+            standard_deviations,
+            pandas_statistics["mean"].to_numpy(),
+            pandas_statistics["std"].to_numpy(),
+        )
+
+    def thresholds(self, k=1.0, ddof=0):
+        """
+        Calculate the threshold mean + k * std of every group.
+
+        Args:
+            k (float): Number of standard deviations above the mean.
+            ddof (int): Delta degrees of freedom of the standard deviation; 0 for the
+                population statistics of threshold.py (np.mean, np.std), 1 for the
+                sample statistics of pandas (threshold_visualization.py).
+
+        Returns:
+            numpy.ndarray: The threshold of each group, bit for bit equal to
+            mean + k * std as numpy (ddof=0) or pandas' groupby (ddof=1) computes it.
+            Groups of a single entropy get NaN for ddof=1, which keeps none of their
+            entropies.
+
+        Raises:
+            ValueError: If ddof is not 0 or 1.
+        """
+        if ddof not in (0, 1):
+            raise ValueError(f"ddof must be 0 or 1, not {ddof!r}")
+        if ddof:
+            return self.pandas_means + k * self.pandas_standard_deviations
+        return self.means + k * self.standard_deviations
+
+    def sweep(self, k_values, ddof=0):
+        """
+        Find, for many values of k at once, where each group's kept entropies start.
+
+        Args:
+            k_values (array-like): Values of k to evaluate.
+            ddof (int): Delta degrees of freedom of the standard deviation.
+
+        Returns:
+            numpy.ndarray: Array of shape (len(k_values), len(index)). Entry [i, g] is
+            the first position in sorted_entropies of group g whose entropy is greater
+            than or equal to mean + k_values[i] * std, so the kept entropies are
+            sorted_entropies[entry:offsets[g + 1]].
+        """
+        k_values = np.atleast_1d(np.asarray(k_values, dtype=np.float64))
+        thresholds = np.stack([self.thresholds(k, ddof) for k in k_values])
+        thresholds[np.isnan(thresholds)] = np.inf
+
+        # Binary search within every group, for every k, in lockstep
+        low = np.broadcast_to(self.offsets[:-1], thresholds.shape).copy()
+        high = np.broadcast_to(self.offsets[1:], thresholds.shape).copy()
+        last = max(len(self.sorted_entropies) - 1, 0)
+        while np.any(low < high):
+            middle = (low + high) // 2
+            below = self.sorted_entropies[np.minimum(middle, last)] < thresholds
+            searching = low < high
+            low = np.where(searching & below, middle + 1, low)
+            high = np.where(searching & ~below, middle, high)
+        return low
+
+    def kept_counts(self, k_values, ddof=0):
+        """
+        Count the entropies kept by the mean + k * std filter for many values of k.
+
+        Args:
+            k_values (array-like): Values of k to evaluate.
+            ddof (int): Delta degrees of freedom of the standard deviation.
+
+        Returns:
+            numpy.ndarray: The number of kept table rows for each value of k.
+        """
+        cuts = self.sweep(k_values, ddof)
+        return (self.offsets[1:] - cuts).sum(axis=1)
+
+    def select(self, k=1.0, ddof=0):
+        """
+        Select the table rows kept by the mean + k * std filter.
+
+        Args:
+            k (float): Number of standard deviations above the mean. Keeping the rows
+                with a z-score of at least z is the same as k = z.
+            ddof (int): Delta degrees of freedom of the standard deviation.
+
+        Returns:
+            numpy.ndarray: Positions of the kept rows in the indexed table, in table
+            order. With k = 1 and ddof = 0 these are exactly the rows kept by
+            threshold.py.
+        """
+        cuts = self.sweep([k], ddof)[0]
+        kept = np.arange(len(self.sorted_entropies)) >= np.repeat(
+            cuts, np.diff(self.offsets)
+        )
+        return np.sort(self.row_positions[kept])
+
+    def group_entropies(self, block_id, variable_type, k=None, ddof=0):
+        """
+        Get the sorted entropies of one group, optionally only those above a threshold.
+
+        Args:
+            block_id (str): Block ID of the group.
+            variable_type (str): Type of the group (Instruction, Left Operand, ...).
+            k (float): Optional number of standard deviations above the mean.
+            ddof (int): Delta degrees of freedom of the standard deviation.
+
+        Returns:
+            numpy.ndarray: A view of the group's sorted entropies.
+
+        Raises:
+            KeyError: If the group is not in the index.
+        """
+        group = self.groups[(str(block_id), variable_type)]
+        start, stop = self.offsets[group], self.offsets[group + 1]
+        if k is not None:
+            start = self.sweep([k], ddof)[0, group]
+        return self.sorted_entropies[start:stop]
+
+    def group_rows(self, block_id, variable_type):
+        """
+        Get the table rows of one group.
+
+        Args:
+            block_id (str): Block ID of the group.
+            variable_type (str): Type of the group (Instruction, Left Operand, ...).
+
+        Returns:
+            numpy.ndarray: Positions of the group's rows in the indexed table, in
+            table order.
+
+        Raises:
+            KeyError: If the group is not in the index.
+        """
+        group = self.groups[(str(block_id), variable_type)]
+        start, stop = self.offsets[group], self.offsets[group + 1]
+        return np.sort(self.row_positions[start:stop])
+
+    def save(self, path):
+        """
+        Save the index to an .npz file.
+
+        Args:
+            path (str): Output path.
+        """
+        with open(path, "wb") as file:
+            np.savez(
+                file,
+                block_ids=self.block_ids,
+                variable_types=self.variable_types,
+                offsets=self.offsets,
+                sorted_entropies=self.sorted_entropies,
+                row_positions=self.row_positions,
+                means=self.means,
+                standard_deviations=self.standard_deviations,
+                pandas_means=self.pandas_means,
+                pandas_standard_deviations=self.pandas_standard_deviations,
+            )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an index saved with save.
+
+        Args:
+            path (str): Path of the .npz file.
+
+        Returns:
+            EntropyIndex: The index.
+        """
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(
+                arrays["block_ids"],
+                arrays["variable_types"],
+                arrays["offsets"],
+                arrays["sorted_entropies"],
+                arrays["row_positions"],
+                arrays["means"],
+                arrays["standard_deviations"],
+                arrays["pandas_means"],
+                arrays["pandas_standard_deviations"],
+            )
+
+
+def main():
+    """
+    Main function that builds (or loads) the entropy index of an entropy table and
+    prints how many rows the mean + k * std filter keeps for a range of k values.
+    """
+    if os.path.exists(INDEX_FILE):
+        index = EntropyIndex.load(INDEX_FILE)
+    else:
+        index = EntropyIndex.from_table(read_table(INPUT_FILE))
+        index.save(INDEX_FILE)
+        print("Entropy index written to:", INDEX_FILE)
+
+    total = len(index.sorted_entropies)
+    for k, kept in zip(K_VALUES, index.kept_counts(K_VALUES)):
+        print(f"k = {k:5.2f}: {kept} of {total} rows kept")
+
+
+if __name__ == "__main__":
+    main()
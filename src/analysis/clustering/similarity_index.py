@@ -0,0 +1,441 @@
+"""
+This module provides a persistent vantage-point tree over block distributions for "which blocks
+look like block X?" queries. The distance is the square root of the Jensen-Shannon divergence
+of the blocks' distributions, which is a metric, so the triangle inequality lets k-nearest and
+radius queries skip whole subtrees instead of scanning every block. The tree is built from the
+clustering-ready matrix of AHC_CSV.prepare_data_for_clustering and saved to an .npz file.
+"""
+
+import os
+import sys
+import time
+import heapq
+import numpy as np
+from scipy import sparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from block_matrix import load_block_matrix  # pylint: disable=wrong-import-position
+
+# Define input and index file paths (modify as needed)
+INPUT_FILE = "entropy_preprocessed/csv_parser_filtered_entropy.csv"
+INDEX_FILE = "csv_parser_similarity_index.npz"
+
+# Block queried by main and number of neighbors returned (modify as needed)
+QUERY_BLOCK = None  # None queries the first block of the index
+NEIGHBORS = 10
+
+# Largest number of blocks in a leaf of the tree
+LEAF_SIZE = 256
+
+# Seed used to pick the vantage points
+SEED = 0
+
+# Slack on the pruning bounds, so rounding never skips a block at the search radius
+TOLERANCE = 1e-9
+
+
+def _distances(query, indptr, indices, data):
+    """
+    Calculate the distance between a query distribution and some CSR rows.
+
+    Args:
+        query (numpy.ndarray): Dense distribution summing to one.
+        indptr (numpy.ndarray): Row pointers of the rows (not necessarily from 0).
+        indices (numpy.ndarray): Column indices of the matrix the rows belong to.
+        data (numpy.ndarray): Values of that matrix; every row sums to one.
+
+    Returns:
+        numpy.ndarray: sqrt(JSD) between the query and each row, with the natural
+        logarithm. Only the features the query shares with a row are visited, since
+        JSD = log(2) - 0.5 * sum(p * log(1 + q / p) + q * log(1 + p / q)) over them.
+    """
+    entries = slice(indptr[0], indptr[-1])
+    p, q = data[entries], query[indices[entries]]
+    shared = q > 0
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))[shared]
+    p, q = p[shared], q[shared]
+    overlaps = np.bincount(
+        rows, p * np.log1p(q / p) + q * np.log1p(p / q), minlength=len(indptr) - 1
+    )
+    return np.sqrt(np.maximum(np.log(2) - 0.5 * overlaps, 0))
+
+
+def _normalize_rows(data):
+    """
+    Scale every row of a matrix to sum to one.
+
+    Args:
+        data (numpy.ndarray or scipy.sparse.spmatrix): Non-negative matrix.
+
+    Returns:
+        scipy.sparse.csr_matrix: The scaled matrix without explicit zeros; rows that
+        sum to zero stay empty.
+    """
+    matrix = sparse.csr_matrix(data, dtype=np.float64, copy=True)
+    matrix.eliminate_zeros()
+    matrix.sort_indices()
+    sums = np.asarray(matrix.sum(axis=1)).ravel()
+    matrix.data /= np.repeat(np.where(sums > 0, sums, 1), np.diff(matrix.indptr))
+    return matrix
+
+
+class JensenShannonTree:
+    """
+    Vantage-point tree over the distributions of all blocks, with sqrt(JSD) distances.
+
+    The rows of matrix are stored in tree order, so every node covers a contiguous
+    range of rows starts[n]:stops[n]. The first row of an internal node is its vantage
+    point; the rest is split at middles[n] into an inner child, the half of the rows
+    closest to the vantage point, and an outer child. shells[n] holds the smallest and
+    largest distance from the vantage point to the rows of the inner child, then of
+    the outer child. Leaves have no children (-1).
+    """
+
+    def __init__(
+        self,
+        matrix,
+        block_ids,
+        starts,
+        stops,
+        middles,
+        shells,
+        inner_children,
+        outer_children,
+    ):
+        """
+        Create a tree from its arrays (see from_matrix and load).
+
+        Args:
+            matrix (scipy.sparse.csr_matrix): Block distributions in tree order, each
+                row summing to one.
+            block_ids (numpy.ndarray): Block ID of each row.
+            starts (numpy.ndarray): First row of each node.
+            stops (numpy.ndarray): End (exclusive) of the rows of each node.
+            middles (numpy.ndarray): First row of the outer child of each node.
+            shells (numpy.ndarray): nodes x 4 array of the distance range from the
+                vantage point to the inner child's rows, then to the outer child's.
+            inner_children (numpy.ndarray): Inner child of each node, or -1.
+            outer_children (numpy.ndarray): Outer child of each node, or -1.
+        """
+        self.matrix = matrix
+        self.block_ids = np.asarray(block_ids, dtype=str)
+        self.starts = starts
+        self.stops = stops
+        self.middles = middles
+        self.shells = shells
+        self.inner_children = inner_children
+        self.outer_children = outer_children
+        self.positions = {
+            block_id: position for position, block_id in enumerate(self.block_ids)
+        }
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @classmethod
+    def from_matrix(cls, data, block_ids, leaf_size=LEAF_SIZE, seed=SEED):
+        """
+        Build the tree of a block x feature matrix.
+
+        Args:
+            data (numpy.ndarray or scipy.sparse.spmatrix): Non-negative block
+                distributions, such as prepare_data_for_clustering(...).matrix; every
+                row is scaled to sum to one, so the divergence is the equal-weight JSD
+                whose square root is a metric. It equals the divergence of AHC_CSV.py
+                for blocks with the same number of types.
+            block_ids (array-like): Block ID of each row.
+            leaf_size (int): Largest number of blocks in a leaf (at least 2).
+            seed (int): Seed used to pick the vantage points.
+
+        Returns:
+            JensenShannonTree: The tree. Building it takes about n * log2(n / leaf_size)
+            distance evaluations.
+        """
+        matrix = _normalize_rows(data)
+        leaf_size = max(leaf_size, 2)
+        rng = np.random.default_rng(seed)
+        order = np.arange(matrix.shape[0])
+        nodes = []
+        pending = [(-1, False, 0, len(order))]
+        while pending:
+            parent, outer, start, stop = pending.pop()
+            node = len(nodes)
+            nodes.append([start, stop, stop, 0.0, 0.0, 0.0, 0.0, -1, -1])
+            if parent >= 0:
+                nodes[parent][8 if outer else 7] = node
+            if stop - start <= leaf_size:
+                continue
+
+            # Move a random vantage point to the front and sort the rest by distance
+            pick = rng.integers(start, stop)
+            order[[start, pick]] = order[[pick, start]]
+            vantage = matrix[order[start]].toarray().ravel()
+            rows = matrix[order[start + 1 : stop]]
+            distances = _distances(vantage, rows.indptr, rows.indices, rows.data)
+            ranking = np.argsort(distances, kind="stable")
+            order[start + 1 : stop] = order[start + 1 : stop][ranking]
+            distances = distances[ranking]
+
+            half = (stop - start - 1) // 2
+            middle = start + 1 + half
+            nodes[node][2:7] = [
+                middle,
+                distances[0],
+                distances[half - 1],
+                distances[half],
+                distances[-1],
+            ]
+            pending.append((node, True, middle, stop))
+            pending.append((node, False, start + 1, middle))
+
+        nodes = np.asarray(nodes, dtype=np.float64).reshape(-1, 9)
+        return cls(
+            matrix[order],
+            np.asarray(block_ids, dtype=str)[order],
+            nodes[:, 0].astype(np.int64),
+            nodes[:, 1].astype(np.int64),
+            nodes[:, 2].astype(np.int64),
+            nodes[:, 3:7],
+            nodes[:, 7].astype(np.int64),
+            nodes[:, 8].astype(np.int64),
+        )
+
+    def distribution(self, query):
+        """
+        Get the dense, normalized distribution of a query.
+
+        Args:
+            query (str or array-like): Block ID of an indexed block, or a distribution
+                over the same features (columns) as the indexed matrix.
+
+        Returns:
+            numpy.ndarray: The distribution, scaled to sum to one.
+
+        Raises:
+            KeyError: If a block ID is not in the index.
+        """
+        if isinstance(query, str):
+            row = self.positions[query]
+            return self.matrix[row].toarray().ravel()
+        return _normalize_rows(np.asarray(query).reshape(1, -1)).toarray().ravel()
+
+    def _row_distances(self, query, start, stop):
+        """
+        Calculate the distances between a query and the rows start:stop.
+
+        Args:
+            query (numpy.ndarray): Dense distribution summing to one.
+            start (int): First row.
+            stop (int): End (exclusive) of the rows.
+
+        Returns:
+            numpy.ndarray: sqrt(JSD) to each row.
+        """
+        return _distances(
+            query,
+            self.matrix.indptr[start : stop + 1],
+            self.matrix.indices,
+            self.matrix.data,
+        )
+
+    def _vantage_distance(self, query, row):
+        """
+        Calculate the distance between a query and a single row.
+
+        Args:
+            query (numpy.ndarray): Dense distribution summing to one.
+            row (int): Row position.
+
+        Returns:
+            float: sqrt(JSD) to the row, as _row_distances with fewer array operations.
+        """
+        entries = slice(self.matrix.indptr[row], self.matrix.indptr[row + 1])
+        p, q = self.matrix.data[entries], query[self.matrix.indices[entries]]
+        shared = q > 0
+        p, q = p[shared], q[shared]
+        overlap = np.dot(p, np.log1p(q / p)) + np.dot(q, np.log1p(p / q))
+        return float(np.sqrt(max(np.log(2) - 0.5 * overlap, 0.0)))
+
+    def _search(self, query, visit):
+        """
+        Walk the tree, skipping the subtrees that the triangle inequality rules out.
+
+        Args:
+            query (numpy.ndarray): Dense distribution summing to one.
+            visit (function): visit(rows, distances) called with the positions and
+                distances of the rows examined; returns the current search radius.
+
+        Nodes are visited in order of the lower bound on their distance from the
+        query, so the radius of a k-nearest search shrinks as early as possible and
+        the search stops at the first node that is out of reach.
+        """
+        radius = np.inf
+        pending = [(0.0, 0)]
+        while pending:
+            bound, node = heapq.heappop(pending)
+            if bound > radius + TOLERANCE:
+                break
+            start, stop = self.starts[node], self.stops[node]
+            if self.inner_children[node] < 0:
+                radius = visit(
+                    np.arange(start, stop), self._row_distances(query, start, stop)
+                )
+                continue
+
+            distance = self._vantage_distance(query, start)
+            if distance <= radius:
+                radius = visit(np.array([start]), np.array([distance]))
+
+            # Lower bounds on the distance to any row of each child
+            inner_low, inner_high, outer_low, outer_high = self.shells[node]
+            inner_bound = max(distance - inner_high, inner_low - distance, bound)
+            outer_bound = max(distance - outer_high, outer_low - distance, bound)
+            heapq.heappush(pending, (inner_bound, self.inner_children[node]))
+            heapq.heappush(pending, (outer_bound, self.outer_children[node]))
+
+    def nearest(self, query, k=NEIGHBORS):
+        """
+        Find the k blocks closest to a query.
+
+        Args:
+            query (str or array-like): Block ID of an indexed block, or a distribution
+                over the indexed features.
+            k (int): Number of blocks returned.
+
+        Returns:
+            tuple: A tuple containing:
+                - list: Block IDs of the k nearest blocks, nearest first (a queried
+                  block is its own nearest block, at distance 0)
+                - numpy.ndarray: Their sqrt(JSD) distances from the query
+        """
+        query = self.distribution(query)
+        k = min(k, len(self))
+        best_rows = np.empty(0, dtype=np.int64)
+        best = np.empty(0)
+
+        def visit(rows, distances):
+            nonlocal best_rows, best
+            if len(best) == k:
+                closer = distances <= best.max()
+                rows, distances = rows[closer], distances[closer]
+            best_rows = np.concatenate([best_rows, rows])
+            best = np.concatenate([best, distances])
+            if len(best) > k:
+                keep = np.lexsort((best_rows, best))[:k]
+                best_rows, best = best_rows[keep], best[keep]
+            return best.max() if len(best) == k else np.inf
+
+        if k > 0:
+            self._search(query, visit)
+        order = np.lexsort((best_rows, best))
+        return self.block_ids[best_rows[order]].tolist(), best[order]
+
+    def within(self, query, radius):
+        """
+        Find all blocks within a distance of a query.
+
+        Args:
+            query (str or array-like): Block ID of an indexed block, or a distribution
+                over the indexed features.
+            radius (float): Largest sqrt(JSD) distance returned.
+
+        Returns:
+            tuple: A tuple containing:
+                - list: Block IDs of the blocks within the radius, nearest first
+                - numpy.ndarray: Their sqrt(JSD) distances from the query
+        """
+        query = self.distribution(query)
+        found_rows, found = [], []
+
+        def visit(rows, distances):
+            close = distances <= radius
+            found_rows.append(rows[close])
+            found.append(distances[close])
+            return radius
+
+        self._search(query, visit)
+        found_rows = np.concatenate(found_rows)
+        found = np.concatenate(found)
+        order = np.lexsort((found_rows, found))
+        return self.block_ids[found_rows[order]].tolist(), found[order]
+
+    def save(self, path):
+        """
+        Save the tree to an .npz file.
+
+        Args:
+            path (str): Output path.
+        """
+        with open(path, "wb") as file:
+            np.savez(
+                file,
+                data=self.matrix.data,
+                indices=self.matrix.indices,
+                indptr=self.matrix.indptr,
+                shape=np.asarray(self.matrix.shape),
+                block_ids=self.block_ids,
+                starts=self.starts,
+                stops=self.stops,
+                middles=self.middles,
+                shells=self.shells,
+                inner_children=self.inner_children,
+                outer_children=self.outer_children,
+            )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a tree saved with save.
+
+        Args:
+            path (str): Path of the .npz file.
+
+        Returns:
+            JensenShannonTree: The tree.
+        """
+        with np.load(path, allow_pickle=False) as arrays:
+            matrix = sparse.csr_matrix(
+                (arrays["data"], arrays["indices"], arrays["indptr"]),
+                shape=tuple(arrays["shape"]),
+            )
+            return cls(
+                matrix,
+                arrays["block_ids"],
+                arrays["starts"],
+                arrays["stops"],
+                arrays["middles"],
+                arrays["shells"],
+                arrays["inner_children"],
+                arrays["outer_children"],
+            )
+
+
+def main():
+    """
+    Main function that builds (or loads) the similarity index of a filtered entropy
+    table and prints the blocks nearest to QUERY_BLOCK.
+    """
+    if os.path.exists(INDEX_FILE):
+        index = JensenShannonTree.load(INDEX_FILE)
+    else:
+        # Same matrix as AHC_CSV.prepare_data_for_clustering
+        clustering_data = load_block_matrix(INPUT_FILE).normalized()
+        index = JensenShannonTree.from_matrix(
+            clustering_data.matrix, clustering_data.block_ids
+        )
+        index.save(INDEX_FILE)
+        print("Similarity index written to:", INDEX_FILE)
+
+    query = QUERY_BLOCK if QUERY_BLOCK is not None else str(index.block_ids[0])
+    start = time.perf_counter()
+    block_ids, distances = index.nearest(query, NEIGHBORS)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{len(block_ids)} blocks nearest to block {query} ({elapsed * 1000:.1f} ms):"
+    )
+    for block_id, distance in zip(block_ids, distances):
+        print(f"  {block_id}: sqrt(JSD) = {distance:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,100 @@ It calculates entropy statistics for different variable types within blocks and
 thresholds to filter out low entropy variables.
 """
 
+import os
+import sys
 import csv
+import math
 import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from columnar_io import (  # pylint: disable=wrong-import-position
+    is_csv,
+    read_table,
+    write_table,
+)
+
+# Compute the thresholds in streaming passes with bounded memory (modify as needed)
+STREAMING = False
+
+
+def calculate_group_statistics(group_codes, entropies):
+    """
+    Calculate the mean and standard deviation of the entropies of many groups at once.
+
+    Args:
+        group_codes (numpy.ndarray): Group code (0 to number of groups - 1) of each row.
+        entropies (numpy.ndarray): Entropy of each row.
+
+    Returns:
+        tuple: Two numpy arrays holding the mean and the (population) standard
+               deviation of each group, indexed by group code.
+
+    Groups of the same size are summed together as the rows of one 2D array, so the
+    results are bit for bit equal to np.mean and np.std over the group's entropies in
+    row order.
+    """
+    group_codes = np.asarray(group_codes)
+    entropies = np.asarray(entropies, dtype=np.float64)
+    sizes = np.bincount(group_codes)
+    starts = np.cumsum(sizes) - sizes
+    sorted_entropies = entropies[np.argsort(group_codes, kind="stable")]
+
+    means, standard_deviations = np.zeros(len(sizes)), np.zeros(len(sizes))
+    for size in np.unique(sizes[sizes > 0]):
+        groups = np.flatnonzero(sizes == size)
+        values = sorted_entropies[starts[groups, None] + np.arange(size)]
+        means[groups] = values.sum(axis=1) / size
+        deviations = values - means[groups, None]
+        standard_deviations[groups] = np.sqrt(
+            (deviations * deviations).sum(axis=1) / size
+        )
+    return means, standard_deviations
+
+
+def calculate_group_thresholds(group_codes, entropies):
+    """
+    Calculate mean + standard deviation of the entropies of many groups at once.
+
+    Args:
+        group_codes (numpy.ndarray): Group code (0 to number of groups - 1) of each row.
+        entropies (numpy.ndarray): Entropy of each row.
+
+    Returns:
+        numpy.ndarray: The threshold of each group, indexed by group code. Thresholds
+        are bit for bit equal to np.mean + np.std (see calculate_group_statistics).
+    """
+    means, standard_deviations = calculate_group_statistics(group_codes, entropies)
+    return means + standard_deviations
+
+
+def filter_entropy_table(table):
+    """
+    Keep the rows of an entropy table whose entropy reaches their group's threshold.
+
+    Args:
+        table (pandas.DataFrame): Entropy table with Block_ID, Type and Entropy columns.
+
+    Returns:
+        tuple: A tuple containing:
+            - pandas.DataFrame: The filtered table, in the original row order
+            - dict: The thresholds as {block_id: {variable_type: threshold}}
+    """
+    block_codes, block_ids = pd.factorize(table["Block_ID"])
+    type_codes, variable_types = pd.factorize(table["Type"])
+    group_codes, groups = pd.factorize(
+        block_codes.astype(np.int64) * len(variable_types) + type_codes
+    )
+    thresholds = calculate_group_thresholds(group_codes, table["Entropy"].to_numpy())
+
+    block_variable_thresholds = {}
+    for group, threshold in zip(groups.tolist(), thresholds.tolist()):
+        block_variable_thresholds.setdefault(
+            str(block_ids[group // len(variable_types)]), {}
+        )[str(variable_types[group % len(variable_types)])] = threshold
+    keep = table["Entropy"].to_numpy() >= thresholds[group_codes]
+    return table[keep], block_variable_thresholds
 
 
 # Function to calculate entropy statistics for each variable type within each block
@@ -14,7 +106,7 @@ def calculate_variable_type_entropy_statistics(input_file):
     Calculate entropy statistics for each variable type within each block from input CSV file.
 
     Args:
-        input_file (str): Path to the input CSV file containing entropy data
+        input_file (str): Path to the input CSV (or .parquet/.npz) file containing entropy data
 
     Returns:
         dict: A nested dictionary containing entropy thresholds for each variable type
@@ -22,6 +114,19 @@ def calculate_variable_type_entropy_statistics(input_file):
               The structure is {block_id: {variable_type: threshold}}
               where threshold = mean_entropy + standard_deviation_entropy
     """
+    if not is_csv(input_file):
+        table = read_table(input_file)
+        block_variable_thresholds = {}
+        for (block_id, variable_type), entropies in table.groupby(
+            [table["Block_ID"].astype(str), table["Type"].astype(str)], sort=False
+        )["Entropy"]:
+            entropies = entropies.to_numpy()
+            threshold = np.mean(entropies) + np.std(entropies)
+            block_variable_thresholds.setdefault(block_id, {})[
+                variable_type
+            ] = threshold
+        return block_variable_thresholds
+
     block_variable_statistics = {}
     with open(input_file, newline="", encoding="UTF-8") as infile:
         reader = csv.DictReader(infile)
@@ -46,20 +151,150 @@ def calculate_variable_type_entropy_statistics(input_file):
     return block_variable_thresholds
 
 
+def _pairwise_sum(count):
+    """
+    Sum values sent one at a time in the order of numpy's pairwise summation.
+
+    Args:
+        count (int): Number of values that will be sent.
+
+    Returns:
+        float: The sum, as the value of the StopIteration raised by the last send.
+        It is bit for bit equal to np.sum over the values in the order they were
+        sent, as blocks of up to 128 values are summed in 8 interleaved partial sums
+        and longer runs are split in two halves (multiples of 8) summed separately.
+    """
+    if count < 8:
+        total = 0.0
+        for _ in range(count):
+            total += yield
+        return total
+    if count <= 128:
+        partial = []
+        for _ in range(8):
+            partial.append((yield))
+        for _ in range(count // 8 - 1):
+            for lane in range(8):
+                partial[lane] += yield
+        total = ((partial[0] + partial[1]) + (partial[2] + partial[3])) + (
+            (partial[4] + partial[5]) + (partial[6] + partial[7])
+        )
+        for _ in range(count % 8):
+            total += yield
+        return total
+    half = count // 2
+    half -= half % 8
+    return (yield from _pairwise_sum(half)) + (yield from _pairwise_sum(count - half))
+
+
+def _read_entropies(input_file):
+    """
+    Stream the rows of an entropy CSV file.
+
+    Args:
+        input_file (str): Path to the input CSV file containing entropy data
+
+    Yields:
+        tuple: ((block_id, variable_type), entropy) for every row, in file order.
+    """
+    with open(input_file, newline="", encoding="UTF-8") as infile:
+        for row in csv.DictReader(infile):
+            yield (row["Block_ID"], row["Type"]), float(row["Entropy"])
+
+
+def _stream_group_sums(input_file, counts, term):
+    """
+    Sum a term over the rows of every (Block_ID, Type) group in one pass.
+
+    Args:
+        input_file (str): Path to the input CSV file containing entropy data
+        counts (dict): Number of rows of every group, {(block_id, variable_type):
+            count}.
+        term (function): term(group, entropy) returning the value summed for a row.
+
+    Returns:
+        dict: {(block_id, variable_type): sum}, each equal to np.sum over the terms of
+        the group's rows in file order (see _pairwise_sum).
+    """
+    sums, pending = {}, {}
+    for group, entropy in _read_entropies(input_file):
+        summation = pending.get(group)
+        if summation is None:
+            summation = pending[group] = _pairwise_sum(counts[group])
+            next(summation)
+        try:
+            summation.send(term(group, entropy))
+        except StopIteration as result:
+            sums[group] = result.value
+            del pending[group]
+    return sums
+
+
+def calculate_streaming_entropy_thresholds(input_file):
+    """
+    Calculate entropy thresholds for each variable type within each block in
+    streaming passes over an entropy CSV file.
+
+    Args:
+        input_file (str): Path to the input CSV file containing entropy data
+
+    Returns:
+        dict: Thresholds in the same structure as
+              calculate_variable_type_entropy_statistics, {block_id: {variable_type:
+              threshold}} where threshold = mean_entropy + standard_deviation_entropy
+
+    The rows of every (Block_ID, Type) group are counted in a first pass, summed in
+    a second one and their squared deviations from the mean summed in a third one,
+    adding them in the order np.mean and np.std do. The thresholds are therefore bit
+    for bit equal to the np.mean + np.std ones, including groups whose entropies are
+    all equal, while memory only grows with the number of groups.
+    """
+    counts = {}
+    for group, _ in _read_entropies(input_file):
+        counts[group] = counts.get(group, 0) + 1
+
+    sums = _stream_group_sums(input_file, counts, lambda group, entropy: entropy)
+    means = {group: sums[group] / count for group, count in counts.items()}
+    squares = _stream_group_sums(
+        input_file,
+        counts,
+        lambda group, entropy: (entropy - means[group]) * (entropy - means[group]),
+    )
+
+    block_variable_thresholds = {}
+    for (block_id, variable_type), count in counts.items():
+        threshold = means[block_id, variable_type] + math.sqrt(
+            squares[block_id, variable_type] / count
+        )
+        block_variable_thresholds.setdefault(block_id, {})[variable_type] = threshold
+    return block_variable_thresholds
+
+
 # Function to filter out low entropy variables for each variable type within each block
 def filter_variables_by_variable_type(input_file, output_file, thresholds):
     """
     Filter variables based on entropy thresholds for each variable type within each block.
 
     Args:
-        input_file (str): Path to the input CSV file containing entropy data
-        output_file (str): Path to the output CSV file where filtered data will be written
+        input_file (str): Path to the input CSV (or .parquet/.npz) file containing entropy data
+        output_file (str): Path to the output CSV (or .parquet/.npz) file for the filtered data
         thresholds (dict): Dict containing entropy thresholds for each variable type per block
 
     The function reads entropy data from the input file and writes only those entries to the
     output file where the entropy value is greater than or equal to the corresponding threshold
     for that variable type and block.
     """
+    if not (is_csv(input_file) and is_csv(output_file)):
+        table = read_table(input_file)
+        block_thresholds = [
+            thresholds[block_id].get(variable_type, 0)
+            for block_id, variable_type in zip(
+                table["Block_ID"].astype(str), table["Type"].astype(str)
+            )
+        ]
+        write_table(table[table["Entropy"] >= block_thresholds], output_file)
+        return
+
     with open(input_file, newline="", encoding="UTF-8") as infile, open(
         output_file, "w", newline="", encoding="UTF-8"
     ) as outfile:
@@ -89,13 +324,19 @@ def main():
     2. Filters variables based on the calculated thresholds
 
     The function reads from a CSV file containing entropy data and writes the filtered
-    results to a new CSV file.
+    results to a new CSV file. With STREAMING enabled, both operations stream over the
+    file, so memory only depends on the number of (Block_ID, Type) groups.
     """
     input_file = "entropy/csv_parser_entropy.csv"
     output_file = "entropy_preprocessed/csv_parser_filtered_entropy.csv"
 
     # Calculate block-wise variable type entropy statistics
-    block_variable_thresholds = calculate_variable_type_entropy_statistics(input_file)
+    if STREAMING:
+        block_variable_thresholds = calculate_streaming_entropy_thresholds(input_file)
+    else:
+        block_variable_thresholds = calculate_variable_type_entropy_statistics(
+            input_file
+        )
     print("Block-wise Variable Type Thresholds:", block_variable_thresholds)
 
     # Filter variables for each variable type within each block based on calculated thresholds
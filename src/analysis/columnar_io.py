@@ -0,0 +1,616 @@
+"""
+This module provides the typed columnar intermediate format shared by the pipeline stages.
+Tables (instruction, entropy and probability tables) can be stored as CSV, Parquet or .npz
+files, chosen by file extension. The Type and Assembly columns are dictionary-encoded and
+probabilities are stored as float32. Pairwise similarity outputs are stored as condensed
+.npy arrays that can be written and read memory-mapped, without holding them in memory, or as
+sparse .npz pair lists when only some pairs are scored; read_similarity_matrix loads any of
+these similarity files as a square matrix.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+try:
+    import pyarrow  # pylint: disable=unused-import
+except ImportError:  # pyarrow is optional; only needed for Parquet files
+    pyarrow = None
+
+# Columns stored as categorical (dictionary-encoded) data
+CATEGORICAL_COLUMNS = ("Type", "Assembly")
+
+# Columns stored as float32
+FLOAT32_COLUMNS = ("Probability",)
+
+
+def is_csv(path):
+    """
+    Check whether a path refers to a CSV file.
+
+    Args:
+        path (str): Path of a table file.
+
+    Returns:
+        bool: True if the file has a .csv extension.
+    """
+    return os.path.splitext(path)[1].lower() == ".csv"
+
+
+def compact_table(df):
+    """
+    Convert a table to the compact column types of the columnar format.
+
+    Args:
+        df (pandas.DataFrame): Table with any of the pipeline columns.
+
+    Returns:
+        pandas.DataFrame: A copy with numeric Block_IDs (when all IDs are numbers),
+        categorical Type/Assembly columns and float32 probabilities. Other columns
+        are left unchanged.
+    """
+    df = df.copy()
+    if "Block_ID" in df.columns:
+        try:
+            df["Block_ID"] = pd.to_numeric(df["Block_ID"])
+        except (ValueError, TypeError):
+            pass  # Block names (e.g. symbols) stay text
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    for column in FLOAT32_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype(np.float32)
+    return df
+
+
+def _write_npz(df, path):
+    """
+    Write a table to an .npz file, one or two arrays per column.
+
+    Args:
+        df (pandas.DataFrame): Table to write.
+        path (str): Path of the .npz file.
+
+    Categorical columns are stored as "<column>.codes" and "<column>.categories",
+    text columns as fixed-width unicode arrays, and numeric columns as they are.
+    """
+    arrays = {"__columns__": np.array(df.columns, dtype=str)}
+    for column in df.columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            arrays[f"{column}.codes"] = values.cat.codes.to_numpy(np.int32)
+            arrays[f"{column}.categories"] = np.asarray(
+                values.cat.categories, dtype=str
+            )
+        elif pd.api.types.is_numeric_dtype(values.dtype):
+            arrays[column] = values.to_numpy()
+        else:
+            arrays[column] = values.fillna("").to_numpy(dtype=str)
+    with open(path, "wb") as file:
+        np.savez_compressed(file, **arrays)
+
+
+def _read_npz(path):
+    """
+    Read a table written by _write_npz.
+
+    Args:
+        path (str): Path of the .npz file.
+
+    Returns:
+        pandas.DataFrame: The table, with categorical columns restored.
+    """
+    columns = {}
+    with np.load(path, allow_pickle=False) as arrays:
+        for column in arrays["__columns__"].tolist():
+            if f"{column}.codes" in arrays:
+                columns[column] = pd.Categorical.from_codes(
+                    arrays[f"{column}.codes"], arrays[f"{column}.categories"]
+                )
+            else:
+                columns[column] = arrays[column]
+    return pd.DataFrame(columns)
+
+
+def write_table(df, path):
+    """
+    Write a pipeline table to a CSV, Parquet or .npz file, chosen by extension.
+
+    Args:
+        df (pandas.DataFrame): Table to write.
+        path (str): Output path ending in .csv, .parquet or .npz.
+
+    Raises:
+        ValueError: If the extension is not supported.
+        ImportError: If a Parquet file is requested and pyarrow is not installed.
+
+    CSV files are written as before. The columnar formats use the compact column
+    types from compact_table.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        df.to_csv(path, index=False)
+    elif extension == ".parquet":
+        if pyarrow is None:
+            raise ImportError("pyarrow is required to write Parquet files")
+        compact_table(df).to_parquet(path, index=False)
+    elif extension == ".npz":
+        _write_npz(compact_table(df), path)
+    else:
+        raise ValueError(f"Unsupported table format: {path}")
+
+
+def write_partitioned_table(df, path, partition_columns):
+    """
+    Write a pipeline table as a Parquet dataset with one directory per partition.
+
+    Args:
+        df (pandas.DataFrame): Table to write.
+        path (str): Output directory, e.g. ending in .parquet so that read_table can
+            read the whole dataset back.
+        partition_columns (list): Columns whose values name the partition directories
+            (e.g. ["Binary"] gives Binary=<name>/ subdirectories).
+
+    Raises:
+        ImportError: If pyarrow is not installed.
+
+    The table uses the compact column types from compact_table. A single partition
+    can be read on its own with pandas.read_parquet(path, filters=...).
+    """
+    if pyarrow is None:
+        raise ImportError("pyarrow is required to write Parquet files")
+    compact_table(df).to_parquet(
+        path, index=False, partition_cols=list(partition_columns)
+    )
+
+
+def _csv_field(value):
+    """
+    Format one value the way csv.writer does with its default dialect.
+
+    Args:
+        value: A cell value (text or number).
+
+    Returns:
+        str: The field, quoted when it contains a delimiter, quote or line break.
+    """
+    field = str(value)
+    if any(character in field for character in ',"\r\n'):
+        return '"' + field.replace('"', '""') + '"'
+    return field
+
+
+def write_csv(df, path):
+    """
+    Write a table to a CSV file in bulk, byte for byte as csv.writer would.
+
+    Args:
+        df (pandas.DataFrame): Table to write.
+        path (str): Output CSV path.
+
+    Every column is dictionary-encoded first, so each distinct value is formatted
+    (and quoted) only once; the rows are then assembled from the formatted values and
+    written with a single call.
+    """
+    columns = []
+    for column in df.columns:
+        codes, uniques = pd.factorize(df[column], use_na_sentinel=False)
+        fields = np.array([_csv_field(value) for value in uniques], dtype=object)
+        columns.append(fields[codes].tolist())
+    header = ",".join(_csv_field(column) for column in df.columns)
+    with open(path, "w", newline="", encoding="UTF-8") as file:
+        file.write("\r\n".join([header, *map(",".join, zip(*columns)), ""]))
+
+
+def read_table(path):
+    """
+    Read a pipeline table from a CSV, Parquet or .npz file, chosen by extension.
+
+    Args:
+        path (str): Input path ending in .csv, .parquet or .npz.
+
+    Returns:
+        pandas.DataFrame: The table.
+
+    Raises:
+        ValueError: If the extension is not supported.
+        ImportError: If a Parquet file is requested and pyarrow is not installed.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return pd.read_csv(path)
+    if extension == ".parquet":
+        if pyarrow is None:
+            raise ImportError("pyarrow is required to read Parquet files")
+        return pd.read_parquet(path)
+    if extension == ".npz":
+        return _read_npz(path)
+    raise ValueError(f"Unsupported table format: {path}")
+
+
+def block_ids_path(path):
+    """
+    Get the path of the block ID array that accompanies a condensed similarity file.
+
+    Args:
+        path (str): Path of the condensed similarity .npy file.
+
+    Returns:
+        str: The path with "_ids" inserted before the extension.
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}_ids{extension}"
+
+
+def save_condensed_similarity(path, block_ids, condensed):
+    """
+    Save pairwise similarities as a condensed (upper-triangle) .npy array.
+
+    Args:
+        path (str): Output .npy path.
+        block_ids (list): Block IDs in matrix order.
+        condensed (array-like): Similarities for every pair (i, j) with i < j, in the
+            order used by scipy.spatial.distance.pdist.
+
+    The block IDs are saved next to the similarities, see block_ids_path.
+    """
+    np.save(path, np.asarray(condensed, dtype=np.float64))
+    np.save(block_ids_path(path), np.asarray([str(b) for b in block_ids], dtype=str))
+
+
+def create_condensed_similarity(path, block_ids):
+    """
+    Create a disk-backed condensed similarity array to be filled in place.
+
+    Args:
+        path (str): Output .npy path.
+        block_ids (list): Block IDs in matrix order.
+
+    Returns:
+        numpy.memmap: A writable, memory-mapped float64 array with one entry for every
+        pair (i, j) with i < j, in the order used by scipy.spatial.distance.pdist.
+
+    The block IDs are saved next to the similarities, see block_ids_path. Call flush
+    on the returned array when all entries are written.
+    """
+    size = len(block_ids)
+    np.save(block_ids_path(path), np.asarray([str(b) for b in block_ids], dtype=str))
+    return np.lib.format.open_memmap(
+        path, mode="w+", dtype=np.float64, shape=(size * (size - 1) // 2,)
+    )
+
+
+def load_condensed_similarity(path):
+    """
+    Load a condensed similarity array without reading it into memory.
+
+    Args:
+        path (str): Path of a .npy file written by save_condensed_similarity.
+
+    Returns:
+        tuple: A tuple containing:
+            - list: Block IDs (as strings) in matrix order
+            - numpy.memmap: The read-only, memory-mapped condensed similarities
+    """
+    block_ids = np.load(block_ids_path(path), allow_pickle=False).tolist()
+    return block_ids, np.load(path, mmap_mode="r")
+
+
+def condensed_index(rows, columns, size):
+    """
+    Get the position of pairs (i, j), i < j, in a condensed similarity array.
+
+    Args:
+        rows (array-like): First index i of each pair.
+        columns (array-like): Second index j of each pair, greater than i.
+        size (int): Number of blocks.
+
+    Returns:
+        numpy.ndarray: Positions in the pdist ordering.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    columns = np.asarray(columns, dtype=np.int64)
+    return size * rows - rows * (rows + 1) // 2 + columns - rows - 1
+
+
+def condensed_submatrix(condensed, size, indices):
+    """
+    Extract the square similarity matrix of some blocks from a condensed array.
+
+    Args:
+        condensed (numpy.ndarray): Condensed similarities of all blocks, typically
+            memory-mapped by load_condensed_similarity.
+        size (int): Number of blocks in the condensed array.
+        indices (array-like): Matrix positions of the blocks to extract, in the
+            order wanted.
+
+    Returns:
+        numpy.ndarray: The symmetric len(indices) x len(indices) matrix, with zeros
+        on the diagonal. The matrix is filled one selected row at a time from a
+        contiguous slice of its condensed run, so a memory-mapped array is never
+        loaded in full and no temporary larger than a row is built.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    order = np.argsort(indices, kind="stable")
+    sorted_indices = indices[order]
+    matrix = np.zeros((len(indices), len(indices)))
+    starts = condensed_index(sorted_indices, sorted_indices + 1, size)
+    for position, (row, start) in enumerate(
+        zip(sorted_indices.tolist(), starts.tolist())
+    ):
+        # Later selected blocks; repeats of row itself come first and stay zero
+        later = sorted_indices[position + 1 :]
+        later = later[np.searchsorted(later, row, side="right") :]
+        if len(later) == 0:
+            continue
+        run = condensed[start + later[0] - row - 1 : start + later[-1] - row]
+        values = run[later - later[0]]
+        targets = order[len(order) - len(later) :]
+        matrix[order[position], targets] = values
+        matrix[targets, order[position]] = values
+    return matrix
+
+
+def save_sparse_similarity(path, block_ids, first, second, similarities, default):
+    """
+    Save the similarities of some block pairs as a sparse .npz pair list.
+
+    Args:
+        path (str): Output .npz path.
+        block_ids (list): Block IDs in matrix order.
+        first (array-like): Matrix position of the first block of each pair.
+        second (array-like): Matrix position of the second block of each pair.
+        similarities (array-like): Similarity of each pair.
+        default (float): Similarity of every pair that is not listed.
+
+    The pairs can be in either order, so the file also holds nearest-neighbor graphs
+    (block, neighbor) as well as candidate pairs (i, j) with i < j.
+    """
+    with open(path, "wb") as file:
+        np.savez_compressed(
+            file,
+            block_ids=np.asarray([str(b) for b in block_ids], dtype=str),
+            first=np.asarray(first, dtype=np.int64),
+            second=np.asarray(second, dtype=np.int64),
+            similarities=np.asarray(similarities, dtype=np.float64),
+            default=np.float64(default),
+        )
+
+
+def load_sparse_similarity(path):
+    """
+    Load a sparse pair list saved with save_sparse_similarity.
+
+    Args:
+        path (str): Path of the .npz file.
+
+    Returns:
+        tuple: A tuple containing:
+            - list: Block IDs (as strings) in matrix order
+            - numpy.ndarray: Matrix position of the first block of each pair
+            - numpy.ndarray: Matrix position of the second block of each pair
+            - numpy.ndarray: Similarity of each pair
+            - float: Similarity of every pair that is not listed
+    """
+    with np.load(path, allow_pickle=False) as arrays:
+        return (
+            arrays["block_ids"].tolist(),
+            arrays["first"],
+            arrays["second"],
+            arrays["similarities"],
+            float(arrays["default"]),
+        )
+
+
+def read_similarity_graph(path):
+    """
+    Read a sparse .npz pair list as a symmetric sparse graph.
+
+    Args:
+        path (str): Path of a .npz file written by save_sparse_similarity, such as a
+            nearest-neighbor graph.
+
+    Returns:
+        tuple: A tuple containing:
+            - scipy.sparse.csr_matrix: Symmetric block x block matrix with an entry
+              for every listed pair in both directions. When a pair is listed in both
+              orders, the smaller value is kept. Zero values are stored explicitly.
+            - list: Block IDs (as strings) in matrix order
+    """
+    block_ids, first, second, similarities, _ = load_sparse_similarity(path)
+    size = len(block_ids)
+    rows, columns, values = _symmetric_pairs(first, second, similarities, size)
+    indptr = np.searchsorted(rows, np.arange(size + 1))
+    graph = sparse.csr_matrix((values, columns, indptr), shape=(size, size))
+    return graph, block_ids
+
+
+def _symmetric_pairs(first, second, similarities, size):
+    """
+    List the entries of both triangles of a pair list, one value per entry.
+
+    Args:
+        first (numpy.ndarray): Matrix position of the first block of each pair.
+        second (numpy.ndarray): Matrix position of the second block of each pair.
+        similarities (numpy.ndarray): Similarity of each pair.
+        size (int): Number of blocks.
+
+    Returns:
+        tuple: Rows, columns and values of every off-diagonal entry, sorted by row
+        and column. A pair is entered in both directions, and when a pair is listed
+        more than once (in either order) the smallest value is kept, so the entries
+        are symmetric.
+    """
+    rows = np.concatenate([first, second])
+    columns = np.concatenate([second, first])
+    values = np.concatenate([similarities, similarities])
+    kept = rows != columns
+
+    # Keep the smallest value of every (row, column) entry
+    codes = rows[kept].astype(np.int64) * size + columns[kept]
+    order = np.argsort(codes, kind="stable")
+    codes, values = codes[order], values[kept][order]
+    starts = np.flatnonzero(np.diff(codes, prepend=-1) != 0)
+    values = np.minimum.reduceat(values, starts) if len(starts) else values
+    codes = codes[starts]
+    return codes // size, codes % size, values
+
+
+def _read_similarity_pairs(path):
+    """
+    Read the (block_id1, block_id2, similarity) rows of a CSV similarity file.
+
+    Args:
+        path (str): Path of a CSV file with a header row and three columns.
+
+    Returns:
+        pandas.DataFrame: Block_ID1 and Block_ID2 (as text) and Similarity columns, in
+        file order.
+    """
+    return pd.read_csv(
+        path,
+        header=0,
+        names=["Block_ID1", "Block_ID2", "Similarity"],
+        dtype={"Block_ID1": str, "Block_ID2": str, "Similarity": np.float64},
+        keep_default_na=False,
+        float_precision="round_trip",
+    )
+
+
+def _block_positions(block_ids, wanted):
+    """
+    Look up the matrix position of block IDs.
+
+    Args:
+        block_ids (array-like): Block IDs in matrix order.
+        wanted (array-like): Block IDs to look up.
+
+    Returns:
+        numpy.ndarray: Position of each wanted block ID in block_ids, or -1 where it
+        is not there.
+    """
+    codes, uniques = pd.factorize(pd.Series(wanted, dtype=str))
+    return pd.Index(block_ids).get_indexer(uniques)[codes]
+
+
+def _default_block_ids(found, max_blocks=None):
+    """
+    Order the block IDs found in a similarity file.
+
+    Args:
+        found (array-like): Block IDs in file order, possibly repeated.
+        max_blocks (int): Largest number of block IDs kept, or None for all of them.
+
+    Returns:
+        list: The distinct block IDs (as text), in numeric order when they are all
+        integers and in order of first appearance otherwise.
+    """
+    block_ids = [str(block_id) for block_id in pd.unique(pd.Series(found, dtype=str))]
+    if all(block_id.lstrip("-").isdigit() for block_id in block_ids):
+        block_ids.sort(key=int)
+    return block_ids[:max_blocks]
+
+
+def _check_positions(positions, wanted):
+    """
+    Raise an error for block IDs that _block_positions did not find.
+
+    Args:
+        positions (numpy.ndarray): Positions returned by _block_positions.
+        wanted (array-like): The block IDs that were looked up.
+
+    Raises:
+        ValueError: If a position is -1.
+    """
+    if (positions < 0).any():
+        missing = str(np.asarray(wanted)[positions < 0][0])
+        raise ValueError(f"{missing!r} is not a known block ID")
+
+
+def read_similarity_matrix(path, block_ids=None, max_blocks=None):
+    """
+    Read a square similarity matrix from a CSV, condensed .npy or sparse .npz file.
+
+    Args:
+        path (str): Path of a CSV file with a header row and block_id1, block_id2,
+            similarity columns, of a condensed .npy file written by
+            save_condensed_similarity or create_condensed_similarity, or of a sparse
+            .npz file written by save_sparse_similarity.
+        block_ids (list): Block IDs (as text) giving the rows and columns of the
+            matrix, or None for all blocks of the file, in numeric order when their
+            IDs are all integers and in order of first appearance otherwise.
+        max_blocks (int): Largest number of blocks kept when block_ids is None, or
+            None for all of them.
+
+    Returns:
+        tuple: A tuple containing:
+            - numpy.ndarray: A symmetric matrix whose element [i, j] is the similarity
+              between blocks i and j; pairs missing from a CSV file are zero and
+              pairs missing from a sparse file get its default similarity
+            - list: The block IDs of the rows and columns
+
+    Raises:
+        ValueError: If a requested block ID is not in a condensed or sparse file, or
+            a CSV file lists a block ID that is not requested.
+
+    Block IDs are factorized and mapped to matrix positions through a hash index, and
+    the matrix is filled with a single assignment. When a CSV file lists a pair more
+    than once, the last row wins, as when the rows are written one by one. When a
+    sparse file lists a pair more than once, in either order (as nearest-neighbor
+    graphs do), the smallest value is kept, as in read_similarity_graph. A
+    condensed file is memory-mapped and only the pairs of the selected blocks are
+    read.
+    """
+    if os.path.splitext(path)[1].lower() == ".npz":
+        file_block_ids, first, second, similarities, default = load_sparse_similarity(
+            path
+        )
+        if block_ids is None:
+            block_ids = _default_block_ids(file_block_ids, max_blocks)
+        order = _block_positions(file_block_ids, block_ids)
+        _check_positions(order, block_ids)
+        positions = np.full(len(file_block_ids), -1)
+        positions[order] = np.arange(len(order))
+        first, second = positions[first], positions[second]
+        kept = (first >= 0) & (second >= 0)
+        rows, columns, values = _symmetric_pairs(
+            first[kept], second[kept], similarities[kept], len(order)
+        )
+        matrix = np.full((len(order), len(order)), default)
+        np.fill_diagonal(matrix, 0)
+        matrix[rows, columns] = values
+        return matrix, list(block_ids)
+
+    if not is_csv(path):
+        file_block_ids, condensed = load_condensed_similarity(path)
+        if block_ids is None:
+            block_ids = _default_block_ids(file_block_ids, max_blocks)
+        order = _block_positions(file_block_ids, block_ids)
+        _check_positions(order, block_ids)
+        matrix = condensed_submatrix(condensed, len(file_block_ids), order)
+        return matrix, list(block_ids)
+
+    pairs = _read_similarity_pairs(path)
+    first_ids, second_ids = pairs["Block_ID1"], pairs["Block_ID2"]
+    similarities = pairs["Similarity"].to_numpy()
+    if block_ids is None:
+        block_ids = _default_block_ids(
+            np.column_stack([first_ids, second_ids]).ravel(), max_blocks
+        )
+    first = _block_positions(block_ids, first_ids)
+    second = _block_positions(block_ids, second_ids)
+    if max_blocks is None:
+        _check_positions(first, first_ids)
+        _check_positions(second, second_ids)
+    else:
+        kept = (first >= 0) & (second >= 0)
+        first, second, similarities = first[kept], second[kept], similarities[kept]
+
+    # Each row sets [i, j] and then [j, i]; interleaving keeps that order
+    rows = np.column_stack([first, second]).ravel()
+    columns = np.column_stack([second, first]).ravel()
+    matrix = np.zeros((len(block_ids), len(block_ids)))
+    matrix[rows, columns] = np.repeat(similarities, 2)
+    return matrix, list(block_ids)
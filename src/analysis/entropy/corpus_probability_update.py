@@ -0,0 +1,103 @@
+"""
+This module calculates assembly probability distributions for a corpus of binaries at once.
+The filtered entropy tables of many binaries are concatenated with a Binary column, using
+categorical columns, and the probability of each Assembly value per (Binary, Block_ID, Type)
+is calculated with a single grouped transform. The result is written as one Parquet dataset
+partitioned by binary.
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from entropy_probability_update import calculate_assembly_probabilities
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from columnar_io import (  # pylint: disable=wrong-import-position
+    read_table,
+    write_partitioned_table,
+)
+
+# Filtered entropy table of each binary in the corpus (modify as needed)
+INPUT_FILES = {
+    "csv_parser": r"entropy_preprocessed\csv_parser_filtered_entropy.csv",
+    "dynamic_array_allocator": (
+        r"entropy_preprocessed\dynamic_array_allocator_filtered_entropy.csv"
+    ),
+    "hello_world": r"entropy_preprocessed\hello_world_filtered_entropy.csv",
+    "simple_calculator": r"entropy_preprocessed\simple_calculator_filtered_entropy.csv",
+}
+
+# Output Parquet dataset, partitioned by binary (modify as needed)
+OUTPUT_FILE = r"probability_update\corpus_probability_update.parquet"
+
+
+def read_corpus(input_files):
+    """
+    Read the filtered entropy tables of several binaries into one table.
+
+    Args:
+        input_files (dict): Path of the filtered entropy table (CSV, .parquet or .npz)
+            of each binary, keyed by binary name.
+
+    Returns:
+        pandas.DataFrame: Binary, Block_ID, Type and Assembly columns of all tables.
+        Binary, Type and Assembly are categorical, so each distinct name is stored
+        once for the whole corpus.
+    """
+    tables = [
+        read_table(path)[["Block_ID", "Type", "Assembly"]]
+        for path in input_files.values()
+    ]
+    binary_codes = np.repeat(np.arange(len(tables)), [len(t) for t in tables])
+    return pd.DataFrame(
+        {
+            "Binary": pd.Categorical.from_codes(binary_codes, list(input_files)),
+            "Block_ID": pd.concat([t["Block_ID"] for t in tables], ignore_index=True),
+            **{
+                column: union_categoricals(
+                    [t[column].astype("category") for t in tables],
+                    sort_categories=True,
+                )
+                for column in ("Type", "Assembly")
+            },
+        }
+    )
+
+
+def calculate_corpus_probabilities(corpus):
+    """
+    Calculate the probability of each Assembly value for each Type within each Block
+    of each binary.
+
+    Args:
+        corpus (pandas.DataFrame): Table with Binary, Block_ID, Type and Assembly
+            columns (see read_corpus).
+
+    Returns:
+        pandas.DataFrame: Binary, Block_ID, Type, Assembly and Probability columns. The
+        rows of each binary are those calculate_assembly_probabilities gives for that
+        binary alone.
+    """
+    return calculate_assembly_probabilities(
+        corpus, group_columns=("Binary", "Block_ID", "Type")
+    )
+
+
+def main():
+    """
+    Main function that loads the filtered entropy tables of all binaries, calculates
+    their Assembly probabilities in one pass, and writes them as a single Parquet
+    dataset partitioned by binary.
+    """
+    corpus_probabilities = calculate_corpus_probabilities(read_corpus(INPUT_FILES))
+    print(corpus_probabilities.head())
+
+    write_partitioned_table(corpus_probabilities, OUTPUT_FILE, ["Binary"])
+    print("Corpus probabilities written to:", OUTPUT_FILE)
+
+
+if __name__ == "__main__":
+    main()
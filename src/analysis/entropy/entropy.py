@@ -5,9 +5,36 @@ distributions and entropy values, providing insights into code complexity
 and patterns within basic blocks of assembly code.
 """
 
+import os
+import sys
 import csv
 from collections import defaultdict
 import math
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # pylint: disable=unused-import
+except ImportError:  # pyarrow is optional; only used to read CSV files faster
+    pyarrow = None
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from columnar_io import (  # pylint: disable=wrong-import-position
+    is_csv,
+    read_table,
+    write_csv,
+    write_table,
+)
+from token_vocabulary import (  # pylint: disable=wrong-import-position
+    TokenVocabulary,
+    encode_instruction_table,
+)
+
+# Default output file of the entropy stage
+OUTPUT_FILE = r"entropy\dynamic_array_calculator_entropy.csv"
+
+# Columns of the entropy table
+ENTROPY_FIELDNAMES = ["Block_ID", "Type", "Assembly", "Probability", "Entropy"]
 
 
 # Function to calculate entropy
@@ -30,7 +57,7 @@ def calculate_entropy(probabilities):
 
 
 # Function to calculate probability distribution and entropy
-def calculate_probabilities_and_entropy(blocks):
+def calculate_probabilities_and_entropy(blocks, output_file=OUTPUT_FILE):
     """
     Calculate probability distributions and entropy values for instructions and
     operands in assembly code blocks.
@@ -39,58 +66,232 @@ def calculate_probabilities_and_entropy(blocks):
         blocks (dict): A dictionary where keys are block IDs and values are lists of dictionaries
                       containing instruction and operand information for each line in the block.
                       Each dictionary has keys 'Instruction', 'Left Operand', and 'Right Operand'.
+        output_file (str): Path to the output file. A .parquet or .npz path writes the
+                      columnar format instead of CSV.
 
-    The function writes the results to a CSV file containing:
+    The function writes the results to a file containing:
         - Block_ID: Identifier for the basic block
         - Type: Type of assembly component (Instruction, Left Operand, or Right Operand)
         - Assembly: The actual assembly component value
         - Probability: Calculated probability of occurrence within the block
         - Entropy: Entropy value calculated for the probability
     """
-    with open(
-        r"entropy\dynamic_array_calculator_entropy.csv",
-        "w",
-        newline="",
-        encoding="UTF-8",
-    ) as csvfile:
-        fieldnames = ["Block_ID", "Type", "Assembly", "Probability", "Entropy"]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+    if not is_csv(output_file):
+        rows = list(iterate_probabilities_and_entropy(blocks))
+        write_table(pd.DataFrame(rows, columns=ENTROPY_FIELDNAMES), output_file)
+        return
+
+    with open(output_file, "w", newline="", encoding="UTF-8") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=ENTROPY_FIELDNAMES)
         writer.writeheader()
+        for row in iterate_probabilities_and_entropy(blocks):
+            writer.writerow(dict(zip(ENTROPY_FIELDNAMES, row)))
+
+
+def iterate_probabilities_and_entropy(blocks):
+    """
+    Yield the probability and entropy of every instruction and operand in each block.
+
+    Args:
+        blocks (dict): Blocks as returned by read_assembly_csv.
+
+    Yields:
+        tuple: (block_id, variable_type, assembly, probability, entropy)
+    """
+    for block_id, block in blocks.items():
+        total_count = len(block)
+        variables = defaultdict(int)
+
+        # Count occurrences of each variable type
+        for line in block:
+            variables[(line["Instruction"], "Instruction")] += 1
+            if line["Left Operand"]:
+                variables[(line["Left Operand"], "Left Operand")] += 1
+            if line["Right Operand"]:
+                variables[(line["Right Operand"], "Right Operand")] += 1
+
+        # Calculate probabilities and entropies
+        for (variable, variable_type), count in variables.items():
+            probability = count / total_count
+            entropy = calculate_entropy([probability])
+            yield (block_id, variable_type, variable, probability, entropy)
+
+
+def token_entropy(probabilities):
+    """
+    Calculate the entropy term -p * log2(p) of many probabilities at once.
+
+    Args:
+        probabilities (numpy.ndarray): Probabilities greater than 0.
+
+    Returns:
+        numpy.ndarray: The entropy terms, bit for bit equal to calculate_entropy([p]).
+
+    math.log2 is only evaluated once per distinct probability, since numpy's log2 can
+    differ from it in the last bit.
+    """
+    codes, uniques = pd.factorize(probabilities)
+    logarithms = np.fromiter(
+        (math.log2(probability) for probability in uniques),
+        dtype=np.float64,
+        count=len(uniques),
+    )
+    return 0.0 - probabilities * logarithms[codes]
 
-        for block_id, block in blocks.items():
-            total_count = len(block)
-            variables = defaultdict(int)
-
-            # Count occurrences of each variable type
-            for line in block:
-                variables[(line["Instruction"], "Instruction")] += 1
-                if line["Left Operand"]:
-                    variables[(line["Left Operand"], "Left Operand")] += 1
-                if line["Right Operand"]:
-                    variables[(line["Right Operand"], "Right Operand")] += 1
-
-            # Calculate probabilities and entropies
-            for (variable, variable_type), count in variables.items():
-                probability = count / total_count
-                entropy = calculate_entropy([probability])
-                writer.writerow(
-                    {
-                        "Block_ID": block_id,
-                        "Type": variable_type,
-                        "Assembly": variable,
-                        "Probability": probability,
-                        "Entropy": entropy,
-                    }
-                )
+
+def count_block_tokens(df, vocabulary):
+    """
+    Count every instruction and operand token in each block of an instruction table.
+
+    Args:
+        df (pandas.DataFrame): Instruction table with Block_ID, Instruction,
+            Left Operand and Right Operand columns.
+        vocabulary (TokenVocabulary): Vocabulary used to encode the tokens.
+
+    Returns:
+        tuple: A tuple containing:
+            - pandas.Index: Block IDs in order of first appearance
+            - numpy.ndarray: Line count of every block
+            - numpy.ndarray: Block code of every (block, token) key
+            - numpy.ndarray: Token ID of every (block, token) key
+            - numpy.ndarray: Number of occurrences of every (block, token) key
+
+    The keys are grouped by block, and within a block in order of first appearance,
+    as iterate_probabilities_and_entropy yields them.
+    """
+    block_codes, token_ids, line_counts, block_ids = encode_instruction_table(
+        df, vocabulary
+    )
+
+    # Count every (block, token) key, keeping keys in order of first appearance
+    keys = block_codes.astype(np.int64) * len(vocabulary) + token_ids
+    key_codes, unique_keys = pd.factorize(keys)
+    counts = np.bincount(key_codes)
+
+    # Group the keys by block; blocks and tokens stay in order of first appearance
+    order = np.argsort(unique_keys // len(vocabulary), kind="stable")
+    unique_keys, counts = unique_keys[order], counts[order]
+    return (
+        block_ids,
+        line_counts,
+        unique_keys // len(vocabulary),
+        unique_keys % len(vocabulary),
+        counts,
+    )
+
+
+def build_entropy_table(
+    block_ids, line_counts, key_blocks, key_tokens, counts, vocabulary
+):
+    """
+    Build the entropy table of counted (block, token) keys.
+
+    Args:
+        block_ids (array-like): Block IDs, indexed by block code.
+        line_counts (numpy.ndarray): Line counts, indexed by block code.
+        key_blocks (numpy.ndarray): Block code of every key.
+        key_tokens (numpy.ndarray): Token ID of every key.
+        counts (numpy.ndarray): Number of occurrences of every key.
+        vocabulary (TokenVocabulary): Vocabulary of the token IDs.
+
+    Returns:
+        pandas.DataFrame: The entropy table (see ENTROPY_FIELDNAMES), with one row per
+        key in the given order. The Type and Assembly columns are categorical, with
+        only the tokens that occur as categories.
+    """
+    # Type and Assembly are built from the vocabulary as categorical columns, with
+    # sorted categories so that they sort and group like the text columns of a CSV
+    used = np.bincount(key_tokens, minlength=len(vocabulary)) > 0
+    used_tokens = np.cumsum(used) - 1
+    types, assemblies = vocabulary.decode(np.flatnonzero(used))
+    type_codes, type_categories = pd.factorize(types, sort=True)
+    assembly_codes, assembly_categories = pd.factorize(assemblies, sort=True)
+    key_tokens = used_tokens[key_tokens]
+
+    probabilities = counts / line_counts[key_blocks]
+    return pd.DataFrame(
+        {
+            "Block_ID": pd.Index(block_ids)[key_blocks],
+            "Type": pd.Categorical.from_codes(type_codes[key_tokens], type_categories),
+            "Assembly": pd.Categorical.from_codes(
+                assembly_codes[key_tokens], assembly_categories
+            ),
+            "Probability": probabilities,
+            "Entropy": token_entropy(probabilities),
+        }
+    )
+
+
+def compute_entropy_table(df, vocabulary=None):
+    """
+    Calculate the probability and entropy of every instruction and operand in each
+    block of an instruction table, for all blocks at once.
+
+    Args:
+        df (pandas.DataFrame): Instruction table with Block_ID, Instruction,
+            Left Operand and Right Operand columns.
+        vocabulary (TokenVocabulary): Optional vocabulary used to encode the tokens.
+            A new vocabulary is used when none is given.
+
+    Returns:
+        pandas.DataFrame: The entropy table (see ENTROPY_FIELDNAMES), with the same
+        rows, in the same order, as iterate_probabilities_and_entropy. The Type and
+        Assembly columns are categorical.
+
+    Tokens are encoded to integer IDs and counted per (block, token) key with a single
+    factorize and bincount, so no Python code runs per row.
+    """
+    if vocabulary is None:
+        vocabulary = TokenVocabulary()
+    return build_entropy_table(*count_block_tokens(df, vocabulary), vocabulary)
+
+
+def write_entropy_table(entropy_table, output_file=OUTPUT_FILE):
+    """
+    Write an entropy table in a single bulk write.
+
+    Args:
+        entropy_table (pandas.DataFrame): Table as returned by compute_entropy_table.
+        output_file (str): Path to the output file. A .parquet or .npz path writes the
+            columnar format instead of CSV.
+
+    CSV files are byte for byte the same as those of calculate_probabilities_and_entropy.
+    """
+    if is_csv(output_file):
+        write_csv(entropy_table, output_file)
+    else:
+        write_table(entropy_table, output_file)
+
+
+def read_instruction_table(file_path):
+    """
+    Read an instruction table from a CSV (or columnar) file.
+
+    Args:
+        file_path (str): Path to the CSV, .parquet or .npz file containing assembly code.
+
+    Returns:
+        pandas.DataFrame: The table with every column as text and empty strings for
+        missing operands, as read by read_assembly_csv.
+    """
+    if is_csv(file_path):
+        return pd.read_csv(
+            file_path,
+            dtype=str,
+            keep_default_na=False,
+            engine="c" if pyarrow is None else "pyarrow",
+        )
+    table = read_table(file_path)
+    return table.astype(str).where(table.notna(), "")
 
 
 # Function to read the assembly CSV file
 def read_assembly_csv(file_path):
     """
-    Read assembly code from a CSV file and organize it into blocks.
+    Read assembly code from a CSV (or columnar) file and organize it into blocks.
 
     Args:
-        file_path (str): Path to the CSV file containing assembly code.
+        file_path (str): Path to the CSV, .parquet or .npz file containing assembly code.
 
     Returns:
         defaultdict: A dictionary where keys are block IDs and values are lists of dictionaries
@@ -98,6 +299,22 @@ def read_assembly_csv(file_path):
                     Each dictionary has keys 'Instruction', 'Left Operand', and 'Right Operand'.
     """
     blocks = defaultdict(list)
+    if not is_csv(file_path):
+        table = read_table(file_path)
+        columns = ["Block_ID", "Instruction", "Left Operand", "Right Operand"]
+        table = table[columns].astype(str).where(table[columns].notna(), "")
+        for block_id, instruction, left_operand, right_operand in table.itertuples(
+            index=False
+        ):
+            blocks[block_id].append(
+                {
+                    "Instruction": instruction,
+                    "Left Operand": left_operand,
+                    "Right Operand": right_operand,
+                }
+            )
+        return blocks
+
     with open(file_path, newline="", encoding="UTF-8") as csvfile:
         reader = csv.DictReader(csvfile)
         for row in reader:
@@ -117,16 +334,16 @@ def main():
     """
     Main function that processes assembly code file and calculates entropy metrics.
 
-    This function reads an assembly code file, extracts basic blocks, and calculates
-    probability distributions and entropy values for instructions and operands within
-    each block. Results are written to a CSV file.
+    This function reads an assembly code file and calculates probability distributions
+    and entropy values for instructions and operands within each block, for all blocks
+    at once. Results are written to a CSV file in a single bulk write.
     """
     assembly_file_path = (
         "compiled\\dynamic_array_allocator_disassembled\\"
         "dynamic_array_allocator_diassembly.csv"
     )
-    blocks = read_assembly_csv(assembly_file_path)
-    calculate_probabilities_and_entropy(blocks)
+    df = read_instruction_table(assembly_file_path)
+    write_entropy_table(compute_entropy_table(df))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+"""
+This module fuses the entropy and threshold stages into a single pass.
+It reads the instruction table once, computes the probability and entropy of every
+token, derives the mean + standard deviation threshold of each (Block_ID, Type) group
+and filters the low entropy tokens in memory. Both the full and the filtered entropy
+tables are written, identical to the outputs of entropy.py followed by threshold.py.
+"""
+
+import os
+import sys
+
+from entropy import (
+    compute_entropy_table,
+    read_instruction_table,
+    write_entropy_table,
+)
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "clustering"
+    )
+)
+from threshold import filter_entropy_table  # pylint: disable=wrong-import-position
+
+# Define input and output file paths (modify as needed)
+INPUT_FILE = r"compiled\csv_parser_disassembled\csv_parser_disassembly.csv"
+OUTPUT_FILE = r"entropy\csv_parser_entropy.csv"
+FILTERED_OUTPUT_FILE = r"entropy_preprocessed\csv_parser_filtered_entropy.csv"
+
+
+def calculate_filtered_entropy(input_file):
+    """
+    Calculate the entropy table of an instruction table and filter it by threshold.
+
+    Args:
+        input_file (str): Path to the CSV, .parquet or .npz instruction table.
+
+    Returns:
+        tuple: A tuple containing:
+            - pandas.DataFrame: The full entropy table
+            - pandas.DataFrame: The rows whose entropy is greater than or equal to the
+              threshold of their (Block_ID, Type) group
+            - dict: The thresholds as {block_id: {variable_type: threshold}}
+    """
+    entropy_table = compute_entropy_table(read_instruction_table(input_file))
+    filtered_table, thresholds = filter_entropy_table(entropy_table)
+    return entropy_table, filtered_table, thresholds
+
+
+def main():
+    """
+    Main function that computes the entropy table of an instruction table, filters it
+    by the per-group thresholds, and writes both the full and the filtered tables.
+    """
+    entropy_table, filtered_table, _ = calculate_filtered_entropy(INPUT_FILE)
+    write_entropy_table(entropy_table, OUTPUT_FILE)
+    write_entropy_table(filtered_table, FILTERED_OUTPUT_FILE)
+    print("Entropy table written to:", OUTPUT_FILE)
+    print("Filtered entropy table written to:", FILTERED_OUTPUT_FILE)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,51 +4,60 @@ It processes entropy-filtered data to determine the frequency and probability of
 instruction type, providing insights into instruction patterns across different code blocks.
 """
 
-import pandas as pd
+import os
+import sys
 
-# Load the filtered CSV file containing high entropy data
-df = pd.read_csv(r"entropy_preprocessed\simple_calculator_filtered_entropy.csv")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from columnar_io import read_table, write_table  # pylint: disable=wrong-import-position
 
 
 # Function to calculate probability of each Assembly value for each Type in each Block
-def calculate_assembly_probabilities(df):
+def calculate_assembly_probabilities(df, group_columns=("Block_ID", "Type")):
     """
     Calculate the probability of each Assembly value for each Type within each Block.
 
     Args:
         df (pandas.DataFrame): Input DataFrame containing Block_ID, Type, and Assembly columns.
+        group_columns (tuple): Columns whose groups the probabilities sum to one over;
+            prepend a column such as "Binary" to handle several binaries at once.
 
     Returns:
-        pandas.DataFrame: DataFrame containing Block_ID, Type, Assembly, and their corresponding probabilities.
+        pandas.DataFrame: DataFrame containing the group columns, Assembly, and their corresponding probabilities.
     """
-    # Group by 'Block_ID', 'Type', and 'Assembly' and count occurrences
-    assembly_counts = (
-        df.groupby(["Block_ID", "Type", "Assembly"]).size().reset_index(name="Count")
-    )
-
-    # Calculate total count of each Type within each Block
-    total_counts = (
-        assembly_counts.groupby(["Block_ID", "Type"])["Count"]
-        .sum()
-        .reset_index(name="Total_Count")
-    )
+    # Group by the group columns and 'Assembly' and count occurrences
+    assembly_counts = df.groupby([*group_columns, "Assembly"], observed=True).size()
 
-    # Merge assembly counts with total counts
-    merged_df = pd.merge(assembly_counts, total_counts, on=["Block_ID", "Type"])
+    # Calculate the total count of each group, aligned with the counts (no merge)
+    total_counts = assembly_counts.groupby(
+        level=list(range(len(group_columns))), observed=True
+    ).transform("sum")
 
     # Calculate probability of each Assembly value for each Type in each Block
-    merged_df["Probability"] = merged_df["Count"] / merged_df["Total_Count"]
+    return (assembly_counts / total_counts).reset_index(name="Probability")
 
-    return merged_df[["Block_ID", "Type", "Assembly", "Probability"]]
 
+def main():
+    """
+    Main function that loads the filtered entropy data, calculates the probability of
+    each Assembly value per Type and Block, and saves the result.
 
-# Calculate Assembly probabilities
-assembly_probabilities = calculate_assembly_probabilities(df)
+    Input and output may be CSV, .parquet or .npz files.
+    """
+    # Load the filtered file containing high entropy data
+    df = read_table(r"entropy_preprocessed\simple_calculator_filtered_entropy.csv")
+
+    # Calculate Assembly probabilities
+    assembly_probabilities = calculate_assembly_probabilities(df)
+
+    # Print first few rows of the resulting DataFrame
+    print(assembly_probabilities.head())
+
+    # Save the result to a new file
+    write_table(
+        assembly_probabilities,
+        r"probability_update\simple_calculator_probability_update.csv",
+    )
 
-# Print first few rows of the resulting DataFrame
-print(assembly_probabilities.head())
 
-# Save the result to a new CSV file
-assembly_probabilities.to_csv(
-    "probability_update\simple_calculator_probability_update.csv", index=False
-)
+if __name__ == "__main__":
+    main()
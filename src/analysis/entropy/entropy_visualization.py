@@ -2,45 +2,75 @@
 This module provides functionality for visualizing entropy data from binary analysis.
 It reads entropy values from CSV files and creates visualizations using matplotlib
 and seaborn to display entropy distributions for instructions and operands across
-different code blocks.
+different code blocks. The entropies and thresholds of a block are looked up in an
+EntropyIndex, so the entropy file is read once.
 """
 
-import csv
-import numpy as np
+import os
+import sys
+import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from columnar_io import is_csv, read_table  # pylint: disable=wrong-import-position
 
-# Function to read the entropy CSV file and filter data for a specified block
-def read_entropy_data(input_file, block_id):
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "clustering"
+    )
+)
+from entropy_index import EntropyIndex  # pylint: disable=wrong-import-position
+
+
+# Function to read the entropy file once
+def read_entropy_table(input_file):
     """
-    Reads entropy data from a CSV file and filters it for a specified block ID.
+    Reads an entropy table from a CSV (or columnar) file.
 
     Args:
-        input_file (str): Path to the CSV file containing entropy data
+        input_file (str): Path to the CSV, .parquet or .npz file containing entropy data
+
+    Returns:
+        pandas.DataFrame: The entropy table, with text Block_IDs and CSV entropies
+        parsed exactly as float() parses them.
+    """
+    if is_csv(input_file):
+        return pd.read_csv(
+            input_file,
+            dtype={"Block_ID": str, "Type": str, "Assembly": str},
+            keep_default_na=False,
+            float_precision="round_trip",
+        )
+    return read_table(input_file)
+
+
+# Function to get the entropy data of a specified block
+def read_entropy_data(table, index, block_id):
+    """
+    Gets the entropy data of a specified block ID from an indexed entropy table.
+
+    Args:
+        table (pandas.DataFrame): Entropy table with Block_ID, Type, Assembly and
+            Entropy columns
+        index (EntropyIndex): Index of the table
         block_id (str): ID of the block to filter data for
 
     Returns:
         dict: Dictionary containing filtered entropy data with keys 'Instruction',
              'Left Operand', and 'Right Operand'. Each key maps to a list of
-             tuples containing (assembly, entropy) pairs.
+             tuples containing (assembly, entropy) pairs, in table order.
     """
     data = {"Instruction": [], "Left Operand": [], "Right Operand": []}
-
-    with open(input_file, newline="", encoding="UTF-8") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            if row["Block_ID"] == block_id:
-                variable_type = row["Type"]
-                assembly = row["Assembly"]
-                entropy = float(row["Entropy"])
-                if variable_type == "Instruction":
-                    data["Instruction"].append((assembly, entropy))
-                elif variable_type == "Left Operand":
-                    data["Left Operand"].append((assembly, entropy))
-                elif variable_type == "Right Operand":
-                    data["Right Operand"].append((assembly, entropy))
-
+    for variable_type, values in data.items():
+        if (str(block_id), variable_type) in index.groups:
+            rows = table.iloc[index.group_rows(block_id, variable_type)]
+            values.extend(
+                zip(
+                    rows["Assembly"].astype(str).tolist(),
+                    rows["Entropy"].astype(float).tolist(),
+                )
+            )
     return data
 
 
@@ -93,40 +123,26 @@ def plot_entropies(data, variable_type, block_id, threshold):
 
 
 # Function to calculate entropy statistics for each variable type within each block
-def calculate_variable_type_entropy_statistics(input_file):
+def calculate_variable_type_entropy_statistics(index):
     """
     Calculates entropy statistics for each variable type within each code block.
 
     Args:
-        input_file (str): Path to the CSV file containing entropy data
+        index (EntropyIndex): Index of the entropy table
 
     Returns:
         dict: A nested dictionary containing entropy thresholds for each variable type
               within each block. The structure is:
               {block_id: {variable_type: threshold}}
-              where threshold = mean entropy + standard deviation
+              where threshold = mean entropy + standard deviation (np.mean + np.std)
     """
-    block_variable_statistics = {}
-    with open(input_file, newline="", encoding="UTF-8") as infile:
-        reader = csv.DictReader(infile)
-        for row in reader:
-            block_id = row["Block_ID"]
-            variable_type = row["Type"]
-            entropy = float(row["Entropy"])
-            if block_id not in block_variable_statistics:
-                block_variable_statistics[block_id] = {}
-            if variable_type not in block_variable_statistics[block_id]:
-                block_variable_statistics[block_id][variable_type] = []
-            block_variable_statistics[block_id][variable_type].append(entropy)
-
     block_variable_thresholds = {}
-    for block_id, variable_statistics in block_variable_statistics.items():
-        block_variable_thresholds[block_id] = {}
-        for variable_type, entropies in variable_statistics.items():
-            mean_entropy = np.mean(entropies)
-            std_dev_entropy = np.std(entropies)
-            threshold = mean_entropy + std_dev_entropy
-            block_variable_thresholds[block_id][variable_type] = threshold
+    for block_id, variable_type, threshold in zip(
+        index.block_ids.tolist(),
+        index.variable_types.tolist(),
+        index.thresholds(1.0).tolist(),
+    ):
+        block_variable_thresholds.setdefault(block_id, {})[variable_type] = threshold
     return block_variable_thresholds
 
 
@@ -139,18 +155,22 @@ def main():
     calculates entropy thresholds, and generates visualization plots for
     instructions and operands if data is available.
 
-    The function processes data from a CSV file containing entropy values
+    The function reads a file containing entropy values once, indexes it,
     and creates separate plots for instructions, left operands, and right
     operands using the calculated threshold values.
     """
     input_file = "entropy\csv_parser_entropy.csv"
     block_id = input("Enter the Block ID to visualize: ")
 
+    # Read and index the entropy table once
+    table = read_entropy_table(input_file)
+    index = EntropyIndex.from_table(table)
+
     # Read the entropy data for the specified block
-    data = read_entropy_data(input_file, block_id)
+    data = read_entropy_data(table, index, block_id)
 
     # Calculate block-wise variable type entropy statistics
-    block_variable_thresholds = calculate_variable_type_entropy_statistics(input_file)
+    block_variable_thresholds = calculate_variable_type_entropy_statistics(index)
 
     # Plot the entropies for instructions, left operands, and right operands
     if data["Instruction"]:
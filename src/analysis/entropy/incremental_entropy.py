@@ -0,0 +1,256 @@
+"""
+This module recomputes the entropy stage incrementally after a binary is rebuilt.
+Every block is identified by a hash of its instruction sequence, independent of its
+Block_ID and addresses. The token counts of every block are saved with their row
+offsets under the block hash; blocks whose hash was already seen in the previous run
+gather their counts from there, and only the lines of new or changed blocks are encoded
+and counted again. The entropy, filtered entropy and probability tables are identical
+to those of a full recompute.
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+from entropy import (
+    build_entropy_table,
+    count_block_tokens,
+    read_instruction_table,
+    write_entropy_table,
+)
+from entropy_probability_update import calculate_assembly_probabilities
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from columnar_io import write_table  # pylint: disable=wrong-import-position
+from token_vocabulary import (  # pylint: disable=wrong-import-position
+    TOKEN_TYPES,
+    TokenVocabulary,
+)
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "clustering"
+    )
+)
+from threshold import filter_entropy_table  # pylint: disable=wrong-import-position
+
+# Define input and output file paths (modify as needed)
+INPUT_FILE = r"compiled\csv_parser_disassembled\csv_parser_disassembly.csv"
+OUTPUT_FILE = r"entropy\csv_parser_entropy.csv"
+FILTERED_OUTPUT_FILE = r"entropy_preprocessed\csv_parser_filtered_entropy.csv"
+PROBABILITY_OUTPUT_FILE = r"probability_update\csv_parser_probability_update.csv"
+
+# Odd 64-bit multiplier that combines the hashes of the three fields of a line
+FIELD_HASH_MULTIPLIER = 0x100000001B3
+
+# Odd 64-bit multipliers of the two polynomial hashes that combine the line hashes of
+# a block into its 128-bit block hash
+HASH_MULTIPLIERS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F)
+
+
+def block_state_path(path):
+    """
+    Get the path of the block state that accompanies an entropy table.
+
+    Args:
+        path (str): Path of the entropy table.
+
+    Returns:
+        str: The path with the extension replaced by "_block_state.npz".
+    """
+    return f"{os.path.splitext(path)[0]}_block_state.npz"
+
+
+def hash_blocks(df):
+    """
+    Hash the instruction sequence of every block of an instruction table.
+
+    Args:
+        df (pandas.DataFrame): Instruction table with Block_ID, Instruction,
+            Left Operand and Right Operand columns.
+
+    Returns:
+        tuple: A tuple containing:
+            - numpy.ndarray: Block code of every line
+            - pandas.Index: Block IDs in order of first appearance
+            - numpy.ndarray: Line count of every block
+            - numpy.ndarray: uint64 array of shape (blocks, 2) holding the 128-bit
+              hash of every block
+
+    Only the instructions and operands are hashed, in line order, so a block keeps its
+    hash when it moves to another address or gets another Block_ID. Every distinct
+    instruction and operand text is hashed once with pandas' vectorized hash; the
+    hashes are combined per line, and the line hashes of a block by two polynomial
+    hashes modulo 2**64.
+    """
+    block_codes, block_ids = pd.factorize(df["Block_ID"])
+    line_counts = np.bincount(block_codes, minlength=len(block_ids))
+    hashes = np.zeros((len(block_ids), len(HASH_MULTIPLIERS)), dtype=np.uint64)
+    if not len(df):
+        return block_codes, pd.Index(block_ids), line_counts, hashes
+
+    # Hash every distinct text once, then combine the columns of each line
+    line_hashes = np.zeros(len(df), dtype=np.uint64)
+    for token_type in TOKEN_TYPES:
+        codes, uniques = pd.factorize(df[token_type].fillna(""))
+        line_hashes = (
+            line_hashes * np.uint64(FIELD_HASH_MULTIPLIER)
+            + pd.util.hash_array(np.asarray(uniques, dtype=object))[codes]
+        )
+    line_hashes = line_hashes[np.argsort(block_codes, kind="stable")]
+    starts = np.cumsum(line_counts) - line_counts
+    positions = np.arange(len(df)) - np.repeat(starts, line_counts)
+
+    for column, multiplier in enumerate(HASH_MULTIPLIERS):
+        powers = np.cumprod(np.full(line_counts.max(), multiplier, dtype=np.uint64))
+        hashes[:, column] = np.add.reduceat(line_hashes * powers[positions], starts)
+    return block_codes, pd.Index(block_ids), line_counts, hashes
+
+
+def load_block_state(path):
+    """
+    Load the block state saved by a previous run with save_block_state.
+
+    Args:
+        path (str): Path of the .npz block state.
+
+    Returns:
+        dict: The block hashes, the row offsets and row counts of every block into the
+        token and count arrays, the token and count arrays and the token vocabulary.
+    """
+    with np.load(path, allow_pickle=False) as arrays:
+        state = {name: arrays[name] for name in arrays.files}
+    state["vocabulary"] = TokenVocabulary(
+        zip(state.pop("types").tolist(), state.pop("assemblies").tolist())
+    )
+    return state
+
+
+def save_block_state(path, hashes, key_blocks, key_tokens, counts, vocabulary):
+    """
+    Save the counted tokens of every block, keyed by block hash, for the next run.
+
+    Args:
+        path (str): Output path of the .npz block state.
+        hashes (numpy.ndarray): Hash of every block (see hash_blocks).
+        key_blocks (numpy.ndarray): Block code of every (block, token) key, grouped
+            by block.
+        key_tokens (numpy.ndarray): Token ID of every key.
+        counts (numpy.ndarray): Number of occurrences of every key.
+        vocabulary (TokenVocabulary): Vocabulary of the token IDs.
+
+    Only the tokens that occur are saved, renumbered in order of their IDs.
+    """
+    used, key_tokens = np.unique(key_tokens, return_inverse=True)
+    types, assemblies = vocabulary.decode(used)
+    row_counts = np.bincount(key_blocks, minlength=len(hashes))
+    with open(path, "wb") as file:
+        np.savez_compressed(
+            file,
+            hashes=hashes,
+            row_starts=np.cumsum(row_counts) - row_counts,
+            row_counts=row_counts,
+            tokens=key_tokens.astype(np.int32),
+            counts=counts,
+            types=np.asarray(types, dtype=str),
+            assemblies=np.asarray(assemblies, dtype=str),
+        )
+
+
+def compute_incremental_entropy_table(df, state=None):
+    """
+    Calculate the entropy table of an instruction table, reusing the counted tokens
+    of blocks that are unchanged since a previous run.
+
+    Args:
+        df (pandas.DataFrame): Instruction table.
+        state (dict): Block state of the previous run (see load_block_state), or None.
+
+    Returns:
+        tuple: A tuple containing:
+            - pandas.DataFrame: The entropy table, identical to
+              compute_entropy_table(df)
+            - dict: The arguments of save_block_state for df, except the path
+            - int: The number of blocks that had to be recomputed
+
+    Only the lines of new or changed blocks are encoded and counted; the (token,
+    count) rows of every other block are gathered from the previous state through its
+    row offsets.
+    """
+    block_codes, block_ids, line_counts, hashes = hash_blocks(df)
+    if state is None:
+        state = {
+            "hashes": np.zeros((0, len(HASH_MULTIPLIERS)), dtype=np.uint64),
+            "row_starts": np.zeros(0, dtype=np.int64),
+            "row_counts": np.zeros(0, dtype=np.int64),
+            "tokens": np.zeros(0, dtype=np.int32),
+            "counts": np.zeros(0, dtype=np.int64),
+            "vocabulary": TokenVocabulary(),
+        }
+    vocabulary = state["vocabulary"]
+
+    # Match every block to a previous block with the same instruction sequence
+    previous_hashes = pd.MultiIndex.from_arrays(list(state["hashes"].T))
+    first = np.flatnonzero(~previous_hashes.duplicated())
+    positions = previous_hashes[first].get_indexer(
+        pd.MultiIndex.from_arrays(list(hashes.T))
+    )
+    matches = np.append(first, -1)[positions]
+    changed = matches < 0
+
+    # Count the tokens of the changed blocks only; they keep their relative order
+    _, _, changed_blocks, changed_tokens, changed_counts = count_block_tokens(
+        df[changed[block_codes]], vocabulary
+    )
+    changed_sizes = np.bincount(changed_blocks, minlength=int(changed.sum()))
+
+    # Gather the rows of every block from the previous or the changed keys
+    sources = np.empty(len(block_ids), dtype=np.int64)
+    sizes = np.empty(len(block_ids), dtype=np.int64)
+    sources[~changed] = state["row_starts"][matches[~changed]]
+    sizes[~changed] = state["row_counts"][matches[~changed]]
+    sources[changed] = len(state["tokens"]) + np.cumsum(changed_sizes) - changed_sizes
+    sizes[changed] = changed_sizes
+    rows = np.arange(sizes.sum()) + np.repeat(sources - np.cumsum(sizes) + sizes, sizes)
+    key_blocks = np.repeat(np.arange(len(block_ids)), sizes)
+    key_tokens = np.concatenate([state["tokens"], changed_tokens])[rows]
+    counts = np.concatenate([state["counts"], changed_counts])[rows]
+
+    entropy_table = build_entropy_table(
+        block_ids, line_counts, key_blocks, key_tokens, counts, vocabulary
+    )
+    new_state = {
+        "hashes": hashes,
+        "key_blocks": key_blocks,
+        "key_tokens": key_tokens,
+        "counts": counts,
+        "vocabulary": vocabulary,
+    }
+    return entropy_table, new_state, int(changed.sum())
+
+
+def main():
+    """
+    Main function that recomputes the entropy, filtered entropy and probability tables
+    of an instruction table, counting again only the blocks whose instruction sequence
+    changed since the previous run.
+    """
+    df = read_instruction_table(INPUT_FILE)
+    state_file = block_state_path(OUTPUT_FILE)
+    state = load_block_state(state_file) if os.path.exists(state_file) else None
+
+    entropy_table, new_state, recomputed = compute_incremental_entropy_table(df, state)
+    print(f"Recomputed {recomputed} of {len(new_state['hashes'])} blocks")
+
+    filtered_table, _ = filter_entropy_table(entropy_table)
+    write_entropy_table(entropy_table, OUTPUT_FILE)
+    save_block_state(state_file, **new_state)
+    write_entropy_table(filtered_table, FILTERED_OUTPUT_FILE)
+    write_table(
+        calculate_assembly_probabilities(filtered_table), PROBABILITY_OUTPUT_FILE
+    )
+
+
+if __name__ == "__main__":
+    main()
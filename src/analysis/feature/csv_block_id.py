@@ -1,6 +1,7 @@
 """
 This module processes a CSV file containing block data and assigns numerical IDs to blocks.
-It reads the input CSV, maps string block IDs to numerical values, and saves the updated data.
+It reads the input CSV, maps string block IDs to numerical values, and saves the updated data
+together with a mapping table from block names to their numerical IDs.
 """
 
 import pandas as pd
@@ -10,34 +11,54 @@ INPUT_FILE = (
     r"C:\External\Projects\8th Semester\Thesis\feature_extraction\output"
     r"\updated_formatted_data.csv"
 )
-OUTPUT_FILE = r"C:\External\Projects\8th Semester\Thesis\feature_extraction\output"
-r"\updated_formatted_data.csv"
+OUTPUT_FILE = (
+    r"C:\External\Projects\8th Semester\Thesis\feature_extraction\output"
+    r"\updated_formatted_data.csv"
+)
+MAPPING_FILE = (
+    r"C:\External\Projects\8th Semester\Thesis\feature_extraction\output"
+    r"\block_id_mapping.csv"
+)
+
+
+def assign_block_ids(df):
+    """
+    Assign numerical Block_IDs in order of first appearance, starting from 1.
+
+    Args:
+        df (pandas.DataFrame): DataFrame with a Block_ID column holding block names.
 
-# Read the CSV data
-df = pd.read_csv(INPUT_FILE)
+    Returns:
+        tuple: A tuple containing:
+            - pandas.DataFrame: A copy of the input with numerical Block_IDs
+            - pandas.DataFrame: The mapping table with Block_Name and Block_ID columns
+    """
+    codes, block_names = pd.factorize(df["Block_ID"])
+    numbered_df = df.copy()
+    numbered_df["Block_ID"] = codes + 1
+    block_id_mapping = pd.DataFrame(
+        {"Block_Name": block_names, "Block_ID": range(1, len(block_names) + 1)}
+    )
+    return numbered_df, block_id_mapping
 
-# Initialize a counter and dictionary for assigning numerical IDs
-BLOCK_ID = 1
-block_id_map = {}
 
-# Iterate through rows (excluding the header)
-for index, row in df.iterrows():
-    if index == 0:
-        continue  # Skip the header row
+def main():
+    """
+    Main function that reads the formatted data, assigns numerical Block_IDs,
+    and writes the updated data and the block name mapping to CSV files.
+    """
+    # Read the CSV data
+    df = pd.read_csv(INPUT_FILE)
 
-    # Get the Block_ID and check if it's already seen
-    current_block_id = row["Block_ID"]
-    if current_block_id not in block_id_map:
-        block_id_map[current_block_id] = BLOCK_ID
-        BLOCK_ID += 1  # Increment counter for new unique IDs
+    # Assign numerical IDs to the blocks
+    df, block_id_mapping = assign_block_ids(df)
 
-    # Update the Block_ID with the numerical ID
-    row["Block_ID"] = block_id_map[current_block_id]
+    # Save the updated data and the mapping to new CSV files
+    df.to_csv(OUTPUT_FILE, index=False)
+    block_id_mapping.to_csv(MAPPING_FILE, index=False)
 
-# Update the DataFrame with the modified values
-df.update(df)
+    print("CSV file updated with numerical Block IDs!")
 
-# Save the updated data to a new CSV file
-df.to_csv(OUTPUT_FILE, index=False)
 
-print("CSV file updated with numerical Block IDs!")
+if __name__ == "__main__":
+    main()
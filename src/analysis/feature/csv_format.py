@@ -6,6 +6,11 @@ and updates the CSV file structure accordingly.
 
 import pandas as pd
 
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow is optional; pandas' own regex engine is used without it
+    pa = None
+
 # Read the CSV file
 INPUT_FILE = (
     r"C:\External\Projects\8th Semester\Thesis\feature_extraction\output"
@@ -43,20 +48,63 @@ def split_left_operand(text):
         return text[:split_index], text[split_index + 1 :]
 
 
-# Read the CSV data
-df = pd.read_csv(INPUT_FILE)
+# Matches a whole operand text, splitting it at the first comma outside parentheses.
+# Parenthesized groups such as AT&T "disp(%base,%index,scale)" are kept intact, and a
+# trailing unclosed group (e.g. "0x0(%rax") keeps the rest of the text on the left.
+OPERAND_SPLIT_PATTERN = (
+    r"(?s)^(?P<left>[^,()]*(?:\([^()]*\)[^,()]*)*(?:\([^()]*$)?)(?:,(?P<right>.*))?$"
+)
+
+
+def split_operands(operands):
+    """
+    Splits a whole column of operand texts at once while handling commas inside brackets.
+
+    Args:
+        operands (pandas.Series): The operand texts to be split.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with "Left Operand" and "Right Operand" columns,
+        equal to applying split_left_operand to every row. Missing values are treated
+        as empty text.
+    """
+    operands = operands.fillna("").astype(str)
+    if pa is not None:
+        # Arrow-backed strings run the pattern in native code over the whole column
+        operands = operands.astype(pd.ArrowDtype(pa.string()))
+    split = operands.str.extract(OPERAND_SPLIT_PATTERN).astype(object)
+    split.columns = ["Left Operand", "Right Operand"]
+    split["Right Operand"] = split["Right Operand"].fillna("")
+
+    # Nested or unbalanced parentheses are not matched by the pattern
+    unmatched = split["Left Operand"].isna()
+    if unmatched.any():
+        split.loc[unmatched, ["Left Operand", "Right Operand"]] = [
+            split_left_operand(text) for text in operands[unmatched]
+        ]
+    return split
+
+
+def main():
+    """
+    Main function that splits the Left Operand column of the formatted data CSV file
+    into left and right operands and saves the result to a new CSV file.
+    """
+    # Read the CSV data
+    df = pd.read_csv(INPUT_FILE)
+
+    # Split the Left Operand column into Left and Right Operand columns
+    df[["Left Operand", "Right Operand"]] = split_operands(df["Left Operand"])
 
-# Apply the split function to the Left Operand column
-split_results = df["Left Operand"].apply(split_left_operand)
+    # Clear the Instruction column (if needed)
+    if any(df["Instruction"]):  # Check if Instruction column has any values
+        df["Instruction"] = ""
 
-# Fill missing values with empty strings (for Right Operand in rows without commas)
-df[["Left Operand", "Right Operand"]] = split_results.fillna("")
+    # Save the updated data to a new CSV file
+    df.to_csv(OUTPUT_FILE, index=False)
 
-# Clear the Instruction column (if needed)
-if any(df["Instruction"]):  # Check if Instruction column has any values
-    df["Instruction"] = ""
+    print("CSV file updated successfully!")
 
-# Save the updated data to a new CSV file
-df.to_csv(OUTPUT_FILE, index=False)
 
-print("CSV file updated successfully!")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+This module splits large disassembly listings into shards that can be parsed in parallel.
+The listing is memory-mapped, cut into byte ranges at block header lines such as
+"0000000000002000 <_init>:", and each range is handed to a worker process. Results are
+returned in file order so they can be merged back into address order.
+"""
+
+import os
+import re
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+
+# Matches a block header line, e.g. "0000000000002000 <_init>:"
+BLOCK_HEADER_PATTERN = re.compile(rb"^[0-9a-fA-F]+ <.*>:\r?$", re.MULTILINE)
+
+
+def find_shard_boundaries(listing, shard_count):
+    """
+    Find byte offsets at which a listing can be split without cutting through a block.
+
+    Args:
+        listing (bytes or mmap.mmap): The raw contents of the disassembly listing.
+        shard_count (int): The desired number of shards.
+
+    Returns:
+        list: Sorted byte offsets, starting with 0 and ending with len(listing). Every
+              inner offset is the start of a block header line.
+    """
+    size = len(listing)
+    boundaries = [0]
+    for shard in range(1, shard_count):
+        target = max(size * shard // shard_count, boundaries[-1] + 1)
+        header_match = BLOCK_HEADER_PATTERN.search(listing, target)
+        if header_match is None:
+            break
+        boundaries.append(header_match.start())
+    boundaries.append(size)
+    return boundaries
+
+
+def _parse_shard(task):
+    """
+    Parse one byte range of a listing in a worker process.
+
+    Args:
+        task (tuple): (file_path, start, stop, parse_function)
+
+    Returns:
+        The result of parse_function on the decoded text of the shard.
+    """
+    file_path, start, stop, parse_function = task
+    with open(file_path, "rb") as file, mmap.mmap(
+        file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as listing:
+        text = listing[start:stop].decode("utf-8")
+    return parse_function(text)
+
+
+def parse_listing_in_shards(file_path, parse_function, workers=None):
+    """
+    Parse a disassembly listing in parallel, one shard per worker process.
+
+    Args:
+        file_path (str): Path to the .txt/.asm disassembly listing.
+        parse_function (callable): A module-level function taking the text of a shard
+            and returning its parsed result (e.g. parse_disassembly).
+        workers (int): Number of worker processes. Defaults to os.cpu_count().
+
+    Returns:
+        list: The parsed result of each shard, in file (and therefore address) order.
+    """
+    workers = workers or os.cpu_count() or 1
+    with open(file_path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return [parse_function("")]
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as listing:
+            boundaries = find_shard_boundaries(listing, workers)
+
+    tasks = [
+        (file_path, start, stop, parse_function)
+        for start, stop in zip(boundaries[:-1], boundaries[1:])
+    ]
+    if len(tasks) == 1:
+        return [_parse_shard(tasks[0])]
+    with ProcessPoolExecutor(max_workers=len(tasks)) as executor:
+        return list(executor.map(_parse_shard, tasks))
@@ -0,0 +1,385 @@
+"""
+This module ingests ELF binaries directly, without an intermediate disassembly text file.
+It runs objdump as a subprocess and streams its output straight into the block parser,
+writing the same CSV format as feature_extraction_test. Large binaries are split into
+address ranges at function boundaries and disassembled by several worker processes.
+Parsed binaries can be kept in a content-addressed cache so unchanged binaries are not
+disassembled again.
+"""
+
+import os
+import re
+import csv
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+from feature_extraction_test import stream_instructions
+from parse_cache import cache_path, load_instructions, store_instructions
+
+# Command used to disassemble binaries
+OBJDUMP = "objdump"
+
+# Binaries with more executable bytes than this are split across workers
+SPLIT_THRESHOLD = 1024 * 1024
+
+# Header row of the formatted data CSV (same as feature_extraction_test)
+CSV_HEADER = ["Block ID", "Address", "Instruction", "Left Operand", "Right Operand"]
+
+# Matches a section line of "objdump -h", e.g. " 11 .init  0000001b  0000000000002000 ..."
+SECTION_PATTERN = re.compile(
+    r"^\s*\d+\s+(\S+)\s+([0-9a-fA-F]+)\s+([0-9a-fA-F]+)\s+[0-9a-fA-F]+\s+[0-9a-fA-F]+"
+)
+
+# Matches a symbol line of "objdump -t", capturing address, flags and section
+SYMBOL_PATTERN = re.compile(r"^([0-9a-fA-F]+) (.{7}) (\S+)\t")
+
+
+def is_elf(file_path):
+    """
+    Check whether a file is an ELF binary.
+
+    Args:
+        file_path (str): Path to the file to check.
+
+    Returns:
+        bool: True if the file starts with the ELF magic number.
+    """
+    with open(file_path, "rb") as file:
+        return file.read(4) == b"\x7fELF"
+
+
+def find_elf_binaries(compiled_directory):
+    """
+    Find the ELF binaries in the subdirectories of a compiled data directory.
+
+    Args:
+        compiled_directory (str): Directory such as "compiled", containing one
+            subdirectory per program (e.g. "compiled/csv_parser_disassembled/").
+
+    Returns:
+        list: Sorted paths of every ELF binary found one level below the directory.
+    """
+    binaries = []
+    for entry in sorted(os.listdir(compiled_directory)):
+        program_directory = os.path.join(compiled_directory, entry)
+        if not os.path.isdir(program_directory):
+            continue
+        for file_name in sorted(os.listdir(program_directory)):
+            file_path = os.path.join(program_directory, file_name)
+            if os.path.isfile(file_path) and is_elf(file_path):
+                binaries.append(file_path)
+    return binaries
+
+
+def read_code_sections(binary_path):
+    """
+    Read the executable sections of a binary using "objdump -h".
+
+    Args:
+        binary_path (str): Path to the ELF binary.
+
+    Returns:
+        list: (name, start_address, stop_address) tuples for every section with the
+              CODE flag, in address order.
+    """
+    output = subprocess.run(
+        [OBJDUMP, "-h", binary_path],
+        check=True,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+    ).stdout.splitlines()
+    sections = []
+    for line, flags in zip(output, output[1:]):
+        section_match = SECTION_PATTERN.match(line)
+        if section_match and "CODE" in flags:
+            name, size, start = section_match.groups()
+            start = int(start, 16)
+            sections.append((name, start, start + int(size, 16)))
+    return sorted(sections, key=lambda section: section[1])
+
+
+def read_function_addresses(binary_path, sections):
+    """
+    Read the start addresses of the functions in the executable sections of a binary.
+
+    Args:
+        binary_path (str): Path to the ELF binary.
+        sections (list): Executable sections as returned by read_code_sections.
+
+    Returns:
+        list: Sorted, unique start addresses of functions and executable sections.
+              Stripped binaries only yield the section start addresses.
+    """
+    section_names = {name for name, _, _ in sections}
+    addresses = {start for _, start, _ in sections}
+    output = subprocess.run(
+        [OBJDUMP, "-t", binary_path],
+        check=True,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+    ).stdout
+    for line in output.splitlines():
+        symbol_match = SYMBOL_PATTERN.match(line)
+        if symbol_match:
+            address, flags, section = symbol_match.groups()
+            if "F" in flags and section in section_names:
+                addresses.add(int(address, 16))
+    return sorted(addresses)
+
+
+def plan_address_ranges(binary_path, workers):
+    """
+    Split the executable code of a binary into address ranges of similar size.
+
+    Args:
+        binary_path (str): Path to the ELF binary.
+        workers (int): Number of ranges to aim for.
+
+    Returns:
+        list: (start_address, stop_address) tuples covering all executable sections.
+              Every range starts at a function or section boundary, so no block is cut
+              in two. A single (None, None) range is returned for small binaries.
+    """
+    if workers <= 1:
+        return [(None, None)]
+    sections = read_code_sections(binary_path)
+    code_size = sum(stop - start for _, start, stop in sections)
+    if not sections or code_size < SPLIT_THRESHOLD:
+        return [(None, None)]
+
+    addresses = read_function_addresses(binary_path, sections)
+    start, stop = sections[0][1], max(stop for _, _, stop in sections)
+    boundaries = [start]
+    for address in addresses:
+        target = start + (stop - start) * len(boundaries) // workers
+        if address >= target and address > boundaries[-1]:
+            boundaries.append(address)
+            if len(boundaries) == workers:
+                break
+    boundaries.append(stop)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def stream_objdump(binary_path, start_address=None, stop_address=None):
+    """
+    Disassemble a binary with objdump and yield its instructions as they are produced.
+
+    Args:
+        binary_path (str): Path to the ELF binary.
+        start_address (int): Optional first address to disassemble.
+        stop_address (int): Optional address at which to stop disassembling.
+
+    Yields:
+        tuple: (block_id, address, instruction, left_operand, right_operand)
+
+    Raises:
+        subprocess.CalledProcessError: If objdump exits with a non-zero status.
+    """
+    command = [OBJDUMP, "-d"]
+    if start_address is not None:
+        command.append(f"--start-address={start_address:#x}")
+    if stop_address is not None:
+        command.append(f"--stop-address={stop_address:#x}")
+    command.append(binary_path)
+
+    with subprocess.Popen(
+        command, stdout=subprocess.PIPE, text=True, encoding="utf-8"
+    ) as process:
+        yield from stream_instructions(process.stdout)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+
+def _disassemble_range(task):
+    """
+    Disassemble one address range of a binary in a worker process.
+
+    Args:
+        task (tuple): (binary_path, start_address, stop_address)
+
+    Returns:
+        list: The parsed instructions of the range.
+    """
+    binary_path, start_address, stop_address = task
+    return list(stream_objdump(binary_path, start_address, stop_address))
+
+
+def iter_binary_instructions(binary_path, workers=1, address_ranges=None):
+    """
+    Yield the parsed instructions of a binary, splitting large binaries across workers.
+
+    Args:
+        binary_path (str): Path to the ELF binary.
+        workers (int): Number of worker processes to use for large binaries.
+        address_ranges (list): Ranges already planned by plan_address_ranges, one
+            per worker; planned here when omitted.
+
+    Yields:
+        tuple: (block_id, address, instruction, left_operand, right_operand), in
+               address order.
+    """
+    if address_ranges is None:
+        address_ranges = plan_address_ranges(binary_path, workers)
+    if len(address_ranges) == 1:
+        yield from stream_objdump(binary_path, *address_ranges[0])
+        return
+    tasks = [(binary_path, start, stop) for start, stop in address_ranges]
+    with ProcessPoolExecutor(max_workers=len(tasks)) as executor:
+        for instructions in executor.map(_disassemble_range, tasks):
+            yield from instructions
+
+
+def write_instructions(instructions, output_file):
+    """
+    Write parsed instructions to a formatted data CSV file.
+
+    Args:
+        instructions (iterable): (block_id, address, instruction, left_operand,
+            right_operand) tuples.
+        output_file (str): Path to the output CSV file.
+    """
+    with open(output_file, "w", newline="", encoding="UTF-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(CSV_HEADER)
+        writer.writerows(instructions)
+
+
+def _ingest(binary_path, output_file, cached_file, address_ranges=None):
+    """
+    Write the formatted data CSV file of a binary, going through its cache entry.
+
+    Args:
+        binary_path (str): Path to the ELF binary.
+        output_file (str): Path to the output CSV file.
+        cached_file (str): Path of the binary's cache entry (see cache_path), or None
+            to bypass the cache.
+        address_ranges (list): Address ranges to disassemble in parallel (see
+            plan_address_ranges); the whole binary in this process when omitted.
+    """
+    if cached_file is None:
+        write_instructions(
+            iter_binary_instructions(binary_path, address_ranges=address_ranges),
+            output_file,
+        )
+        return
+
+    instructions = load_instructions(cached_file)
+    if instructions is None:
+        instructions = list(
+            iter_binary_instructions(binary_path, address_ranges=address_ranges)
+        )
+        store_instructions(cached_file, instructions)
+    write_instructions(instructions, output_file)
+
+
+def ingest_binary(binary_path, output_file, workers=1, cache_directory=None):
+    """
+    Disassemble a binary and write its formatted data CSV file.
+
+    Args:
+        binary_path (str): Path to the ELF binary.
+        output_file (str): Path to the output CSV file.
+        workers (int): Number of worker processes to use for large binaries.
+        cache_directory (str): Optional parse cache directory. When the binary is in
+            the cache, objdump and the parser are skipped entirely; otherwise the
+            parsed instructions are added to the cache.
+    """
+    cached_file = None
+    if cache_directory is not None:
+        cached_file = cache_path(cache_directory, binary_path)
+        if os.path.exists(cached_file):
+            _ingest(binary_path, output_file, cached_file)
+            return
+    _ingest(
+        binary_path,
+        output_file,
+        cached_file,
+        plan_address_ranges(binary_path, workers),
+    )
+
+
+def _ingest_task(task):
+    """
+    Ingest one binary in a worker process.
+
+    Args:
+        task (tuple): (binary_path, output_file, cached_file, address_ranges), see
+            _ingest.
+
+    Returns:
+        str: The path of the written output file.
+    """
+    _ingest(*task)
+    return task[1]
+
+
+def ingest_directory(
+    compiled_directory, output_directory, workers=1, cache_directory=None
+):
+    """
+    Ingest every ELF binary below a compiled data directory.
+
+    Args:
+        compiled_directory (str): Directory containing one subdirectory per program.
+        output_directory (str): Directory receiving "<binary>_formatted_data.csv" files.
+        workers (int): Number of worker processes.
+        cache_directory (str): Optional parse cache directory (see ingest_binary).
+
+    Returns:
+        list: Paths of the written output files.
+
+    Small and cached binaries are ingested concurrently, one per worker. Large
+    binaries are ingested one at a time, each split into address ranges across the
+    workers.
+    """
+    os.makedirs(output_directory, exist_ok=True)
+
+    # Hash and plan every binary once; the tasks carry the results to _ingest
+    small_tasks, large_tasks = [], []
+    for binary_path in find_elf_binaries(compiled_directory):
+        output_file = os.path.join(
+            output_directory, f"{os.path.basename(binary_path)}_formatted_data.csv"
+        )
+        cached_file = None
+        if cache_directory is not None:
+            cached_file = cache_path(cache_directory, binary_path)
+        address_ranges = [(None, None)]
+        if cached_file is None or not os.path.exists(cached_file):
+            address_ranges = plan_address_ranges(binary_path, workers)
+        task = (binary_path, output_file, cached_file, address_ranges)
+        if len(address_ranges) > 1:
+            large_tasks.append(task)
+        else:
+            small_tasks.append(task)
+
+    output_files = []
+    if workers > 1 and len(small_tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            output_files.extend(executor.map(_ingest_task, small_tasks))
+    else:
+        output_files.extend(_ingest_task(task) for task in small_tasks)
+    for task in large_tasks:
+        output_files.append(_ingest_task(task))
+    return output_files
+
+
+def main():
+    """
+    Main function that disassembles every ELF binary in the compiled data directory and
+    writes one formatted data CSV file per binary.
+    """
+    compiled_directory = "compiled"
+    output_directory = "features"
+    cache_directory = "parse_cache"
+    workers = os.cpu_count() or 1
+
+    for output_file in ingest_directory(
+        compiled_directory, output_directory, workers, cache_directory
+    ):
+        print("Formatted data written to:", output_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ This code uses the OS and CSV modules.
 import os
 import csv
 
+from disassembly_shards import parse_listing_in_shards
+
 
 def parse_disassembly(disassembly_text):
     """Parses the disassembly text.
@@ -31,41 +33,74 @@ def parse_disassembly(disassembly_text):
     return results
 
 
+def parse_disassembly_parallel(file_path, workers=None):
+    """Parses a disassembly file in parallel shards split at block boundaries.
+
+    Args:
+        file_path: Path to the disassembled .txt/.asm file.
+        workers: Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        The same dictionary as parse_disassembly on the whole file, with the
+        blocks in address order.
+    """
+    results = {}
+    for shard in parse_listing_in_shards(file_path, parse_disassembly, workers):
+        results.update(shard)
+    return results
+
+
 # Read disassembly from file
 INPUT_FILE = (
     r"C:\External\Projects\8th Semester\Thesis\feature_extraction\disassembled_test.txt"
 )
-with open(INPUT_FILE, "r", encoding="utf-8") as file:
-    disassembly = file.read()
-
-# Process the disassembly
-instructions = parse_disassembly(disassembly)
 
 # Define output directory
 OUTPUT_DIRECTORY = r"C:\External\Projects\8th Semester\Thesis\feature_extraction\output"
 
-# Create the output directory if it doesn't exist
-os.makedirs(OUTPUT_DIRECTORY, exist_ok=True)
+# Number of worker processes used to parse the file (1 parses it serially)
+WORKERS = 1
+
+
+def main():
+    """Parses the disassembly file and writes one column per block to a CSV file."""
+    if WORKERS > 1:
+        instructions = parse_disassembly_parallel(INPUT_FILE, WORKERS)
+    else:
+        with open(INPUT_FILE, "r", encoding="utf-8") as file:
+            disassembly = file.read()
+        instructions = parse_disassembly(disassembly)
+
+    # Create the output directory if it doesn't exist
+    os.makedirs(OUTPUT_DIRECTORY, exist_ok=True)
+
+    # Define the output CSV file path
+    output_csv_file_path = os.path.join(
+        OUTPUT_DIRECTORY, "disassembly_output_columns.csv"
+    )
+
+    # Export to CSV
+    with open(output_csv_file_path, "w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
 
-# Define the output CSV file path
-output_csv_file_path = os.path.join(OUTPUT_DIRECTORY, "disassembly_output_columns.csv")
+        # Write the header row (block addresses)
+        writer.writerow(instructions.keys())
 
-# Export to CSV
-with open(output_csv_file_path, "w", newline="", encoding="utf-8") as csvfile:
-    writer = csv.writer(csvfile)
+        # Transpose data for writing rows
+        max_row_length = max(
+            len(instruction) for addr, instruction in instructions.items()
+        )
+        for i in range(max_row_length):
+            row = []
+            for addr, instruction in instructions.items():
+                if i < len(instructions[addr]):
+                    row.extend(instructions[addr][i])  # Add instruction/operands
+                else:
+                    row.append("")  # Fill blank cells
+            writer.writerow(row)
 
-    # Write the header row (block addresses)
-    writer.writerow(instructions.keys())
+    print("Output CSV file saved to:", output_csv_file_path)
 
-    # Transpose data for writing rows
-    max_row_length = max(len(instruction) for addr, instruction in instructions.items())
-    for i in range(max_row_length):
-        row = []
-        for addr, instruction in instructions.items():
-            if i < len(instructions[addr]):
-                row.extend(instructions[addr][i])  # Add instruction/operands
-            else:
-                row.append("")  # Fill blank cells
-        writer.writerow(row)
 
-print("Output CSV file saved to:", output_csv_file_path)
+if __name__ == "__main__":
+    main()
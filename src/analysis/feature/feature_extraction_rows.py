@@ -5,6 +5,8 @@ This code uses OS and CSV modules.
 import os
 import csv
 
+from disassembly_shards import parse_listing_in_shards
+
 
 def parse_disassembly(disassembly_text):
     """Parses the disassembly text and extracts addresses, instructions, operands.
@@ -37,26 +39,53 @@ def parse_disassembly(disassembly_text):
     return results
 
 
+def parse_disassembly_parallel(file_path, workers=None):
+    """Parses a disassembly file in parallel shards split at block boundaries.
+
+    Args:
+        file_path: Path to the disassembled .txt/.asm file.
+        workers: Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        The same list of rows as parse_disassembly on the whole file.
+    """
+    shards = parse_listing_in_shards(file_path, parse_disassembly, workers)
+    return [block for shard in shards for block in shard]
+
+
 # Read disassembly from file
 FILE_INPUT = (
     r"C:\External\Projects\8th Semester\Thesis\feature_extraction\disassembled_test.txt"
 )
-with open(FILE_INPUT, "r", encoding="utf-8") as file:
-    disassembly = file.read()
-
-instructions = parse_disassembly(disassembly)
 
 # Define output directory
 OUTPUT_DIRECTORY = r"C:\External\Projects\8th Semester\Thesis\feature_extraction\output"
 
-# Create the output directory if it doesn't exist
-os.makedirs(OUTPUT_DIRECTORY, exist_ok=True)
+# Number of worker processes used to parse the file (1 parses it serially)
+WORKERS = 1
+
+
+def main():
+    """Parses the disassembly file and writes one row per block to a CSV file."""
+    if WORKERS > 1:
+        instructions = parse_disassembly_parallel(FILE_INPUT, WORKERS)
+    else:
+        with open(FILE_INPUT, "r", encoding="utf-8") as file:
+            disassembly = file.read()
+        instructions = parse_disassembly(disassembly)
+
+    # Create the output directory if it doesn't exist
+    os.makedirs(OUTPUT_DIRECTORY, exist_ok=True)
+
+    # Define the output CSV file path
+    output_csv_file_path = os.path.join(OUTPUT_DIRECTORY, "disassembly_output_rows.csv")
+
+    with open(output_csv_file_path, "w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerows(instructions)
 
-# Define the output CSV file path
-output_csv_file_path = os.path.join(OUTPUT_DIRECTORY, "disassembly_output_rows.csv")
+    print("Output CSV file saved to:", output_csv_file_path)
 
-with open(output_csv_file_path, "w", newline="", encoding="utf-8") as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerows(instructions)
 
-print("Output CSV file saved to:", output_csv_file_path)
+if __name__ == "__main__":
+    main()
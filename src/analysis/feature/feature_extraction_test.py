@@ -7,6 +7,48 @@ for further analysis.
 import re
 import csv
 
+# Pattern used to extract the block ID from a block header line
+BLOCK_ID_PATTERN = re.compile(r"<([^>]*)>")
+
+
+def parse_block_id(header):
+    """
+    Extract the block ID from the header line of a block.
+
+    Args:
+        header (str): The first line of a block, e.g. "0000000000002000 <_init>:".
+
+    Returns:
+        str: The text inside the angle brackets, or "Unknown" if there is none.
+    """
+    block_id_match = BLOCK_ID_PATTERN.search(header)
+    if block_id_match:
+        return block_id_match.group(1)
+    return "Unknown"
+
+
+def parse_instruction_line(block_id, line):
+    """
+    Parse a single tab-separated instruction line of a block.
+
+    Args:
+        block_id (str): The ID of the block the line belongs to.
+        line (str): A line containing tab-separated address, instruction and operands.
+
+    Returns:
+        tuple: (block_id, address, instruction, left_operand, right_operand), or None
+               if the line does not contain enough fields.
+    """
+    parts = line.strip().split("\t")
+    if len(parts) >= 3:
+        address, instruction, operands = parts[0], parts[1], parts[2]
+        operands = operands.split(",")
+        left_operand, right_operand = operands[0], ", ".join(operands[1:])
+        return (block_id, address, instruction, left_operand, right_operand)
+    # Handle incomplete lines gracefully
+    print(f"Ignoring incomplete line: {line}")
+    return None
+
 
 def parse_block(data):
     """
@@ -24,35 +66,53 @@ def parse_block(data):
     followed by lines of tab-separated assembly instruction details.
     """
     lines = data.strip().split("\n")
-    block_id_match = re.search(r"<([^>]*)>", lines[0])
-    if block_id_match:
-        block_id = block_id_match.group(1)
-    else:
-        block_id = "Unknown"
+    block_id = parse_block_id(lines[0])
     instructions = []
     for line in lines[1:]:
-        parts = line.strip().split("\t")
-        if len(parts) >= 3:
-            address, instruction, operands = parts[0], parts[1], parts[2]
-            operands = operands.split(",")
-            left_operand, right_operand = operands[0], ", ".join(operands[1:])
-            instructions.append(
-                (block_id, address, instruction, left_operand, right_operand)
-            )
-        else:
-            # Handle incomplete lines gracefully
-            print(f"Ignoring incomplete line: {line}")
+        instruction = parse_instruction_line(block_id, line)
+        if instruction is not None:
+            instructions.append(instruction)
     return instructions
 
 
+def stream_instructions(lines):
+    """
+    Parse disassembly text line by line and yield instructions as they are read.
+
+    Args:
+        lines (iterable): An iterable of text lines, such as an open file object or the
+                          stdout of an objdump process.
+
+    Yields:
+        tuple: (block_id, address, instruction, left_operand, right_operand) for every
+               instruction line, in input order.
+
+    Blocks are separated by blank (whitespace-only) lines and start with a header line
+    holding the block ID, exactly as in parse_block. Only the current block ID is kept
+    in memory, so memory use does not grow with the size of the input.
+    """
+    block_id = None  # None until the header line of the current block is read
+    for line in lines:
+        if not line.strip():
+            block_id = None
+            continue
+        line = line.rstrip("\n")
+        if block_id is None:
+            block_id = parse_block_id(line.strip())
+            continue
+        instruction = parse_instruction_line(block_id, line)
+        if instruction is not None:
+            yield instruction
+
+
 def main():
     """
     Main function that processes a disassembled text file containing instruction blocks
     and converts it into a structured CSV format.
 
-    The function reads instruction blocks from the input file, parses each block to extract
-    instruction details (block ID, address, instruction, operands), and writes the formatted
-    data to a CSV file.
+    The function streams the input file line by line, parses each instruction to extract
+    instruction details (block ID, address, instruction, operands), and writes each row to
+    the CSV file as soon as it is parsed.
 
     Input file format:
     - Text file containing instruction blocks separated by blank lines
@@ -68,20 +128,15 @@ def main():
     )
     output_file = "formatted_data.csv"
 
-    with open(input_file, "r", encoding="UTF-8") as f:
-        data = f.read()
-
-    blocks = re.split(r"\n\s*\n", data)
-    parsed_instructions = [parse_block(block) for block in blocks]
-
-    with open(output_file, "w", newline="", encoding="UTF-8") as csvfile:
+    with open(input_file, "r", encoding="UTF-8") as f, open(
+        output_file, "w", newline="", encoding="UTF-8"
+    ) as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(
             ["Block ID", "Address", "Instruction", "Left Operand", "Right Operand"]
         )
-        for instructions in parsed_instructions:
-            for instruction in instructions:
-                writer.writerow(instruction)
+        # Rows are written as they are parsed, so the input is never held in memory
+        writer.writerows(stream_instructions(f))
 
 
 if __name__ == "__main__":
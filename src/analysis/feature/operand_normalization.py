@@ -0,0 +1,122 @@
+"""
+This module provides an optional operand normalization stage for the instruction table.
+Operands such as "0x5f0e(%rip)" or "2170 <_ZNSt8ios_base4InitC1Ev@plt>" make almost every
+operand unique. Configurable rules replace them with canonical tokens (IMM, MEM_RIP, FUNC,
+...), which shrinks the vocabulary seen by the entropy and similarity stages.
+"""
+
+import os
+import sys
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from token_vocabulary import (  # pylint: disable=wrong-import-position
+    TokenVocabulary,
+    encode_instruction_table,
+)
+
+# Define input and output file paths (modify as needed)
+INPUT_FILE = r"compiled\csv_parser_disassembled\csv_parser_disassembly.csv"
+OUTPUT_FILE = r"compiled\csv_parser_disassembled\csv_parser_normalized_disassembly.csv"
+
+# Normalization rules as (pattern, replacement) pairs, applied in order to each operand
+NORMALIZATION_RULES = {
+    # objdump annotations such as "# 7fe8 <__gmon_start__@Base>"
+    "comment": [(r"\s*#.*$", "")],
+    # Direct call targets, e.g. "2170 <_ZNSt8ios_base4InitC1Ev@plt>"
+    "call_target": [(r"^[0-9a-fA-F]+ ?<[^>+]*>$", "FUNC")],
+    # Jump targets inside a function, e.g. "2016 <_init+0x16>"
+    "jump_target": [(r"^[0-9a-fA-F]+ ?<[^>]*\+0x[0-9a-fA-F]+>$", "LABEL")],
+    # RIP-relative memory operands, e.g. "0x5f0e(%rip)"
+    "rip_relative": [(r"-?(?:0x[0-9a-fA-F]+|\d+)?\(%rip\)", "MEM_RIP")],
+    # Immediates, e.g. "$0x8" or "$-1"
+    "immediate": [(r"^\$-?(?:0x[0-9a-fA-F]+|\d+)$", "IMM")],
+    # Registers folded to their class, e.g. "%eax" -> "REG32"
+    "register_class": [
+        (r"%(?:r[a-d]x|r[sd]i|r[sb]p|r(?:8|9|1[0-5]))\b", "REG64"),
+        (r"%(?:e[a-d]x|e[sd]i|e[sb]p|r(?:8|9|1[0-5])d)\b", "REG32"),
+        (r"%(?:[a-d]x|[sd]i|[sb]p|r(?:8|9|1[0-5])w)\b", "REG16"),
+        (r"%(?:[a-d][lh]|[sd]il|[sb]pl|r(?:8|9|1[0-5])b)\b", "REG8"),
+        (r"%[xyz]mm\d+\b", "VEC"),
+    ],
+}
+
+# Rules applied when none are given; register classes are only folded on request
+DEFAULT_RULES = ("comment", "call_target", "jump_target", "rip_relative", "immediate")
+
+# Operand columns of the instruction table
+OPERAND_COLUMNS = ("Left Operand", "Right Operand")
+
+
+def normalize_operands(operands, rules=DEFAULT_RULES):
+    """
+    Normalize a column of operands with the given rules.
+
+    Args:
+        operands (pandas.Series): Operand texts.
+        rules (iterable): Names of the rules in NORMALIZATION_RULES to apply, in order.
+
+    Returns:
+        pandas.Series: The normalized operands. Missing values stay missing.
+
+    Raises:
+        KeyError: If an unknown rule name is given.
+    """
+    for rule in rules:
+        for pattern, replacement in NORMALIZATION_RULES[rule]:
+            operands = operands.str.replace(pattern, replacement, regex=True)
+    return operands
+
+
+def normalize_instruction_table(df, rules=DEFAULT_RULES):
+    """
+    Normalize the operand columns of an instruction table.
+
+    Args:
+        df (pandas.DataFrame): Instruction table with Left Operand and Right Operand
+            columns.
+        rules (iterable): Names of the rules in NORMALIZATION_RULES to apply, in order.
+
+    Returns:
+        pandas.DataFrame: A copy of the table with normalized operands.
+    """
+    normalized_df = df.copy()
+    for column in OPERAND_COLUMNS:
+        normalized_df[column] = normalize_operands(
+            normalized_df[column].astype("string"), rules
+        ).astype(object)
+    return normalized_df
+
+
+def vocabulary_size(df):
+    """
+    Count the distinct (Type, Assembly) tokens of an instruction table.
+
+    Args:
+        df (pandas.DataFrame): Instruction table.
+
+    Returns:
+        int: The number of tokens the entropy stage would distinguish.
+    """
+    vocabulary = TokenVocabulary()
+    encode_instruction_table(df, vocabulary)
+    return len(vocabulary)
+
+
+def main():
+    """
+    Main function that normalizes the operands of an instruction table, reports the
+    vocabulary size before and after normalization, and saves the normalized table.
+    """
+    df = pd.read_csv(INPUT_FILE, keep_default_na=False)
+    normalized_df = normalize_instruction_table(df)
+
+    print("Vocabulary size before normalization:", vocabulary_size(df))
+    print("Vocabulary size after normalization:", vocabulary_size(normalized_df))
+
+    normalized_df.to_csv(OUTPUT_FILE, index=False)
+    print("Normalized instruction table written to:", OUTPUT_FILE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+This module provides a content-addressed cache for parsed disassembly.
+Entries are keyed by the SHA-256 digest of the binary and the parser version, and store
+the parsed instruction table as dictionary-encoded columns in a compressed .npz file.
+A cache hit makes it possible to skip objdump and parsing altogether.
+"""
+
+import os
+import hashlib
+import numpy as np
+
+# Bump whenever the parser output changes so that stale cache entries are not reused
+PARSER_VERSION = 1
+
+# Column names of the cached instruction table, in tuple order
+COLUMNS = ("block_id", "address", "instruction", "left_operand", "right_operand")
+
+
+def binary_digest(binary_path):
+    """
+    Calculate the SHA-256 digest of a binary file.
+
+    Args:
+        binary_path (str): Path to the binary.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(binary_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path(cache_directory, binary_path):
+    """
+    Get the path of the cache entry for a binary.
+
+    Args:
+        cache_directory (str): Directory holding the cache entries.
+        binary_path (str): Path to the binary.
+
+    Returns:
+        str: Path of the form "<cache_directory>/<sha256>-v<PARSER_VERSION>.npz".
+    """
+    return os.path.join(
+        cache_directory, f"{binary_digest(binary_path)}-v{PARSER_VERSION}.npz"
+    )
+
+
+def store_instructions(path, instructions):
+    """
+    Store parsed instructions in a cache entry.
+
+    Args:
+        path (str): Path of the cache entry, as returned by cache_path.
+        instructions (list): (block_id, address, instruction, left_operand,
+            right_operand) tuples.
+
+    Each column is stored as an array of its distinct values plus an int32 array of
+    codes into it. The entry is written to a temporary file first and then renamed,
+    so readers never see a partially written entry.
+    """
+    arrays = {}
+    for index, column in enumerate(COLUMNS):
+        values = {}
+        codes = [values.setdefault(row[index], len(values)) for row in instructions]
+        arrays[f"{column}_values"] = np.array(list(values), dtype=str)
+        arrays[f"{column}_codes"] = np.array(codes, dtype=np.int32)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as file:
+        np.savez_compressed(file, **arrays)
+    os.replace(temporary_path, path)
+
+
+def load_instructions(path):
+    """
+    Load parsed instructions from a cache entry.
+
+    Args:
+        path (str): Path of the cache entry, as returned by cache_path.
+
+    Returns:
+        list: (block_id, address, instruction, left_operand, right_operand) tuples, or
+              None if there is no entry at the given path.
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as entry:
+        columns = [
+            entry[f"{column}_values"][entry[f"{column}_codes"]].tolist()
+            for column in COLUMNS
+        ]
+    return list(zip(*columns))
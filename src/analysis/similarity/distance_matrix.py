@@ -2,48 +2,21 @@
 This module provides functionality for analyzing similarity between binary code blocks
 through distance matrix calculations and hierarchical clustering visualization.
 
-The module reads similarity scores from CSV files, converts them to distance matrices,
-and generates dendrograms to visualize the hierarchical relationships between code blocks.
+The module reads similarity scores from CSV (or condensed .npy) files, converts them to distance
+matrices, and generates dendrograms to visualize the hierarchical relationships between code
+blocks.
 """
 
-import csv
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.cluster.hierarchy import linkage, dendrogram
 
-
-def read_similarity_matrix(input_file, block_ids):
-    """
-    Read a similarity matrix from a CSV file.
-
-    Args:
-        input_file (str): Path to the CSV file containing similarity scores
-        block_ids (list): List of block identifiers
-
-    Returns:
-        numpy.ndarray: A square matrix where each element [i,j] represents
-                      the similarity score between blocks i and j
-    """
-    # Get the size of the matrix based on number of block IDs
-    size = len(block_ids)
-    # Initialize empty square matrix filled with zeros
-    similarity_matrix = np.zeros((size, size))
-    # Open and read the CSV file containing similarity scores
-    with open(input_file, newline="", encoding="utf-8") as csvfile:
-        reader = csv.reader(csvfile)
-        # Skip the header row
-        next(reader)
-        # Process each row in the CSV file
-        for row in reader:
-            # Unpack the row into block IDs and similarity score
-            block_id1, block_id2, similarity = row
-            # Get matrix indices for the block IDs
-            i = block_ids.index(block_id1)
-            j = block_ids.index(block_id2)
-            # Set similarity score in both directions (symmetric matrix)
-            similarity_matrix[i, j] = float(similarity)
-            similarity_matrix[j, i] = float(similarity)
-    return similarity_matrix
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from columnar_io import (  # pylint: disable=wrong-import-position
+    read_similarity_matrix,
+)
 
 
 def similarity_to_distance(similarity_matrix):
@@ -64,16 +37,13 @@ def similarity_to_distance(similarity_matrix):
     return distance_matrix
 
 
-# Create a list of block IDs from 1 to 8 as strings
-BLOCK_ID = [str(i) for i in range(1, 9)]
-
 # Define the input file path for similarity scores
 INPUT_FILE = (
     r"similarity\simple_calculator_block_similarity"
     r"\simple_calculator_block_similarity_normalized.csv"
 )
-# Read the similarity matrix from the CSV file
-SIMILARITY_MATRIX = read_similarity_matrix(INPUT_FILE, BLOCK_ID)
+# Read the similarity matrix and the block IDs it lists from the CSV file
+SIMILARITY_MATRIX, BLOCK_ID = read_similarity_matrix(INPUT_FILE)
 
 # Convert similarity scores to distances
 DISTANCE_MATRIX = similarity_to_distance(SIMILARITY_MATRIX)
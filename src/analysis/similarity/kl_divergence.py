@@ -1,6 +1,9 @@
 """
 This module handles the calculation and analysis of KL divergence between probability distributions.
 It provides functionality to process probability data from CSV files and compute similarity metrics.
+The script only splits the probability table into one CSV per Type, so it builds no per-block
+distributions and works on the table directly rather than on the shared block matrix (see
+block_matrix.py), which the KL computations in kl_divergence_normalized.py use.
 """
 
 import pandas as pd
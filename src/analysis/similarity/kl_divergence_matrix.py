@@ -0,0 +1,211 @@
+"""
+This module computes the Kullback-Leibler divergence between all pairs of blocks in matrix form.
+The probability table is turned into one sparse block x token probability matrix, and every
+pairwise divergence (as used by kl_divergence_normalized.py and similarity_matrix.py) is
+obtained from a few sparse matrix products instead of a Python loop over block pairs, with
+epsilon smoothing over the union of the assemblies of both blocks.
+"""
+
+import os
+import sys
+import numpy as np
+from scipy import sparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from block_matrix import (  # pylint: disable=wrong-import-position
+    BlockDistributionMatrix,
+    load_block_matrix,
+)
+from columnar_io import (  # pylint: disable=wrong-import-position
+    save_condensed_similarity,
+)
+
+# Small constant added to every probability to avoid log(0)
+EPSILON = 1e-10
+
+# Number of matrix rows computed at once (modify as needed)
+ROW_CHUNK_SIZE = 1024
+
+# Define input and output file paths (modify as needed)
+INPUT_FILE = "entropy_preprocessed/simple_calculator_filtered_entropy.csv"
+OUTPUT_FILE = "simple_calculator_block_similarity_normalized.npy"
+
+
+def build_probability_matrix(table, vocabulary=None):
+    """
+    Build the sparse block x token probability matrix of a probability table.
+
+    Args:
+        table (pandas.DataFrame): Table with Block_ID, Type, Assembly and Probability
+            columns (a filtered entropy or probability table).
+        vocabulary (TokenVocabulary): Vocabulary used to number the tokens; a new one
+            is created when omitted.
+
+    Returns:
+        tuple: A tuple containing:
+            - list: Block IDs (as strings) in order of first appearance
+            - scipy.sparse.csr_matrix: Probability of each token (column) in each block
+              (row); an entry exists for every token listed for the block
+            - numpy.ndarray: Type code of each column
+    """
+    block_matrix = BlockDistributionMatrix.from_table(table, vocabulary=vocabulary)
+    return (
+        block_matrix.block_ids.tolist(),
+        block_matrix.matrix,
+        block_matrix.type_codes,
+    )
+
+
+def _kl_divergence_terms(probabilities, token_types):
+    """
+    Precompute the per-block terms shared by every KL divergence of a block matrix.
+
+    Args:
+        probabilities (scipy.sparse.csr_matrix): Block x token probabilities, as
+            returned by build_probability_matrix.
+        token_types (numpy.ndarray): Type code of each column.
+
+    Returns:
+        tuple: A tuple containing (see kl_divergence_kernel):
+            - scipy.sparse.csr_matrix: [P, presence of each type] per block
+            - scipy.sparse.csr_matrix: L = log2(P + e) - log2(e) on the entries of P
+            - numpy.ndarray: e times the per-type sums of L, blocks x types
+            - numpy.ndarray: c, the sum of (p + e) * L over each block
+    """
+    probabilities = sparse.csr_matrix(probabilities, dtype=np.float64)
+    logs = probabilities.copy()
+    logs.data = np.log2(probabilities.data + EPSILON) - np.log2(EPSILON)
+    weighted_logs = logs.copy()
+    weighted_logs.data = (probabilities.data + EPSILON) * logs.data
+    self_terms = np.asarray(weighted_logs.sum(axis=1)).ravel()
+
+    # Per-type presence of each block and per-type sums of L, appended as extra
+    # columns so that a single product also yields the e * l[i, j] term
+    type_columns = sparse.csr_matrix(
+        (
+            np.ones(len(token_types)),
+            (np.arange(len(token_types)), token_types),
+        ),
+        shape=(len(token_types), int(token_types.max(initial=-1)) + 1),
+    )
+    presence = probabilities.copy()
+    presence.data = np.ones_like(presence.data)
+    left = sparse.hstack(
+        [probabilities, (presence @ type_columns > 0).astype(np.float64)],
+        format="csr",
+    )
+    type_logs = EPSILON * (logs @ type_columns).toarray()
+    return left, logs, type_logs, self_terms
+
+
+def kl_divergence_kernel(probabilities, token_types):
+    """
+    Prepare a function that computes the KL divergences between two ranges of blocks.
+
+    Args:
+        probabilities (scipy.sparse.csr_matrix): Block x token probabilities, as
+            returned by build_probability_matrix.
+        token_types (numpy.ndarray): Type code of each column.
+
+    Returns:
+        function: kernel(rows, columns) taking two slices of block positions and
+        returning the len(rows) x len(columns) array whose entry [i, j] is the
+        divergence of block j from block i, as used by the tiled similarity
+        computation.
+
+    For each type of block i, the divergence sums (p + e) * log2((p + e) / (q + e))
+    over the union of both blocks' assemblies. With L = log2(P + e) - log2(e)
+    on the entries of P, this is c[i] - e * l[i, j] - (P @ L.T)[i, j], where c[i] sums
+    (p + e) * L over block i and l[i, j] sums L of block j over the types of block i.
+    """
+    left, logs, type_logs, self_terms = _kl_divergence_terms(probabilities, token_types)
+
+    def kernel(rows, columns):
+        # Dense (tokens + types) x columns, so the product is sparse x dense
+        right = np.vstack([logs[columns].T.toarray(), type_logs[columns].T])
+        tile = left[rows] @ right
+        return np.subtract(self_terms[rows, None], tile, out=tile)
+
+    return kernel
+
+
+def kl_divergence_pairs(probabilities, token_types, first, second):
+    """
+    Calculate the KL divergence of a list of block pairs.
+
+    Args:
+        probabilities (scipy.sparse.csr_matrix): Block x token probabilities, as
+            returned by build_probability_matrix.
+        token_types (numpy.ndarray): Type code of each column.
+        first (numpy.ndarray): Position of the first block i of each pair.
+        second (numpy.ndarray): Position of the second block j of each pair.
+
+    Returns:
+        numpy.ndarray: The divergence of block j from block i for every pair, equal
+        to kl_divergence_kernel's entries up to floating point rounding. Only the
+        tokens of the listed pairs are visited.
+    """
+    left, logs, type_logs, self_terms = _kl_divergence_terms(probabilities, token_types)
+    right = sparse.hstack([logs, type_logs], format="csr")
+    divergences = np.empty(len(first))
+    for start in range(0, len(first), ROW_CHUNK_SIZE * ROW_CHUNK_SIZE):
+        pairs = slice(start, start + ROW_CHUNK_SIZE * ROW_CHUNK_SIZE)
+        products = left[first[pairs]].multiply(right[second[pairs]])
+        divergences[pairs] = (
+            self_terms[first[pairs]] - np.asarray(products.sum(axis=1)).ravel()
+        )
+    return divergences
+
+
+def kl_divergence_matrix(probabilities, token_types, condensed=False):
+    """
+    Calculate the KL divergence between every pair of blocks.
+
+    Args:
+        probabilities (scipy.sparse.csr_matrix): Block x token probabilities, as
+            returned by build_probability_matrix.
+        token_types (numpy.ndarray): Type code of each column.
+        condensed (bool): Return only the pairs (i, j) with i < j, in the order of
+            scipy.spatial.distance.pdist, instead of the full matrix.
+
+    Returns:
+        numpy.ndarray: Either the full matrix, whose entry [i, j] is the divergence of
+        block j from block i, or the condensed upper triangle. The entries agree with
+        a per-pair sum over the assemblies of both blocks to floating point rounding
+        (see kl_divergence_kernel).
+    """
+    kernel = kl_divergence_kernel(probabilities, token_types)
+    size = probabilities.shape[0]
+    if condensed:
+        result = np.empty(size * (size - 1) // 2)
+    else:
+        result = np.empty((size, size))
+    position = 0
+    for start in range(0, size, ROW_CHUNK_SIZE):
+        stop = min(start + ROW_CHUNK_SIZE, size)
+        chunk = kernel(slice(start, stop), slice(0, size))
+        if not condensed:
+            result[start:stop] = chunk
+            continue
+        values = chunk[np.arange(size) > np.arange(start, stop)[:, None]]
+        result[position : position + len(values)] = values
+        position += len(values)
+    return result
+
+
+def main():
+    """
+    Main function that computes the pairwise KL divergences of all blocks of a filtered
+    entropy table, using its saved block matrix, and saves them as a condensed .npy
+    array.
+    """
+    block_matrix = load_block_matrix(INPUT_FILE)
+    condensed = kl_divergence_matrix(
+        block_matrix.matrix, block_matrix.type_codes, condensed=True
+    )
+    save_condensed_similarity(OUTPUT_FILE, block_matrix.block_ids, condensed)
+    print("Block Similarity written to:", OUTPUT_FILE)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,96 +1,69 @@
 """This module calculates the Kullback-Leibler divergence between blocks of assembly code
 to measure their similarity. It processes probability distributions of variables within blocks
-and outputs normalized similarity scores."""
+and outputs normalized similarity scores. The distributions are read from the shared block
+matrix (see block_matrix.py) and every pairwise divergence is computed in matrix form by
+kl_divergence_matrix."""
 
+import os
+import sys
 import csv
 import numpy as np
 
+from kl_divergence_matrix import kl_divergence_matrix
 
-# Function to calculate probability distributions of variables within each block
-def calculate_probability_distributions(input_file):
-    """Calculate probability distributions of variables within assembly code blocks.
-
-    Args:
-        input_file (str): Path to the input CSV file containing block data.
-            The CSV should have columns: Block_ID, Type, Assembly, Probability
-
-    Returns:
-        dict: A nested dictionary containing probability distributions for each block.
-            Structure: {block_id: {variable_type: {assembly: probability}}}
-            where:
-            - block_id: Identifier for the code block
-            - variable_type: Type of the variable/feature
-            - assembly: Assembly instruction or operand
-            - probability: Probability value for that assembly element
-    """
-    block_variable_probabilities = {}
-    with open(input_file, newline="", encoding="UTF-8") as infile:
-        reader = csv.DictReader(infile)
-        for row in reader:
-            block_id = row["Block_ID"]
-            variable_type = row["Type"]
-            probability = float(row["Probability"])
-            block_variable_probabilities.setdefault(block_id, {}).setdefault(
-                variable_type, {}
-            )[row["Assembly"]] = probability
-    return block_variable_probabilities
-
-
-# Function to calculate KL-Divergence between two probability distributions
-def calculate_kl_divergence(p, q):
-    """Calculate the Kullback-Leibler divergence between two probability distributions.
-
-    Args:
-        p (list): First probability distribution
-        q (list): Second probability distribution
-
-    Returns:
-        float: KL divergence value between distributions p and q
-
-    Note:
-        A small epsilon value is added to avoid log(0) errors
-    """
-    epsilon = 1e-10  # small constant to avoid log(0)
-    p = np.array(p) + epsilon
-    q = np.array(q) + epsilon
-    return np.sum(p * np.log2(p / q))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from block_matrix import load_block_matrix  # pylint: disable=wrong-import-position
+from columnar_io import (  # pylint: disable=wrong-import-position
+    is_csv,
+    save_condensed_similarity,
+)
 
 
 # Function to calculate similarity between blocks using KL-Divergence
-def calculate_block_similarity(block_probabilities):
+def calculate_block_similarity(block_matrix, deduplicate=False):
     """Calculate pairwise similarity between blocks using KL-Divergence.
 
     Args:
-        block_probabilities (dict): Dictionary containing probability distributions for each block.
-            Structure: {block_id: {variable_type: {assembly: probability}}}
+        block_matrix (BlockDistributionMatrix): Block x (Type, Assembly) probabilities,
+            as returned by load_block_matrix.
+        deduplicate (bool): Compute every pair of distinct distributions only once
+            (see BlockDistributionMatrix.deduplicated). Pairs of identical blocks then
+            get 0.
 
     Returns:
-        dict: Dictionary containing pairwise similarity scores between blocks.
-            Keys are tuples of (block_id1, block_id2) and values are similarity scores
-            calculated using KL-divergence.
+        numpy.ndarray: Condensed pairwise similarity scores, in the order of
+            scipy.spatial.distance.pdist: the divergence of block j from block i for
+            every pair i < j of block_matrix.block_ids.
     """
-    block_similarity = {}
-    block_ids = list(block_probabilities.keys())
-    for i, block_id1 in enumerate(block_ids):
-        for block_id2 in block_ids[i + 1 :]:
-            similarity = 0
-            for variable_type, probabilities1 in block_probabilities[block_id1].items():
-                probabilities2 = block_probabilities[block_id2].get(variable_type, {})
-                all_assemblies = set(probabilities1.keys()).union(probabilities2.keys())
-                p = [probabilities1.get(assembly, 0) for assembly in all_assemblies]
-                q = [probabilities2.get(assembly, 0) for assembly in all_assemblies]
-                similarity += calculate_kl_divergence(p, q)
-            block_similarity[(block_id1, block_id2)] = similarity
+    if not deduplicate:
+        return kl_divergence_matrix(
+            block_matrix.matrix, block_matrix.type_codes, condensed=True
+        )
+
+    # Divergences of the representatives, expanded to all blocks row by row
+    representatives, inverse, _ = block_matrix.deduplicated()
+    divergences = kl_divergence_matrix(
+        representatives.matrix, representatives.type_codes
+    )
+    np.fill_diagonal(divergences, 0.0)
+    size = len(block_matrix)
+    block_similarity = np.empty(size * (size - 1) // 2)
+    position = 0
+    for row in range(size - 1):
+        values = divergences[inverse[row], inverse[row + 1 :]]
+        block_similarity[position : position + len(values)] = values
+        position += len(values)
     return block_similarity
 
 
 # Function to write block similarity to a CSV file
-def write_similarity_to_csv(similarity, output_file):
+def write_similarity_to_csv(similarity, block_ids, output_file):
     """Write block similarity scores to a CSV file.
 
     Args:
-        similarity (dict): Dictionary containing pairwise block similarity scores.
-            Keys are tuples of (block_id1, block_id2) and values are similarity scores.
+        similarity (numpy.ndarray): Condensed pairwise block similarity scores, as
+            returned by calculate_block_similarity.
+        block_ids (list): Block IDs in the order used by calculate_block_similarity.
         output_file (str): Path to the output CSV file where results will be written.
 
     The output CSV will have three columns:
@@ -101,21 +74,41 @@ def write_similarity_to_csv(similarity, output_file):
     with open(output_file, "w", newline="", encoding="UTF-8") as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(["Block_ID_1", "Block_ID_2", "Similarity"])
-        writer.writerows(
-            [
+        position = 0
+        for i, block_id1 in enumerate(block_ids):
+            block_ids2 = block_ids[i + 1 :]
+            scores = similarity[position : position + len(block_ids2)].tolist()
+            writer.writerows(
                 (block_id1, block_id2, similarity_score)
-                for (block_id1, block_id2), similarity_score in similarity.items()
-            ]
-        )
+                for block_id2, similarity_score in zip(block_ids2, scores)
+            )
+            position += len(block_ids2)
+
+
+# Function to write block similarity in the format chosen by the output file
+def write_similarity(similarity, block_ids, output_file):
+    """Write block similarity scores to a CSV file or a condensed .npy file.
+
+    Args:
+        similarity (numpy.ndarray): Condensed pairwise block similarity scores, as
+            returned by calculate_block_similarity.
+        block_ids (list): Block IDs in the order used by calculate_block_similarity.
+        output_file (str): Path to the output file. A .npy path stores the scores as a
+            condensed array that can be memory-mapped (see columnar_io).
+    """
+    if is_csv(output_file):
+        write_similarity_to_csv(similarity, block_ids, output_file)
+        return
+    save_condensed_similarity(output_file, block_ids, similarity)
 
 
 # Main function
 def main():
     """Main function that processes assembly code blocks to calculate similarity scores.
 
-    This function reads preprocessed entropy data from a CSV file, calculates probability
-    distributions for code blocks, computes similarity scores using KL-divergence, and
-    writes the results to an output CSV file.
+    This function loads the block matrix of preprocessed entropy data (built and saved
+    on first use), computes similarity scores using KL-divergence (once for every group
+    of identical blocks), and writes the results to an output CSV file.
 
     The input file should contain filtered entropy data for assembly code blocks.
     The output file will contain pairwise similarity scores between blocks.
@@ -123,11 +116,15 @@ def main():
     input_file_filtered = "entropy_preprocessed/simple_calculator_filtered_entropy.csv"
     output_file_filtered = "simple_calculator_block_similarity_normalized.csv"
 
-    block_probabilities_filtered = calculate_probability_distributions(
-        input_file_filtered
+    block_matrix_filtered = load_block_matrix(input_file_filtered)
+    block_similarity_filtered = calculate_block_similarity(
+        block_matrix_filtered, deduplicate=True
+    )
+    write_similarity(
+        block_similarity_filtered,
+        block_matrix_filtered.block_ids.tolist(),
+        output_file_filtered,
     )
-    block_similarity_filtered = calculate_block_similarity(block_probabilities_filtered)
-    write_similarity_to_csv(block_similarity_filtered, output_file_filtered)
     print("Block Similarity written to:", output_file_filtered)
 
 
@@ -1,99 +1,47 @@
 """
 This module provides functionality for calculating and analyzing similarity between binary code blocks
-based on their probability distributions. It includes methods for computing Kullback-Leibler divergence,
-creating similarity matrices, and handling CSV input/output operations.
+based on their probability distributions. It computes Kullback-Leibler divergences in matrix form
+(see kl_divergence_matrix), creates similarity matrices, and handles CSV input/output operations.
+The probability distributions are read from the shared block matrix (see block_matrix.py).
 """
 
+import os
+import sys
 import csv
 import numpy as np
 
+from kl_divergence_matrix import kl_divergence_matrix
 
-def calculate_probability_distributions(INPUT_FILE):
-    """
-    Calculate probability distributions for each block from a CSV file.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from block_matrix import load_block_matrix  # pylint: disable=wrong-import-position
 
-    Args:
-        INPUT_FILE (str): Path to the input CSV file containing block data with columns:
-            Block_ID, Type, Assembly, and Probability.
 
-    Returns:
-        dict: A nested dictionary structure containing probability distributions for each block.
-            Format: {block_id: {variable_type: {assembly: probability}}}
-    """
-    block_variable_probabilities = {}
-    with open(INPUT_FILE, newline="", encoding="UTF-8") as infile:
-        reader = csv.DictReader(infile)
-        for row in reader:
-            block_id = row["Block_ID"]
-            variable_type = row["Type"]
-            probability = float(row["Probability"])
-            if block_id not in block_variable_probabilities:
-                block_variable_probabilities[block_id] = {}
-            if variable_type not in block_variable_probabilities[block_id]:
-                block_variable_probabilities[block_id][variable_type] = {}
-            block_variable_probabilities[block_id][variable_type][
-                row["Assembly"]
-            ] = probability
-    return block_variable_probabilities
-
-
-def calculate_kl_divergence(p, q):
+def calculate_block_similarity(block_matrix):
     """
-    Calculate the Kullback-Leibler divergence between two probability distributions.
+    Calculate similarity between blocks based on their probability distributions.
 
     Args:
-        p (array-like): First probability distribution
-        q (array-like): Second probability distribution
+        block_matrix (BlockDistributionMatrix): Block x (Type, Assembly) probabilities,
+            as returned by load_block_matrix.
 
     Returns:
-        float: KL divergence value between distributions p and q
-
-    Note:
-        A small epsilon value is added to avoid log(0) calculations
+        numpy.ndarray: Condensed pairwise similarities between blocks, in the order of
+            scipy.spatial.distance.pdist: the KL divergence of block j from block i for
+            every pair i < j of block_matrix.block_ids.
     """
-    epsilon = 1e-10  # small constant to avoid log(0)
-    p = np.array(p) + epsilon
-    q = np.array(q) + epsilon
-    return np.sum(p * np.log2(p / q))
+    return kl_divergence_matrix(
+        block_matrix.matrix, block_matrix.type_codes, condensed=True
+    )
 
 
-def calculate_block_similarity(block_probabilities):
-    """
-    Calculate similarity between blocks based on their probability distributions.
-
-    Args:
-        block_probabilities (dict): A dictionary containing probability distributions
-            for each block. The structure is:
-            {block_id: {variable_type: {assembly: probability}}}
-
-    Returns:
-        dict: A dictionary containing pairwise similarities between blocks.
-            The keys are tuples of block IDs (block_id1, block_id2) and
-            the values are their similarity scores based on KL divergence.
-    """
-    block_similarity = {}
-    block_ids = list(block_probabilities.keys())
-    for i, block_id1 in enumerate(block_ids):
-        for block_id2 in block_ids[i + 1 :]:
-            similarity = 0
-            for variable_type, probabilities1 in block_probabilities[block_id1].items():
-                probabilities2 = block_probabilities[block_id2].get(variable_type, {})
-                all_assemblies = set(probabilities1.keys()).union(probabilities2.keys())
-                p = [probabilities1.get(assembly, 0) for assembly in all_assemblies]
-                q = [probabilities2.get(assembly, 0) for assembly in all_assemblies]
-                similarity += calculate_kl_divergence(p, q)
-            block_similarity[(block_id1, block_id2)] = similarity
-    return block_similarity
-
-
-def write_similarity_to_csv(similarity, output_file):
+def write_similarity_to_csv(similarity, block_ids, output_file):
     """
     Write block similarity scores to a CSV file.
 
     Args:
-        similarity (dict): A dictionary containing pairwise similarities between blocks.
-            The keys are tuples of block IDs (block_id1, block_id2) and
-            the values are their similarity scores.
+        similarity (numpy.ndarray): Condensed pairwise similarities between blocks, as
+            returned by calculate_block_similarity.
+        block_ids (list): Block IDs in the order used by calculate_block_similarity.
         output_file (str): Path to the output CSV file where similarity scores will be written.
 
     Returns:
@@ -102,17 +50,20 @@ def write_similarity_to_csv(similarity, output_file):
     with open(output_file, "w", newline="", encoding="UTF-8") as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(["Block_ID_1", "Block_ID_2", "Similarity"])
-        for (block_id1, block_id2), similarity_score in similarity.items():
-            writer.writerow([block_id1, block_id2, similarity_score])
+        position = 0
+        for i, block_id1 in enumerate(block_ids):
+            for block_id2 in block_ids[i + 1 :]:
+                writer.writerow([block_id1, block_id2, similarity[position]])
+                position += 1
 
 
-def create_similarity_matrix(similarity_dict, block_ids):
+def create_similarity_matrix(similarity, block_ids):
     """
-    Create a symmetric similarity matrix from a dictionary of pairwise similarities.
+    Create a symmetric similarity matrix from condensed pairwise similarities.
 
     Args:
-        similarity_dict (dict): Dictionary containing pairwise similarities between blocks.
-            Keys are tuples of block IDs (block_id1, block_id2) and values are similarity scores.
+        similarity (numpy.ndarray): Condensed pairwise similarities between blocks, as
+            returned by calculate_block_similarity.
         block_ids (list): List of all block IDs used to determine matrix dimensions and indexing.
 
     Returns:
@@ -121,19 +72,17 @@ def create_similarity_matrix(similarity_dict, block_ids):
     """
     size = len(block_ids)
     similarity_matrix = np.zeros((size, size))
-    for (block_id1, block_id2), similarity in similarity_dict.items():
-        i = block_ids.index(block_id1)
-        j = block_ids.index(block_id2)
-        similarity_matrix[i, j] = similarity
-        similarity_matrix[j, i] = similarity  # symmetric matrix
+    rows, columns = np.triu_indices(size, 1)
+    similarity_matrix[rows, columns] = similarity
+    similarity_matrix[columns, rows] = similarity  # symmetric matrix
     return similarity_matrix
 
 
 INPUT_FILE = "entropy_preprocessed\hello_world_filtered_entropy.csv"
 OUTPUT_FILE = "similarity_matrix.csv"
-block_probabilities = calculate_probability_distributions(INPUT_FILE)
-BLOCK_SIMILARITY = calculate_block_similarity(block_probabilities)
-write_similarity_to_csv(BLOCK_SIMILARITY, OUTPUT_FILE)
+block_matrix = load_block_matrix(INPUT_FILE)
+block_ids = block_matrix.block_ids.tolist()
+BLOCK_SIMILARITY = calculate_block_similarity(block_matrix)
+write_similarity_to_csv(BLOCK_SIMILARITY, block_ids, OUTPUT_FILE)
 
-block_ids = list(block_probabilities.keys())
 similarity_matrix = create_similarity_matrix(BLOCK_SIMILARITY, block_ids)
@@ -1,65 +1,29 @@
 """
 This module provides functionality for visualizing similarity matrices between binary code blocks.
-It reads similarity data from CSV files and generates heatmap visualizations using matplotlib and seaborn.
+It reads similarity data from CSV (or condensed .npy, or sparse .npz nearest-neighbor graph)
+files and generates heatmap visualizations using matplotlib and seaborn.
 """
 
-import csv
-import numpy as np
+import os
+import sys
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from columnar_io import (  # pylint: disable=wrong-import-position
+    read_similarity_matrix,
+)
 
-# Function to read similarity matrix from CSV file and generate block IDs
-def read_similarity_matrix(input_file):
-    """
-    Reads a similarity matrix from a CSV file and generates corresponding block IDs.
-
-    Args:
-        input_file (str): Path to the CSV file containing similarity data.
-
-    Returns:
-        tuple: A tuple containing:
-            - numpy.ndarray: A square similarity matrix where each element represents
-              the similarity between two blocks
-            - list: Sorted list of unique block IDs
-    """
-    # Initialize empty set for unique block IDs and list for similarity entries
-    unique_block_ids = set()
-    similarities = []
-
-    # Open and read the CSV file containing similarity data
-    with open(input_file, newline="", encoding="UTF-8") as csvfile:
-        reader = csv.reader(csvfile)
-        next(reader)  # Skip header
-        for row in reader:
-            # Extract block IDs and similarity value from each row
-            block_id1, block_id2, similarity = row
-            # Add block IDs to set (duplicates automatically handled)
-            unique_block_ids.add(block_id1)
-            unique_block_ids.add(block_id2)
-            # Store similarity data as tuple with converted float value
-            similarities.append((block_id1, block_id2, float(similarity)))
-
-    block_ids = sorted(unique_block_ids)  # Sort block IDs
-    size = len(block_ids)  # Get dimension for square matrix
-    # Initialize empty square matrix with zeros
-    matrix = np.zeros((size, size))
-
-    # Populate similarity matrix with values
-    for block_id1, block_id2, similarity in similarities:
-        # Get indices for both blocks in the matrix
-        i = block_ids.index(block_id1)
-        j = block_ids.index(block_id2)
-        # Set similarity values symmetrically (matrix[i,j] = matrix[j,i])
-        matrix[i, j] = similarity
-        matrix[j, i] = similarity  # symmetric matrix
-
-    return matrix, block_ids
-
+# Largest number of blocks shown from a memory-mapped condensed .npy file, first in
+# Block_ID order; None shows all of them. CSV and .npz files are always shown in full
+MAX_BLOCKS = 200
 
 # Read the similarity matrix and block IDs from the CSV file
 INPUT_FILE = "probability_update/simple_calculator_probability_update.csv"
-similarity_matrix, block_ids = read_similarity_matrix(INPUT_FILE)
+IS_CONDENSED = os.path.splitext(INPUT_FILE)[1].lower() == ".npy"
+similarity_matrix, block_ids = read_similarity_matrix(
+    INPUT_FILE, max_blocks=MAX_BLOCKS if IS_CONDENSED else None
+)
 
 # Create a new figure with specified dimensions (10x8 inches)
 plt.figure(figsize=(10, 8))
@@ -0,0 +1,487 @@
+"""
+This module computes pairwise block similarities out of core, tile by tile.
+The block x block matrix is split into square tiles sized to a memory budget, each tile is
+computed by a similarity kernel (KL divergence or Jensen-Shannon divergence), and its upper
+triangle is written straight into a disk-backed, memory-mapped condensed .npy array. Neither
+the full n x n matrix nor the condensed array is ever held in memory. Alternatively, only the
+k nearest neighbors of every block are kept, as a sparse graph of n * k pairs.
+"""
+
+import os
+import sys
+import math
+import tempfile
+from multiprocessing import Pool, shared_memory
+import numpy as np
+from scipy import sparse
+
+from kl_divergence_matrix import kl_divergence_kernel
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from block_matrix import load_block_matrix  # pylint: disable=wrong-import-position
+from columnar_io import (  # pylint: disable=wrong-import-position
+    condensed_index,
+    create_condensed_similarity,
+    save_sparse_similarity,
+)
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "clustering"
+    )
+)
+from jsd_distance import jensen_shannon_kernel  # pylint: disable=wrong-import-position
+
+# Define input and output file paths (modify as needed)
+INPUT_FILE = "entropy_preprocessed/csv_parser_filtered_entropy.csv"
+OUTPUT_FILE = "csv_parser_block_similarity_tiled.npy"
+
+# Similarity measure: "kl" (KL divergence) or "jsd" (Jensen-Shannon divergence)
+METRIC = "kl"
+
+# Memory available for one tile and its temporaries, in bytes (modify as needed)
+MEMORY_BUDGET = 256 * 2**20
+
+# Number of worker processes; 1 computes all tiles in this process (modify as needed)
+WORKERS = 1
+
+# Nearest neighbors kept per block; None computes all pairs (modify as needed)
+NEIGHBORS = None
+GRAPH_OUTPUT_FILE = "csv_parser_block_similarity_knn.npz"
+
+# Compute all pairs on one representative of every group of identical blocks
+DEDUPLICATE = True
+
+# State of a worker process, set up once by _initialize_worker
+_worker = {}
+
+
+def tile_size_for_budget(memory_budget, features=0):
+    """
+    Choose the side of the square tiles for a memory budget.
+
+    Args:
+        memory_budget (int): Bytes available for one tile and its temporaries.
+        features (int): Number of features (matrix columns) densified per tile column.
+
+    Returns:
+        int: The largest tile side t with 3 * t * t + features * t float64 values
+        within the budget, and at least 1.
+    """
+    values = memory_budget / 8
+    side = (-features + math.sqrt(features * features + 12 * values)) / 6
+    return max(1, int(side))
+
+
+def iterate_tiles(size, tile_size):
+    """
+    List the tiles of a size x size matrix that hold pairs (i, j) with i < j.
+
+    Args:
+        size (int): Number of blocks.
+        tile_size (int): Side of the square tiles.
+
+    Yields:
+        tuple: (rows, columns) slices of block positions, column tile by column tile.
+    """
+    for column_start in range(0, size, tile_size):
+        columns = slice(column_start, min(column_start + tile_size, size))
+        for row_start in range(0, columns.stop - 1, tile_size):
+            rows = slice(row_start, min(row_start + tile_size, columns.stop - 1))
+            yield rows, columns
+
+
+def write_tile(similarities, tile, rows, columns, size=None):
+    """
+    Write the pairs (i, j) with i < j of a tile into a condensed array.
+
+    Args:
+        similarities (numpy.ndarray): Condensed array of all pairs of blocks, or a
+            prefix of it holding the pairs of the first rows.
+        tile (numpy.ndarray): Similarities of the rows x columns tile.
+        rows (slice): Block positions of the tile rows.
+        columns (slice): Block positions of the tile columns.
+        size (int): Number of blocks; derived from the length of similarities when
+            omitted.
+
+    Each row of a tile is a contiguous run of the condensed array, so it is written
+    with one slice; the starts of all runs are computed at once.
+    """
+    if size is None:
+        size = int(round((1 + math.sqrt(1 + 8 * len(similarities))) / 2))
+    positions = np.arange(rows.start, rows.stop)
+    firsts = np.maximum(columns.start, positions + 1)
+    starts = condensed_index(positions, firsts, size)
+    output = similarities.view(np.ndarray)
+    for row, first, start in zip(positions.tolist(), firsts.tolist(), starts.tolist()):
+        if first >= columns.stop:
+            continue
+        output[start : start + columns.stop - first] = tile[
+            row - rows.start, first - columns.start :
+        ]
+
+
+def compute_tiled_similarity(kernel, block_ids, output_file, tile_size):
+    """
+    Compute the similarity of every pair of blocks tile by tile into a condensed file.
+
+    Args:
+        kernel (function): kernel(rows, columns) returning the similarities between
+            two slices of block positions (see kl_divergence_kernel and
+            jensen_shannon_kernel).
+        block_ids (list): Block IDs in matrix order.
+        output_file (str): Output .npy path.
+        tile_size (int): Side of the square tiles.
+
+    Returns:
+        numpy.memmap: The condensed similarities, in the order of
+        scipy.spatial.distance.pdist, memory-mapped from output_file.
+
+    Only the tiles on or above the diagonal are computed.
+    """
+    similarities = create_condensed_similarity(output_file, block_ids)
+    for rows, columns in iterate_tiles(len(block_ids), tile_size):
+        write_tile(similarities, kernel(rows, columns), rows, columns)
+    similarities.flush()
+    return similarities
+
+
+def compute_nearest_neighbors(kernel, size, tile_size, neighbors):
+    """
+    Find the nearest neighbors of every block, tile by tile.
+
+    Args:
+        kernel (function): kernel(rows, columns), see compute_tiled_similarity.
+        size (int): Number of blocks.
+        tile_size (int): Side of the square tiles.
+        neighbors (int): Number of neighbors kept per block.
+
+    Returns:
+        tuple: A tuple containing:
+            - numpy.ndarray: blocks x k positions of the k nearest other blocks of
+              every block, nearest first (ties broken by position)
+            - numpy.ndarray: The matching blocks x k divergences; entry [i, n] is the
+              kernel's entry [i, neighbor]
+
+    Every row tile keeps a bounded set of its k best candidates, which is merged with
+    each column tile as it is computed, so only k values per block are ever held.
+    """
+    neighbors = max(0, min(neighbors, size - 1))
+    positions = np.empty((size, neighbors), dtype=np.int64)
+    distances = np.empty((size, neighbors))
+    for row_start in range(0, size, tile_size):
+        rows = slice(row_start, min(row_start + tile_size, size))
+        count = rows.stop - rows.start
+        best = np.full((count, neighbors), np.inf)
+        best_positions = np.full((count, neighbors), size, dtype=np.int64)
+        for column_start in range(0, size, tile_size):
+            columns = slice(column_start, min(column_start + tile_size, size))
+            tile = kernel(rows, columns)
+            own = np.arange(
+                max(rows.start, columns.start), min(rows.stop, columns.stop)
+            )
+            tile[own - rows.start, own - columns.start] = np.inf
+
+            # Merge the tile into the k best values of every row
+            merged = np.hstack([best, tile])
+            merged_positions = np.hstack(
+                [
+                    best_positions,
+                    np.broadcast_to(np.arange(columns.start, columns.stop), tile.shape),
+                ]
+            )
+            order = np.lexsort((merged_positions, merged), axis=1)[:, :neighbors]
+            best = np.take_along_axis(merged, order, axis=1)
+            best_positions = np.take_along_axis(merged_positions, order, axis=1)
+        positions[rows], distances[rows] = best_positions, best
+    return positions, distances
+
+
+def create_kernel(metric, matrix, type_codes):
+    """
+    Create the similarity kernel of a metric.
+
+    Args:
+        metric (str): "kl" or "jsd".
+        matrix (scipy.sparse.csr_matrix): Block x token probabilities; normalized per
+            (block, type) for "jsd".
+        type_codes (numpy.ndarray): Type code of each column.
+
+    Returns:
+        function: kernel(rows, columns), see compute_tiled_similarity.
+    """
+    if metric == "jsd":
+        return jensen_shannon_kernel(matrix)
+    return kl_divergence_kernel(matrix, type_codes)
+
+
+def _initialize_worker(metric, array_specs, shape, type_codes, output_file):
+    """
+    Set up a worker process: attach the shared matrix and map the output file.
+
+    Args:
+        metric (str): "kl" or "jsd".
+        array_specs (list): (name, shape, dtype) of the shared data, indices and
+            indptr arrays of the matrix.
+        shape (tuple): Shape of the matrix.
+        type_codes (numpy.ndarray): Type code of each column.
+        output_file (str): Path of the condensed .npy output.
+    """
+    memories, arrays = [], []
+    for name, array_shape, dtype in array_specs:
+        memory = shared_memory.SharedMemory(name=name)
+        memories.append(memory)
+        arrays.append(np.ndarray(array_shape, dtype=dtype, buffer=memory.buf))
+    matrix = sparse.csr_matrix(tuple(arrays), shape=shape, copy=False)
+    _worker["memories"] = memories
+    _worker["kernel"] = create_kernel(metric, matrix, type_codes)
+    _worker["similarities"] = np.load(output_file, mmap_mode="r+")
+
+
+def _compute_tile(tile):
+    """
+    Compute one tile in a worker process and write it into the shared output.
+
+    Args:
+        tile (tuple): (row_start, row_stop, column_start, column_stop).
+
+    Returns:
+        tuple: The tile that was written.
+    """
+    rows, columns = slice(tile[0], tile[1]), slice(tile[2], tile[3])
+    write_tile(_worker["similarities"], _worker["kernel"](rows, columns), rows, columns)
+    _worker["similarities"].flush()
+    return tile
+
+
+def compute_parallel_similarity(
+    metric, matrix, type_codes, block_ids, output_file, tile_size, workers
+):
+    """
+    Compute the similarity of every pair of blocks with a pool of worker processes.
+
+    Args:
+        metric (str): "kl" or "jsd".
+        matrix (scipy.sparse.csr_matrix): Block x token probabilities; normalized per
+            (block, type) for "jsd".
+        type_codes (numpy.ndarray): Type code of each column.
+        block_ids (list): Block IDs in matrix order.
+        output_file (str): Output .npy path.
+        tile_size (int): Side of the square tiles.
+        workers (int): Number of worker processes.
+
+    Returns:
+        numpy.memmap: The condensed similarities, memory-mapped from output_file.
+
+    The matrix is copied into shared memory once and every worker attaches to it.
+    Tiles are handed out one at a time and each worker writes its tiles straight into
+    the memory-mapped output file, so no results are sent back. Every tile is
+    computed the same way whichever worker takes it, so the output does not depend
+    on the number of workers or the scheduling.
+    """
+    similarities = create_condensed_similarity(output_file, block_ids)
+    matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+    memories, array_specs = [], []
+    try:
+        for array in (matrix.data, matrix.indices, matrix.indptr):
+            memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            memories.append(memory)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)[:] = array
+            array_specs.append((memory.name, array.shape, array.dtype.str))
+
+        tiles = [
+            (rows.start, rows.stop, columns.start, columns.stop)
+            for rows, columns in iterate_tiles(len(block_ids), tile_size)
+        ]
+        with Pool(
+            workers,
+            initializer=_initialize_worker,
+            initargs=(metric, array_specs, matrix.shape, type_codes, output_file),
+        ) as pool:
+            for _ in pool.imap_unordered(_compute_tile, tiles):
+                pass
+    finally:
+        for memory in memories:
+            memory.close()
+            memory.unlink()
+    return similarities
+
+
+def _gather_tile(upper, lower, inverse, rows, columns):
+    """
+    Gather the pairs (i, j) with i < j of a tile from the pairs of representatives.
+
+    Args:
+        upper (numpy.ndarray): Condensed similarities of the representatives.
+        lower (numpy.ndarray): Condensed array of the transposed similarities of the
+            representatives, or a prefix of it; entry (y, x) holds the similarity
+            of x to y for x > y.
+        inverse (numpy.ndarray): Representative position of every block.
+        rows (slice): Block positions of the tile rows.
+        columns (slice): Block positions of the tile columns.
+
+    Returns:
+        numpy.ndarray: The rows x columns tile, with zeros for the pairs of identical
+        blocks. Entries with i >= j are undefined; write_tile skips them.
+    """
+    size = int(round((1 + math.sqrt(1 + 8 * len(upper))) / 2))
+    first, second = inverse[rows][:, None], inverse[columns][None, :]
+    tile = np.zeros((len(first), second.shape[1]))
+    if not len(upper):
+        return tile
+
+    # Position of (min, max) of every pair; condensed_index(x, 0) + y is that of (x, y)
+    forward = first < second
+    index = np.where(
+        forward,
+        condensed_index(first, 0, size) + second,
+        condensed_index(second, 0, size) + first,
+    )
+    if lower is upper:
+        tile[:] = upper[index]
+    else:
+        tile[:] = upper[np.where(forward, index, 0)]
+        pairs = np.arange(rows.start, rows.stop)[:, None] < np.arange(
+            columns.start, columns.stop
+        )
+        below = pairs & ~forward & (first != second)
+        tile[below] = lower[index[below]]
+    tile[first == second] = 0.0
+    return tile
+
+
+def compute_deduplicated_similarity(
+    metric, block_matrix, output_file, tile_size, workers=1
+):
+    """
+    Compute the similarity of every pair of blocks on the distinct blocks only.
+
+    Args:
+        metric (str): "kl" or "jsd".
+        block_matrix (BlockDistributionMatrix): Block x token probabilities;
+            normalized per (block, type) for "jsd".
+        output_file (str): Output .npy path.
+        tile_size (int): Side of the square tiles.
+        workers (int): Number of worker processes.
+
+    Returns:
+        numpy.memmap: The condensed similarities of all blocks, memory-mapped from
+        output_file. Pairs of identical blocks get 0; every other pair gets the value
+        of its representatives.
+
+    Identical blocks are collapsed first (see BlockDistributionMatrix.deduplicated)
+    and only the pairs of representatives are computed, tile by tile, into a
+    temporary condensed array from which every tile of the output is gathered. The KL
+    divergence is not symmetric, so for the representatives of several blocks the
+    divergences of the later representatives to them are computed too, into a
+    prefix of a second, transposed condensed array. These representatives are placed
+    first, so no other pair is ever looked up in reverse. No square matrix is held in
+    memory or on disk.
+    """
+    representatives, inverse, counts = block_matrix.deduplicated()
+    order = np.argsort(counts == 1, kind="stable")
+    positions = np.empty_like(order)
+    positions[order] = np.arange(len(order))
+    inverse = positions[inverse]
+    repeated = int(np.sum(counts > 1)) if metric != "jsd" else 0
+    matrix = representatives.matrix[order]
+    size = len(order)
+
+    with tempfile.TemporaryDirectory(
+        dir=os.path.dirname(os.path.abspath(output_file))
+    ) as directory:
+        kernel = create_kernel(metric, matrix, block_matrix.type_codes)
+        upper_file = os.path.join(directory, "representatives.npy")
+        if workers > 1:
+            upper = compute_parallel_similarity(
+                metric,
+                matrix,
+                block_matrix.type_codes,
+                representatives.block_ids[order],
+                upper_file,
+                tile_size,
+                workers,
+            )
+        else:
+            upper = compute_tiled_similarity(
+                kernel, representatives.block_ids[order], upper_file, tile_size
+            )
+
+        # Divergences of every later representative to each repeated one, stored
+        # transposed: the pairs (y, x) with y < repeated are a prefix of a condensed
+        # array
+        lower = upper
+        if metric != "jsd":
+            lower = np.lib.format.open_memmap(
+                os.path.join(directory, "transposed.npy"),
+                mode="w+",
+                dtype=np.float64,
+                shape=(repeated * size - repeated * (repeated + 1) // 2,),
+            )
+            for column_start in range(0, repeated, tile_size):
+                columns = slice(column_start, min(column_start + tile_size, repeated))
+                for row_start in range(column_start, size, tile_size):
+                    rows = slice(row_start, min(row_start + tile_size, size))
+                    write_tile(lower, kernel(rows, columns).T, columns, rows, size)
+
+        similarities = create_condensed_similarity(output_file, block_matrix.block_ids)
+        for rows, columns in iterate_tiles(len(block_matrix), tile_size):
+            tile = _gather_tile(upper, lower, inverse, rows, columns)
+            write_tile(similarities, tile, rows, columns)
+        similarities.flush()
+        del upper, lower
+    return similarities
+
+
+def main():
+    """
+    Main function that computes the pairwise similarities of all blocks of a filtered
+    entropy table within the memory budget, with WORKERS processes, and writes them
+    to a memory-mapped condensed .npy file. With DEDUPLICATE set, identical blocks
+    are only computed once. With NEIGHBORS set, only the nearest neighbors of every
+    block are written, as a sparse .npz graph.
+    """
+    block_matrix = load_block_matrix(INPUT_FILE)
+    if METRIC == "jsd":
+        block_matrix = block_matrix.normalized()
+    matrix = block_matrix.matrix
+    tile_size = tile_size_for_budget(MEMORY_BUDGET // WORKERS, matrix.shape[1])
+
+    if NEIGHBORS is not None:
+        kernel = create_kernel(METRIC, matrix, block_matrix.type_codes)
+        positions, distances = compute_nearest_neighbors(
+            kernel, len(block_matrix), tile_size, NEIGHBORS
+        )
+        save_sparse_similarity(
+            GRAPH_OUTPUT_FILE,
+            block_matrix.block_ids,
+            np.repeat(np.arange(len(block_matrix)), positions.shape[1]),
+            positions.ravel(),
+            distances.ravel(),
+            float(distances.max(initial=0)),
+        )
+        print(f"{NEIGHBORS}-nearest-neighbor graph written to: {GRAPH_OUTPUT_FILE}")
+        return
+
+    if DEDUPLICATE:
+        compute_deduplicated_similarity(
+            METRIC, block_matrix, OUTPUT_FILE, tile_size, WORKERS
+        )
+    elif WORKERS > 1:
+        compute_parallel_similarity(
+            METRIC,
+            matrix,
+            block_matrix.type_codes,
+            block_matrix.block_ids,
+            OUTPUT_FILE,
+            tile_size,
+            WORKERS,
+        )
+    else:
+        kernel = create_kernel(METRIC, matrix, block_matrix.type_codes)
+        compute_tiled_similarity(kernel, block_matrix.block_ids, OUTPUT_FILE, tile_size)
+    print(f"Block Similarity written to: {OUTPUT_FILE} (tiles of {tile_size} blocks)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+This module provides a shared vocabulary that interns (Type, Assembly) pairs to dense
+integer IDs. Instruction and operand strings are encoded once, when the instruction
+table is ingested, so that later stages can work on int32 arrays (bincount, sparse
+matrices) instead of carrying strings around as dictionary keys.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Instruction table columns, in the order they are counted by the entropy stage
+TOKEN_TYPES = ("Instruction", "Left Operand", "Right Operand")
+
+
+class TokenVocabulary:
+    """
+    A mapping between (Type, Assembly) pairs and dense integer IDs starting from 0.
+
+    IDs are assigned in order of first appearance and never change, so arrays encoded
+    with the same vocabulary can be compared across stages and files.
+    """
+
+    def __init__(self, tokens=()):
+        """
+        Create a vocabulary, optionally pre-filled with tokens.
+
+        Args:
+            tokens (iterable): (variable_type, assembly) pairs to intern in order.
+        """
+        self.tokens = []
+        self.ids = {}
+        for variable_type, assembly in tokens:
+            self.intern(variable_type, assembly)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def intern(self, variable_type, assembly):
+        """
+        Get the ID of a token, adding it to the vocabulary if it is new.
+
+        Args:
+            variable_type (str): Type of the token (Instruction, Left Operand, ...).
+            assembly (str): The instruction or operand text.
+
+        Returns:
+            int: The ID of the token.
+        """
+        token = (variable_type, assembly)
+        token_id = self.ids.get(token)
+        if token_id is None:
+            token_id = self.ids[token] = len(self.tokens)
+            self.tokens.append(token)
+        return token_id
+
+    def encode(self, types, assemblies):
+        """
+        Encode columns of types and assemblies to token IDs, interning new tokens.
+
+        Args:
+            types (str or array-like): Token types, one per row, or a single type
+                shared by all rows.
+            assemblies (array-like): Instruction or operand texts, one per row.
+
+        Returns:
+            numpy.ndarray: int32 token IDs, one per row.
+
+        Only the distinct pairs are interned one by one; the rows themselves are
+        mapped with a single vectorized lookup.
+        """
+        if not isinstance(assemblies, pd.Series):
+            assemblies = np.asarray(assemblies, dtype=object)
+        assembly_codes, unique_assemblies = pd.factorize(assemblies)
+        if isinstance(types, str):
+            type_codes, unique_types = np.zeros(len(assembly_codes), np.intp), [types]
+        else:
+            type_codes, unique_types = pd.factorize(np.asarray(types, dtype=object))
+        codes, unique_pairs = pd.factorize(
+            type_codes.astype(np.int64) * len(unique_assemblies) + assembly_codes
+        )
+        mapping = np.fromiter(
+            (
+                self.intern(
+                    unique_types[pair // len(unique_assemblies)],
+                    unique_assemblies[pair % len(unique_assemblies)],
+                )
+                for pair in unique_pairs.tolist()
+            ),
+            dtype=np.int32,
+            count=len(unique_pairs),
+        )
+        return mapping[codes]
+
+    def decode(self, token_ids):
+        """
+        Decode token IDs back to their types and assemblies.
+
+        Args:
+            token_ids (array-like): Token IDs.
+
+        Returns:
+            tuple: Two numpy object arrays holding the types and the assemblies.
+        """
+        token_ids = np.asarray(token_ids, dtype=np.intp)
+        types = np.empty(len(self.tokens), dtype=object)
+        assemblies = np.empty(len(self.tokens), dtype=object)
+        types[:] = [variable_type for variable_type, _ in self.tokens]
+        assemblies[:] = [assembly for _, assembly in self.tokens]
+        return types[token_ids], assemblies[token_ids]
+
+    def save(self, path):
+        """
+        Save the vocabulary to an .npz file.
+
+        Args:
+            path (str): Output path.
+        """
+        types, assemblies = self.decode(np.arange(len(self.tokens)))
+        with open(path, "wb") as file:
+            np.savez_compressed(
+                file,
+                types=np.asarray(types, dtype=str),
+                assemblies=np.asarray(assemblies, dtype=str),
+            )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a vocabulary saved with save.
+
+        Args:
+            path (str): Path of the .npz file.
+
+        Returns:
+            TokenVocabulary: The vocabulary, with the same IDs as when it was saved.
+        """
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(zip(arrays["types"].tolist(), arrays["assemblies"].tolist()))
+
+
+def encode_instruction_table(df, vocabulary):
+    """
+    Encode an instruction table to integer-coded tokens.
+
+    Args:
+        df (pandas.DataFrame): Instruction table with Block_ID, Instruction,
+            Left Operand and Right Operand columns.
+        vocabulary (TokenVocabulary): Vocabulary used to intern the tokens.
+
+    Returns:
+        tuple: A tuple containing:
+            - numpy.ndarray: int32 block codes, one per token
+            - numpy.ndarray: int32 token IDs, one per token
+            - numpy.ndarray: int64 line counts per block, indexed by block code
+            - pandas.Index: Block IDs in order of first appearance, indexed by block code
+
+    Every line contributes its instruction; operands are only included when they are
+    not empty, matching the counting of the entropy stage. Tokens are in line order,
+    and within a line in the order Instruction, Left Operand, Right Operand.
+    """
+    block_codes, block_ids = pd.factorize(df["Block_ID"])
+    line_counts = np.bincount(block_codes, minlength=len(block_ids))
+
+    lines = np.arange(len(df))
+    token_block_codes, token_ids, token_order = [], [], []
+    for position, token_type in enumerate(TOKEN_TYPES):
+        assemblies = df[token_type].fillna("").astype(str)
+        present = (
+            np.ones(len(df), dtype=bool)
+            if token_type == "Instruction"
+            else (assemblies != "").to_numpy()
+        )
+        token_block_codes.append(block_codes[present])
+        token_ids.append(vocabulary.encode(token_type, assemblies[present]))
+        token_order.append(lines[present] * len(TOKEN_TYPES) + position)
+
+    order = np.argsort(np.concatenate(token_order), kind="stable")
+    return (
+        np.concatenate(token_block_codes)[order].astype(np.int32),
+        np.concatenate(token_ids)[order].astype(np.int32),
+        line_counts,
+        pd.Index(block_ids),
+    )
+
+
+def encode_token_table(df, vocabulary):
+    """
+    Encode the Type and Assembly columns of an entropy or probability table.
+
+    Args:
+        df (pandas.DataFrame): Table with Type and Assembly columns.
+        vocabulary (TokenVocabulary): Vocabulary used to intern the tokens.
+
+    Returns:
+        numpy.ndarray: int32 token IDs, one per row.
+    """
+    return vocabulary.encode(df["Type"].astype(str), df["Assembly"].astype(str))
@@ -2,39 +2,53 @@
 This module provides functionality for visualizing entropy thresholds in binary analysis.
 It uses pandas for data manipulation and plotly for creating interactive visualizations
 of entropy values across different block IDs and data types (instructions and operands).
+The rows and threshold of a group are looked up in an EntropyIndex instead of filtering
+the whole table for every plot.
 """
 
+import os
+import sys
 import pandas as pd
 import plotly.express as px
 
-# Load the CSV file into a DataFrame
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "clustering"
+    )
+)
+from entropy_index import EntropyIndex  # pylint: disable=wrong-import-position
+
+# Load the CSV file into a DataFrame and index it
 df = pd.read_csv(r"entropy\hello_world_entropy.csv")
+index = EntropyIndex.from_table(df)
 
 
 # Function to calculate threshold as mean + standard deviation
-def calculate_threshold(group):
+def calculate_threshold(entropy_index, block_id, data_type):
     """
     Calculate the threshold value as the sum of mean and standard deviation of entropy values.
 
     Args:
-        group (pandas.DataFrame): DataFrame containing entropy values in an 'Entropy' column
+        entropy_index (EntropyIndex): Index of the entropy table
+        block_id (int): ID of the block
+        data_type (str): Type of data ('Instruction', 'Left Operand', or 'Right Operand')
 
     Returns:
-        float: Calculated threshold value (mean + standard deviation)
+        float: Calculated threshold value (mean + sample standard deviation, as pandas
+            computes them)
     """
-    mean_entropy = group["Entropy"].mean()
-    std_entropy = group["Entropy"].std()
-    threshold = mean_entropy + std_entropy
-    return threshold
+    group = entropy_index.groups[(str(block_id), data_type)]
+    return entropy_index.thresholds(1.0, ddof=1)[group]
 
 
 # Function to visualize the entropy values with threshold line using Plotly
-def visualize_entropy(data_frame, block_id, data_type):
+def visualize_entropy(data_frame, entropy_index, block_id, data_type):
     """
     Visualize entropy values with threshold line for specific block ID and data type.
 
     Args:
         data_frame (pandas.DataFrame): DataFrame containing entropy data
+        entropy_index (EntropyIndex): Index of data_frame
         block_id (int): ID of the block to visualize
         data_type (str): Type of data to visualize ('Instruction', 'Left Operand',
             or 'Right Operand')
@@ -42,16 +56,16 @@ def visualize_entropy(data_frame, block_id, data_type):
     Returns:
         None: Displays a plotly figure with entropy visualization
     """
-    # Filter the DataFrame for the specific Block_ID and Type
-    filtered_data_frame = data_frame[
-        (data_frame["Block_ID"] == block_id) & (data_frame["Type"] == data_type)
-    ]
+    # Look up the rows of the specific Block_ID and Type
+    filtered_data_frame = data_frame.iloc[
+        entropy_index.group_rows(block_id, data_type)
+    ].copy()
 
     # Map Assembly values to numeric IDs
     filtered_data_frame.loc[:, "Assembly_ID"] = range(1, len(filtered_data_frame) + 1)
 
     # Calculate the threshold
-    threshold = calculate_threshold(filtered_data_frame)
+    threshold = calculate_threshold(entropy_index, block_id, data_type)
 
     # Create the bar chart
     fig = px.bar(
@@ -96,6 +110,6 @@ INSTRUCTION_TO_VISUALIZE = "Instruction"
 LEFT_OPERAND_TO_VISUALIZE = "Left Operand"
 RIGHT_OPERAND_TO_VISUALIZE = "Right Operand"
 
-visualize_entropy(df, BLOCK_ID_TO_VISUALIZE, INSTRUCTION_TO_VISUALIZE)
-visualize_entropy(df, BLOCK_ID_TO_VISUALIZE, LEFT_OPERAND_TO_VISUALIZE)
-visualize_entropy(df, BLOCK_ID_TO_VISUALIZE, RIGHT_OPERAND_TO_VISUALIZE)
+visualize_entropy(df, index, BLOCK_ID_TO_VISUALIZE, INSTRUCTION_TO_VISUALIZE)
+visualize_entropy(df, index, BLOCK_ID_TO_VISUALIZE, LEFT_OPERAND_TO_VISUALIZE)
+visualize_entropy(df, index, BLOCK_ID_TO_VISUALIZE, RIGHT_OPERAND_TO_VISUALIZE)
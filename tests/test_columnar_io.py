@@ -0,0 +1,61 @@
+"""
+Tests for reading the similarity files written by the similarity stages.
+"""
+
+import os
+import sys
+import numpy as np
+from scipy import sparse
+
+ANALYSIS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "analysis"
+)
+sys.path.append(ANALYSIS_DIR)
+sys.path.append(os.path.join(ANALYSIS_DIR, "similarity"))
+sys.path.append(os.path.join(ANALYSIS_DIR, "clustering"))
+
+# pylint: disable=wrong-import-position
+from columnar_io import (
+    read_similarity_graph,
+    read_similarity_matrix,
+    save_sparse_similarity,
+)
+from tiled_similarity import compute_nearest_neighbors, create_kernel
+
+
+def test_nearest_neighbor_graph_reads_as_symmetric_matrix(tmp_path):
+    """
+    A kNN graph lists pairs in both directions with different KL divergences; the
+    matrix read from it is symmetric and keeps the smaller value, as the graph does.
+    """
+    matrix = sparse.random(40, 30, density=0.3, random_state=0, format="csr")
+    matrix = sparse.csr_matrix(matrix.multiply(1 / matrix.sum(axis=1)))
+    type_codes = np.arange(30) % 3
+    kernel = create_kernel("kl", matrix, type_codes)
+    positions, distances = compute_nearest_neighbors(kernel, 40, 16, 5)
+
+    path = str(tmp_path / "knn.npz")
+    block_ids = [str(block_id) for block_id in range(40)]
+    save_sparse_similarity(
+        path,
+        block_ids,
+        np.repeat(np.arange(40), positions.shape[1]),
+        positions.ravel(),
+        distances.ravel(),
+        float(distances.max()),
+    )
+
+    similarities, read_ids = read_similarity_matrix(path)
+    graph, _ = read_similarity_graph(path)
+    assert read_ids == block_ids
+    assert np.array_equal(similarities, similarities.T)
+    rows, columns = graph.nonzero()
+    assert np.array_equal(similarities[rows, columns], graph[rows, columns].A1)
+
+    # Some pairs are listed both ways with different values, so the test is not void
+    listed = {
+        (i, j): d for i, row in enumerate(positions) for j, d in zip(row, distances[i])
+    }
+    assert any(
+        (j, i) in listed and listed[(j, i)] != value for (i, j), value in listed.items()
+    )